@@ -1,17 +1,22 @@
+import os
+import sys
+
 import streamlit as st
-from PIL import Image
 from streamlit_option_menu import option_menu
 
-from pages.home import home_app
-from pages.overview import overview_app
-from pages.predict import prdict_app
+sys.path.append(os.path.abspath(os.path.join('./src')))
+from page_registry import PAGES, page_registry
+
+# the page modules are imported when their menu entry is first selected
+for page in PAGES:
+    page_registry.register(*page)
 
 st.set_page_config(page_title="Telcom Data Analysis")
 
 slected = option_menu(
     menu_title=None,
-    options=["Home", "Overview", "Predict"],
-    icons=["house", "globe2", "app"],
+    options=page_registry.names,
+    icons=page_registry.icons,
     menu_icon="cast",
     orientation="horizontal"
 )
@@ -23,10 +28,4 @@ styles = {
 }
 st.title("Telecom Data Analysis")
 
-
-if slected == "Home":
-    home_app()
-elif slected == "Overview":
-    overview_app()
-else:
-    prdict_app()
+page_registry.render(slected)
@@ -0,0 +1,107 @@
+"""Benchmark the pandas and Polars backends on the xDR cleaning and profiling path.
+
+Both backends run the same PreProcess, Outlier and Overview calls on a
+synthetic raw extract: clean the column names, parse Start and End, impute
+the medians and modes, drop duplicates, then profile the cleaned frame
+(missing values, skewness, duplicates, outlier counts) and cap the numeric
+columns to their IQR fences. The results of the two backends are compared
+before the timings are printed.
+
+    python benchmarks/bench_backend.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from backend import to_backend
+from outlier import Outlier
+from overview import Overview
+from preprocessing import PreProcess
+from synthetic import XDRGenerator
+
+
+def run(raw, backend: str) -> dict:
+    """Run the cleaning and profiling path on a backend and return its results and timings."""
+    preprocess, outlier, overview = PreProcess(), Outlier(), Overview()
+    timings = {}
+
+    start = time.perf_counter()
+    df = to_backend(raw.copy() if backend == 'pandas' else raw, backend)
+    df = preprocess.clean_feature_name(df)
+    df = preprocess.convert_to_datetime(df, 'start')
+    df = preprocess.convert_to_datetime(df, 'end')
+    df = preprocess.fill_nulls_with_method(df, 'median')
+    df = preprocess.fill_nulls_with_method(df, 'mode')
+    df = preprocess.drop_duplicates(df)
+    if backend == 'polars':
+        # the profiling queries all start from the cleaned frame
+        df = df.collect().lazy()
+    timings['clean'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    numeric = [c for c in to_backend(df.head(0) if backend == 'polars' else df.head(0), 'pandas')
+               .select_dtypes(include=np.number).columns if c not in ('bearer_id', 'imsi', 'msisdn/number', 'imei')]
+    results = {
+        'missing': preprocess.missing_values_percentage(df),
+        'percent_missing': overview.percent_missing(df),
+        'skewness': overview.get_skewness(df),
+        'duplicates': overview.number_of_duplicates(df),
+        'outliers': outlier.outlier_summary(df, numeric),
+    }
+    timings['profile'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results['capped'] = to_backend(outlier.iqr_capping(df, numeric), 'pandas')
+    timings['cap'] = time.perf_counter() - start
+    results['cleaned'] = to_backend(df, 'pandas')
+    timings['total'] = sum(timings.values())
+    return results, timings
+
+
+def compare(pandas_results: dict, polars_results: dict) -> list:
+    """Return the names of the results that differ between the backends."""
+    differences = []
+    for name, expected in pandas_results.items():
+        actual = polars_results[name]
+        if isinstance(expected, pd.DataFrame) and name == 'missing':
+            same = np.allclose(expected.sort_index().to_numpy(float), actual.sort_index().to_numpy(float))
+        elif isinstance(expected, pd.DataFrame) and name == 'cleaned':
+            actual = actual.astype(expected.dtypes.to_dict())
+            same = all(expected[c].reset_index(drop=True).equals(actual[c]) or
+                       np.allclose(expected[c].to_numpy(float), actual[c].to_numpy(float), equal_nan=True)
+                       for c in expected.columns)
+        elif isinstance(expected, (pd.DataFrame, pd.Series)):
+            same = np.allclose(expected.to_numpy(float), actual.to_numpy(float), equal_nan=True, rtol=1e-6)
+        else:
+            same = expected == actual
+        if not same:
+            differences.append(name)
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    raw = XDRGenerator(args.rows).generate()
+    pandas_results, pandas_timings = run(raw, 'pandas')
+    polars_results, polars_timings = run(raw, 'polars')
+    differences = compare(pandas_results, polars_results)
+
+    print(f'{args.rows} rows, results {"differ: " + ", ".join(differences) if differences else "identical"}')
+    print(f'{"stage":<10}{"pandas s":>10}{"polars s":>10}{"speedup":>10}')
+    for stage in pandas_timings:
+        print(f'{stage:<10}{pandas_timings[stage]:>10.3f}{polars_timings[stage]:>10.3f}'
+              f'{pandas_timings[stage] / polars_timings[stage]:>10.1f}')
+    if differences:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Benchmark the PostgreSQL ingestion paths: time and peak memory.
+
+Needs a throwaway database; the benchmark creates and drops its own table.
+
+    python benchmarks/bench_ingestion.py --dsn postgresql://postgres@localhost/telecom --rows 150000
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+TABLE = 'xdr_bench'
+APPS = ['Social Media', 'Google', 'Email', 'Youtube', 'Netflix', 'Gaming', 'Other']
+
+
+def create_table(dsn: str, rows: int, seed: int = 42) -> None:
+    """Create and fill the benchmark table with xDR shaped rows."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'Bearer Id': rng.uniform(1e18, 1.3e19, rows),
+        'Start': pd.Timestamp('2019-04-01') + pd.to_timedelta(rng.integers(0, 30 * 86_400, rows), unit='s'),
+        'MSISDN/Number': rng.integers(33_600_000_000, 33_800_000_000, rows).astype(float),
+        'Handset Type': rng.choice([f'Handset {i}' for i in range(1_400)], rows),
+        'Dur. (ms)': rng.integers(7_000, 2_000_000, rows).astype(float),
+    })
+    for app in APPS:
+        df[f'{app} DL (Bytes)'] = rng.lognormal(14, 2, rows)
+        df[f'{app} UL (Bytes)'] = rng.lognormal(12, 2, rows)
+    types = {'Start': 'timestamp', 'Handset Type': 'text'}
+    columns = ', '.join(f'"{c}" {types.get(c, "double precision")}' for c in df.columns)
+
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+        cur.execute(f'DROP TABLE IF EXISTS {TABLE}; CREATE TABLE {TABLE} ({columns})')
+        cur.copy_expert(f'COPY {TABLE} FROM STDIN WITH (FORMAT csv)', buffer)
+    conn.close()
+
+
+def peak_memory() -> float:
+    """Return the peak resident memory of this process in MiB.
+
+    ru_maxrss survives exec on Linux and would report the parent's peak, the
+    VmHWM of /proc belongs to the new address space only.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(method: str, dsn: str, root: str) -> dict:
+    """Run one ingestion method in this process and return its time and peak RSS."""
+    start = time.perf_counter()
+    if method == 'read_sql_query':
+        import pandas.io.sql as sqlio
+        conn = psycopg2.connect(dsn)
+        df = sqlio.read_sql_query(f'SELECT * FROM public.{TABLE}', conn)
+        conn.close()
+        df.to_csv(os.path.join(root, 'data_from_postgres.csv'), index=False)
+    else:
+        from ingestion import PostgresIngestor
+        from storage import DataStore
+        mode, parts = method.split('x')
+        PostgresIngestor(dsn, DataStore(root)).ingest(f'public.{TABLE}', mode=mode,
+                                                      key='Bearer Id', parts=int(parts))
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'peak_mib': peak_memory()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dsn', required=True)
+    parser.add_argument('--rows', type=int, default=150_000)
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    parser.add_argument('--root', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run(args.run, args.dsn, args.root)))
+        return
+
+    create_table(args.dsn, args.rows)
+    print(f'{args.rows} rows')
+    print(f'{"method":<18}{"seconds":>10}{"peak MiB":>12}')
+    try:
+        for method in ['read_sql_query', 'cursorx1', 'copyx1', 'cursorx4', 'copyx4']:
+            with tempfile.TemporaryDirectory() as root:
+                # every method runs in a fresh process so the peak RSS is its own
+                out = subprocess.run([sys.executable, __file__, '--dsn', args.dsn, '--run', method,
+                                      '--root', root], capture_output=True, text=True, check=True)
+                result = json.loads(out.stdout.strip().splitlines()[-1])
+                print(f'{method:<18}{result["seconds"]:>10.2f}{result["peak_mib"]:>12.0f}')
+    finally:
+        with psycopg2.connect(args.dsn) as conn, conn.cursor() as cur:
+            cur.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark the columnar OutlierEngine against the per-element outlier loops.
+
+Run from the repository root:
+
+    python benchmarks/bench_outlier.py --rows 150000 --cols 40
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from outlier import OutlierEngine
+
+
+def make_frame(rows: int, cols: int, seed: int = 42) -> pd.DataFrame:
+    """Return a skewed, strictly positive numeric frame shaped like the xDR extract."""
+    rng = np.random.default_rng(seed)
+    data = rng.lognormal(mean=10, sigma=1.5, size=(rows, cols))
+    return pd.DataFrame(data, columns=[f'col_{i}' for i in range(cols)])
+
+
+def legacy_zscore(df, cols):
+    """Per-element z-score loop of the original calculate_num_outliers_zscore."""
+    counts = {}
+    for c in cols:
+        col = df[c]
+        mean = np.mean(col)
+        std = np.std(col)
+        outliers = []
+        for i in col:
+            if np.abs((i - mean) / std) > 3:
+                outliers.append(i)
+        counts[c] = len(outliers)
+    return counts
+
+
+def legacy_iqr(df, cols):
+    """Sort-and-loop IQR count of the original calculate_num_outliers_iqr."""
+    counts = {}
+    for c in cols:
+        values = sorted(df[c])
+        q1 = np.percentile(values, 25)
+        q3 = np.percentile(values, 75)
+        iqr = q3 - q1
+        counts[c] = sum(1 for i in values if i < q1 - 1.5 * iqr or i > q3 + 1.5 * iqr)
+    return counts
+
+
+def legacy_log(df, cols):
+    """List comprehension log transform of the original handle_outliers."""
+    for c in cols:
+        df[c] = [np.log(x) for x in df[c]]
+    return df
+
+
+def engine_zscore(df, cols):
+    return OutlierEngine(df, cols).counts('zscore').to_dict()
+
+
+def engine_iqr(df, cols):
+    return OutlierEngine(df, cols).counts('iqr').to_dict()
+
+
+def engine_log(df, cols):
+    df[cols] = OutlierEngine(df, cols).log()
+    return df
+
+
+def timeit(func, df, cols, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        frame = df.copy()
+        start = time.perf_counter()
+        func(frame, cols)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=150_000)
+    parser.add_argument('--cols', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.cols)
+    cols = list(df.columns)
+
+    assert legacy_zscore(df, cols) == engine_zscore(df, cols)
+    assert legacy_iqr(df, cols) == engine_iqr(df, cols)
+
+    print(f'{args.rows} rows x {args.cols} columns, best of {args.repeat}')
+    print(f'{"step":<10}{"legacy (s)":>14}{"engine (s)":>14}{"speed-up":>12}')
+    for name, legacy, engine in [('zscore', legacy_zscore, engine_zscore),
+                                 ('iqr', legacy_iqr, engine_iqr),
+                                 ('log', legacy_log, engine_log)]:
+        t_legacy = timeit(legacy, df, cols, args.repeat)
+        t_engine = timeit(engine, df, cols, args.repeat)
+        print(f'{name:<10}{t_legacy:>14.3f}{t_engine:>14.3f}{t_legacy / t_engine:>11.1f}x')
+
+
+if __name__ == '__main__':
+    main()
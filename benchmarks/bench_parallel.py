@@ -0,0 +1,71 @@
+"""Benchmark the shared-memory ColumnExecutor against the number of worker processes.
+
+Every column-wise transform runs over the same numeric block with 1, 2, 4, ...
+workers up to the number of CPUs. Speedup is the time of one worker divided
+by the time of n workers and efficiency is the speedup divided by n.
+
+    python benchmarks/bench_parallel.py --rows 1000000 --columns 48
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from parallel import (ColumnExecutor, SharedBlock, iqr_capping, log_transform,
+                      replace_upper_with_median, zscore_count)
+
+TRANSFORMS = [log_transform, iqr_capping, replace_upper_with_median, zscore_count]
+
+
+def worker_counts(cpus: int) -> list:
+    counts, n = [], 1
+    while n < cpus:
+        counts.append(n)
+        n *= 2
+    return counts + [cpus]
+
+
+def timed(executor: ColumnExecutor, block: SharedBlock, source: np.ndarray, transform, repeat: int) -> float:
+    """Return the best time of a transform over a fresh copy of the block."""
+    best = np.inf
+    for _ in range(repeat):
+        block.array[:] = source
+        start = time.perf_counter()
+        executor.run(block, transform)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--columns', type=int, default=48)
+    parser.add_argument('--cpus', type=int, default=os.cpu_count())
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame(rng.lognormal(12, 2, (args.rows, args.columns)),
+                      columns=[f'c{i}' for i in range(args.columns)])
+    print(f'{args.rows} rows x {args.columns} columns, {args.cpus} CPUs')
+    print(f'{"transform":<28}{"workers":>8}{"seconds":>10}{"speedup":>10}{"efficiency":>12}')
+    with SharedBlock.from_frame(df, df.columns) as block:
+        source = block.array.copy()
+        for transform in TRANSFORMS:
+            base = None
+            for n in worker_counts(args.cpus):
+                with ColumnExecutor(n) as executor:
+                    # start the workers before timing
+                    executor.run(block, zscore_count)
+                    seconds = timed(executor, block, source, transform, args.repeat)
+                base = base or seconds
+                print(f'{transform.__name__:<28}{n:>8}{seconds:>10.3f}{base / seconds:>10.2f}'
+                      f'{base / seconds / n:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
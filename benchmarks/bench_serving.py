@@ -0,0 +1,130 @@
+"""Load test of the micro-batching scoring service.
+
+The service is started in a subprocess on a free local port for every
+configuration (--max-batch 1 always scores requests one by one). A closed
+loop asyncio client then keeps --concurrency keep-alive connections busy
+until --requests requests are answered, and the script prints the
+throughput, the p50/p95/p99 latency and the mean batch size of each
+configuration. The client runs on the same machine as the service and
+competes with it for the CPU.
+
+    python benchmarks/bench_serving.py --requests 20000 --concurrency 128 --max-batch 1,64,256
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(ROOT, 'src'))
+from serving import FEATURE_COLUMNS, SCORE_COLUMNS
+
+
+def start_service(max_batch: int, max_wait_ms: float, model_dir: str) -> tuple:
+    """Start the service and return the process and its port."""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'src', 'serving.py'), '--port', '0', '--model-dir', model_dir,
+         '--max-batch', str(max_batch), '--max-wait-ms', str(max_wait_ms)],
+        cwd=os.path.join(ROOT, 'src'), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('Serving on'):
+        process.kill()
+        raise RuntimeError('The scoring service did not start')
+    return process, int(line.rsplit(':', 1)[1])
+
+
+def request_bodies(endpoint: str, n: int = 1024, seed: int = 0) -> list:
+    """Return random request bodies of an endpoint."""
+    rng = np.random.default_rng(seed)
+    columns = SCORE_COLUMNS if endpoint == '/predict' else FEATURE_COLUMNS
+    values = rng.lognormal(1.0, 1.0, size=(n, len(columns)))
+    return [json.dumps(dict(zip(columns, row))).encode() for row in values.tolist()]
+
+
+async def call(reader, writer, method: str, path: str, body: bytes = b'') -> dict:
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    length = int(head.lower().split(b'content-length:')[1].split(b'\r\n')[0])
+    response = json.loads(await reader.readexactly(length))
+    if not head.startswith(b'HTTP/1.1 200'):
+        raise RuntimeError(f'{path} answered {head.splitlines()[0].decode()}: {response}')
+    return response
+
+
+async def load(port: int, endpoint: str, requests: int, concurrency: int) -> tuple:
+    """Send the requests over concurrency connections, return their latencies and the duration."""
+    bodies = request_bodies(endpoint)
+    latencies = np.empty(requests)
+    sent = 0
+
+    async def client():
+        nonlocal sent
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            while sent < requests:
+                i = sent
+                sent += 1
+                start = time.perf_counter()
+                await call(reader, writer, 'POST', endpoint, bodies[i % len(bodies)])
+                latencies[i] = time.perf_counter() - start
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+async def health(port: int) -> dict:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        return await call(reader, writer, 'GET', '/health')
+    finally:
+        writer.close()
+
+
+def run(max_batch: int, args) -> dict:
+    process, port = start_service(max_batch, args.max_wait_ms, args.model_dir)
+    try:
+        asyncio.run(load(port, args.endpoint, args.warmup, args.concurrency))
+        before = asyncio.run(health(port))['endpoints'][args.endpoint]
+        latencies, seconds = asyncio.run(load(port, args.endpoint, args.requests, args.concurrency))
+        after = asyncio.run(health(port))['endpoints'][args.endpoint]
+    finally:
+        process.terminate()
+        process.wait()
+    batches = after['batches'] - before['batches']
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {'max_batch': max_batch, 'rps': args.requests / seconds, 'p50': p50, 'p95': p95, 'p99': p99,
+            'mean_batch': (after['requests'] - before['requests']) / batches if batches else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the micro-batching scoring service.')
+    parser.add_argument('--endpoint', choices=['/predict', '/score'], default='/predict')
+    parser.add_argument('--requests', type=int, default=20_000)
+    parser.add_argument('--warmup', type=int, default=1_000)
+    parser.add_argument('--concurrency', type=int, default=128)
+    parser.add_argument('--max-batch', default='1,256', help='comma separated configurations')
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    parser.add_argument('--model-dir', default=os.path.join(ROOT, 'models'))
+    args = parser.parse_args()
+
+    print(f'{args.requests} requests to {args.endpoint} over {args.concurrency} connections, '
+          f'max wait {args.max_wait_ms} ms')
+    print(f'{"max batch":>10}{"req/s":>10}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"mean batch":>12}')
+    for max_batch in (int(n) for n in args.max_batch.split(',')):
+        r = run(max_batch, args)
+        print(f'{r["max_batch"]:>10}{r["rps"]:>10.0f}{r["p50"]:>9.2f}{r["p95"]:>9.2f}{r["p99"]:>9.2f}'
+              f'{r["mean_batch"]:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
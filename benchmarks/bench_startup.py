@@ -0,0 +1,68 @@
+"""Check the cold start of every Streamlit page against a time budget.
+
+Every page is imported and rendered once in a fresh process with the
+Streamlit test runner, from the repository root so that the pages find
+./data and ./models. The script prints the import and first-render time of
+each page and the slowest imports it made, and exits with status 1 when a
+page is over the budget.
+
+    python benchmarks/bench_startup.py --budget 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(ROOT, 'src'))
+from page_registry import PAGES
+
+PAGE_SCRIPT = '''
+import os, sys
+sys.path.append(os.path.abspath('./src'))
+from page_registry import PAGES, page_registry
+for page in PAGES:
+    page_registry.register(*page)
+page_registry.render(os.environ['STARTUP_PAGE'])
+'''
+
+RUN_PAGE = '''
+import json, sys
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_string(sys.argv[1], default_timeout=600).run()
+from page_registry import page_registry
+report = page_registry.report()['pages'][sys.argv[2]]
+report['errors'] = [e.message for e in at.exception]
+print(json.dumps(report))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=None, help='seconds per page')
+    parser.add_argument('--top', type=int, default=3, help='slowest imports shown per page')
+    args = parser.parse_args()
+
+    print(f'{"page":<12}{"import s":>10}{"render s":>10}{"total s":>10}  slowest imports')
+    over = []
+    for name, *_ in PAGES:
+        out = subprocess.run([sys.executable, '-c', RUN_PAGE, PAGE_SCRIPT, name], cwd=ROOT, check=True,
+                             capture_output=True, text=True, env={**os.environ, 'STARTUP_PAGE': name})
+        report = json.loads(out.stdout.strip().splitlines()[-1])
+        total = report['import_seconds'] + report['first_render_seconds']
+        slowest = ', '.join(f'{module} {seconds:.2f}s' for module, seconds
+                            in list(report['imports'].items())[:args.top])
+        print(f'{name:<12}{report["import_seconds"]:>10.3f}{report["first_render_seconds"]:>10.3f}'
+              f'{total:>10.3f}  {slowest}')
+        for error in report['errors']:
+            print(f'{"":<12}error: {error}')
+        if args.budget is not None and total > args.budget:
+            over.append(name)
+    if over:
+        print(f'Over the {args.budget}s budget: {", ".join(over)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark the parquet DataStore against the csv intermediates.
+
+Run from the repository root:
+
+    python benchmarks/bench_storage.py --rows 150000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from storage import ENGAGEMENT_COLUMNS, DataStore
+
+
+def make_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Return a frame with the shape and column mix of cleaned_data.csv."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.lognormal(10, 2, size=(rows, 50)),
+                      columns=[f'metric_{i}_(bytes)' for i in range(50)])
+    df['bearer_id'] = rng.integers(1e18, 1.3e19, rows, dtype=np.uint64).astype(float)
+    df['msisdn/number'] = rng.integers(33_600_000_000, 33_800_000_000, rows).astype(float)
+    df['dur._(ms)'] = rng.integers(7_000, 2_000_000, rows).astype(float)
+    df['total_data'] = rng.lognormal(19, 1, rows)
+    df['handset_type'] = rng.choice([f'Handset {i}' for i in range(1_400)], rows)
+    df['start'] = pd.Timestamp('2019-04-01') + pd.to_timedelta(rng.integers(0, 30 * 86_400, rows), unit='s')
+    return df
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=150_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    with tempfile.TemporaryDirectory() as root:
+        store = DataStore(root=root)
+        csv_path = os.path.join(root, 'cleaned_data.csv')
+        df.to_csv(csv_path, index=False)
+        store.convert_csv(csv_path)
+
+        csv_size = os.path.getsize(csv_path) / 2 ** 20
+        parquet_size = os.path.getsize(store.path('cleaned_data')) / 2 ** 20
+        timings = [
+            ('full read', lambda: pd.read_csv(csv_path), lambda: store.read('cleaned_data')),
+            ('engagement cols', lambda: pd.read_csv(csv_path, usecols=ENGAGEMENT_COLUMNS),
+             lambda: store.read('cleaned_data', ENGAGEMENT_COLUMNS)),
+        ]
+
+        print(f'{args.rows} rows x {df.shape[1]} columns, best of {args.repeat}')
+        print(f'{"disk (MiB)":<18}{csv_size:>12.1f}{parquet_size:>12.1f}{csv_size / parquet_size:>11.1f}x')
+        print(f'{"load":<18}{"csv (s)":>12}{"parquet (s)":>12}{"speed-up":>12}')
+        for name, csv_read, parquet_read in timings:
+            t_csv = best_of(csv_read, args.repeat)
+            t_parquet = best_of(parquet_read, args.repeat)
+            print(f'{name:<18}{t_csv:>12.3f}{t_parquet:>12.3f}{t_csv / t_parquet:>11.1f}x')
+
+
+if __name__ == '__main__':
+    main()
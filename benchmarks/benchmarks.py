@@ -0,0 +1,249 @@
+"""asv benchmark suite of the analysis classes on synthetic xDR data.
+
+Every benchmark runs once per size of XDR_BENCH_SIZES, a comma separated
+list of row counts (default 150000,1000000; 50000000 needs about 30 GB of
+RAM). The data is generated once per run by setup_cache and shared by all
+benchmarks. Results are kept per commit in .asv/results, so a regression
+shows up in ``asv compare`` between two runs:
+
+    asv run --python=same --set-commit-hash $(git rev-parse HEAD)
+    asv compare <old commit> <new commit>
+"""
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.append(SRC)
+from dedup import Deduplicator
+from leaderboard import LEADERBOARDS, Leaderboard
+from outlier import Outlier
+from overview import Overview
+from pipeline.predict_pipeline import ScoringPipeline
+from pipeline.user_state import UserState
+from plot import Plot
+from pipeline.train_pipeline import (ENGAGEMENT_METRICS, EXPERIENCE_METRICS,
+                                     UserAggregator)
+from preprocessing import PreProcess
+from schema import DtypeOptimizer
+from synthetic import XDRGenerator
+from traffic import APPLICATIONS, TrafficEngine
+
+SIZES = [int(n) for n in os.environ.get('XDR_BENCH_SIZES', '150000,1000000').split(',')]
+MODEL_DIR = os.path.abspath(os.path.join(SRC, '..', 'models'))
+OUTLIER_COLUMNS = ['avg_rtt_dl_(ms)', 'avg_bearer_tp_dl_(kbps)', 'tcp_dl_retrans._vol_(bytes)',
+                   'social_media_dl_(bytes)', 'youtube_dl_(bytes)', 'total_dl_(bytes)']
+
+
+def prepare(df: pd.DataFrame) -> pd.DataFrame:
+    """Apply the first steps of the preprocessing notebook to a raw extract."""
+    preprocess = PreProcess()
+    df = preprocess.clean_feature_name(df)
+    df = preprocess.convert_to_datetime(df, 'start')
+    df = preprocess.convert_to_datetime(df, 'end')
+    df['total_data'] = df['total_dl_(bytes)'] + df['total_ul_(bytes)']
+    return df
+
+
+def setup_cache():
+    """Write the cleaned synthetic extract of every size to parquet."""
+    paths = {}
+    for rows in SIZES:
+        paths[rows] = os.path.abspath(f'xdr_{rows}.parquet')
+        prepare(XDRGenerator(rows).generate()).to_parquet(paths[rows], index=False)
+    return paths
+
+
+class XDRBenchmark:
+    params = SIZES
+    param_names = ['rows']
+    timeout = 1800
+
+    def setup(self, paths, rows):
+        self.df = pd.read_parquet(paths[rows])
+
+
+class PreProcessSuite(XDRBenchmark):
+    # the methods change the frame in place, so every sample starts from a fresh copy
+    number = 1
+    repeat = 5
+
+    def setup(self, paths, rows):
+        super().setup(paths, rows)
+        self.preprocess = PreProcess()
+        self.frame = self.df.copy()
+
+    def time_fill_nulls_median(self, paths, rows):
+        self.preprocess.fill_nulls_with_method(self.frame, 'median')
+
+    def time_fill_nulls_mode(self, paths, rows):
+        self.preprocess.fill_nulls_with_method(self.frame, 'mode')
+
+    def time_missing_values_percentage(self, paths, rows):
+        self.preprocess.missing_values_percentage(self.frame)
+
+    def peakmem_fill_nulls_median(self, paths, rows):
+        self.preprocess.fill_nulls_with_method(self.frame, 'median')
+
+
+class DtypeSuite(XDRBenchmark):
+    def setup(self, paths, rows):
+        super().setup(paths, rows)
+        self.optimizer = DtypeOptimizer()
+
+    def time_optimize(self, paths, rows):
+        self.optimizer.optimize(self.df)
+
+    def track_memory_ratio(self, paths, rows):
+        self.optimizer.optimize(self.df)
+        return self.optimizer.memory_summary()['ratio']
+
+    track_memory_ratio.unit = 'x'
+
+    def track_memory_ratio_lossy(self, paths, rows):
+        optimizer = DtypeOptimizer(lossy=True)
+        optimizer.optimize(self.df)
+        return optimizer.memory_summary()['ratio']
+
+    track_memory_ratio_lossy.unit = 'x'
+
+
+class DuplicateSuite(XDRBenchmark):
+    def time_pandas_duplicated(self, paths, rows):
+        self.df.duplicated().sum()
+
+    def time_hash_duplicated(self, paths, rows):
+        Deduplicator().count(self.df)
+
+    def time_hash_duplicated_chunks(self, paths, rows):
+        Deduplicator(chunksize=100_000).count(paths[rows])
+
+    def peakmem_hash_duplicated_chunks(self, paths, rows):
+        Deduplicator(chunksize=100_000).count(paths[rows])
+
+
+class OutlierSuite(XDRBenchmark):
+    number = 1
+    repeat = 5
+
+    def setup(self, paths, rows):
+        super().setup(paths, rows)
+        self.outlier = Outlier()
+        self.frame = self.df[OUTLIER_COLUMNS].fillna(self.df[OUTLIER_COLUMNS].median())
+
+    def time_iqr_capping(self, paths, rows):
+        self.outlier.iqr_capping(self.frame, OUTLIER_COLUMNS)
+
+    def time_iqr_capping_approximate(self, paths, rows):
+        self.outlier.iqr_capping(self.frame, OUTLIER_COLUMNS, approximate=True)
+
+    def time_outlier_summary(self, paths, rows):
+        self.outlier.outlier_summary(self.frame, OUTLIER_COLUMNS)
+
+
+class OverviewSuite(XDRBenchmark):
+    def setup(self, paths, rows):
+        super().setup(paths, rows)
+        self.overview = Overview()
+
+    def time_percent_missing(self, paths, rows):
+        self.overview.percent_missing(self.df)
+
+    def time_get_skewness(self, paths, rows):
+        self.overview.get_skewness(self.df)
+
+    def time_get_decile(self, paths, rows):
+        self.overview.get_decile(self.df, 'dur._(ms)', 5, labels=[1, 2, 3, 4, 5])
+
+
+class PlotSuite(XDRBenchmark):
+    number = 1
+    repeat = 3
+
+    def setup(self, paths, rows):
+        super().setup(paths, rows)
+        self.plot = Plot()
+        self.directory = tempfile.mkdtemp()
+
+    def time_render_boxplots(self, paths, rows):
+        self.plot.render_batch(self.df, OUTLIER_COLUMNS, self.directory)
+
+    def time_render_boxplots_serial(self, paths, rows):
+        self.plot.render_batch(self.df, OUTLIER_COLUMNS, self.directory, n_jobs=1)
+
+    def time_render_histograms(self, paths, rows):
+        self.plot.render_batch(self.df, OUTLIER_COLUMNS, self.directory, kind='hist')
+
+
+class AggregationSuite(XDRBenchmark):
+    def setup(self, paths, rows):
+        super().setup(paths, rows)
+        self.aggregator = UserAggregator()
+
+    def time_user_features(self, paths, rows):
+        self.aggregator.user_features(self.df, ENGAGEMENT_METRICS, EXPERIENCE_METRICS)
+
+    def peakmem_user_features(self, paths, rows):
+        self.aggregator.user_features(self.df, ENGAGEMENT_METRICS, EXPERIENCE_METRICS)
+
+
+class TrafficSuite(XDRBenchmark):
+    def setup(self, paths, rows):
+        super().setup(paths, rows)
+        self.engine = TrafficEngine()
+
+    def time_engine(self, paths, rows):
+        self.engine.run(self.df)
+
+    def time_groupby(self, paths, rows):
+        for app in APPLICATIONS:
+            self.df[app] = self.df[f'{app}_dl_(bytes)'] + self.df[f'{app}_ul_(bytes)']
+        self.df.groupby('msisdn/number').agg({app: 'sum' for app in APPLICATIONS})
+
+    def peakmem_engine(self, paths, rows):
+        self.engine.run(self.df)
+
+
+class LeaderboardSuite(XDRBenchmark):
+    # the boards hold every subscriber but the last batch, which is merged by the benchmarks
+    def setup(self, paths, rows):
+        super().setup(paths, rows)
+        batch = 50_000
+        self.state = UserState().update(self.df.iloc[:-batch])
+        self.board = Leaderboard().rebuild(self.state.aggregator.finalize(self.state.partial(),
+                                                                          self.state.metrics))
+        self.state.update(self.df.iloc[-batch:])
+        self.latest = self.state.latest()
+        self.board.top('avg_tp_total', 'smallest')
+
+    def time_update(self, paths, rows):
+        self.board.update(self.latest)
+
+    def time_recompute(self, paths, rows):
+        features = self.state.aggregator.finalize(self.state.partial(), self.state.metrics)
+        for metric, directions in LEADERBOARDS.items():
+            for direction in directions:
+                getattr(features, f'n{direction}')(10, metric)
+
+    def time_query(self, paths, rows):
+        self.board.top('avg_tp_total', 'smallest')
+
+
+class ScoringSuite(XDRBenchmark):
+    def setup(self, paths, rows):
+        super().setup(paths, rows)
+        engagement, experience = UserAggregator().user_features(self.df, ENGAGEMENT_METRICS,
+                                                                EXPERIENCE_METRICS)
+        self.features = engagement.join(experience).reset_index()
+        self.pipeline = ScoringPipeline(MODEL_DIR)
+
+    def time_score(self, paths, rows):
+        self.pipeline.score(self.features)
+
+    def track_rows_per_second(self, paths, rows):
+        self.pipeline.score(self.features)
+        return self.pipeline.stats['rows_per_second']
+
+    track_rows_per_second.unit = 'rows/s'
@@ -5,72 +5,110 @@ import sys
 import pandas as pd
 import plotly.express as px
 import streamlit as st
-import streamlit.components.v1 as components
-from PIL import Image
 
-sys.path.append(os.path.abspath(os.path.join('./scripts')))
+sys.path.append(os.path.abspath(os.path.join('./src')))
+from browser import tables as row_tables
+from dashboard import aggregates
+
+
+def load_aggregates():
+    return aggregates.get('./data', 'cleaned_data2', './models')
+
+
+def load_leaderboard():
+    return aggregates.leaderboard('./data', 'cleaned_data2', './models')
+
+
+def load_table():
+    return row_tables.get('./data', 'cleaned_data2')
 
 
 def overview_app():
     st.title("Overview")
     st.write( "Users Data Overview")
-    number = st.number_input("Enter the number of rows and press enter: ", min_value=None, max_value=None, value=10,
-                             step=None, format=None, key=None, help=None, on_change=None, args=None, kwargs=None, disabled=False)
-
-    df = pd.read_csv('./data/cleaned_data2.csv', nrows=number)
-    st.write(df)
+    table = load_table()
+    filters = {}
+    column, value = st.columns(2)
+    filter_column = column.selectbox("Filter on", ["", "msisdn/number", "handset_type"])
+    filter_value = value.text_input("equal to")
+    if filter_column and filter_value:
+        try:
+            filters = {filter_column: filter_value}
+            total = table.count(filters)
+        except ValueError:
+            st.error(f"{filter_value} is not a valid {filter_column}")
+            filters, total = {}, table.num_rows
+    else:
+        total = table.num_rows
+
+    offset, limit = st.columns(2)
+    start = offset.number_input("First row", min_value=0, max_value=max(total - 1, 0), value=0, step=10)
+    number = limit.number_input("Enter the number of rows and press enter: ", min_value=1, max_value=1000,
+                                value=10)
+    columns = st.multiselect("Columns", table.columns)
+    st.write(f"{total} rows")
+    st.write(table.page(start, number, columns or None, filters))
+
+    manifest, tables = load_aggregates()
+    st.caption(f"Aggregates of {manifest['rows']} sessions, version {manifest['version']} "
+               f"computed {manifest['created']}")
+    if aggregates.stale('./data', 'cleaned_data2'):
+        st.info("The dataset changed since these aggregates were computed, "
+                "the new ones are shown once they are rebuilt.")
 
     st.header("Top 10 handsets used by customers")
-    top_df = pd.read_csv('./data/top_10_handset.csv')
-
-    fig = px.bar(top_df, x='handset_type', y='count', height=500)
+    fig = px.bar(tables['top_10_handset'], x='handset_type', y='count', height=500)
     st.plotly_chart(fig)
 
     st.header("Top 3 handsets Manufacturers")
-    top_3_df = pd.read_csv('./data/top_3_manuf.csv')
-    fig = px.bar(top_3_df, x='handset_manufacturer', y='count', height=500)
+    fig = px.bar(tables['top_3_manuf'], x='handset_manufacturer', y='count', height=500)
     st.plotly_chart(fig)
 
     st.header("Top 5 handsets type manufactured by apple")
-    top_5_app = pd.read_csv('./data/top_5_apple.csv')
-    fig = px.bar(top_5_app, x='Handset', y='count', height=500)
+    fig = px.bar(tables['top_5_apple'], x='Handset', y='count', height=500)
     st.plotly_chart(fig)
 
     st.header("User's with most sessions")
-    top_5_session = pd.read_csv('./data/top_5_session.csv', nrows=5)
-
-    # print(top_5_session)
-    st.write(top_5_session)
+    st.write(tables['top_5_session'])
 
     st.header("Duration Distribution")
-    image = Image.open('./assets/Durationdist.png')
-    st.image(image, caption="Duration Distribution", use_column_width=True)
+    fig = px.bar(tables['duration_hist'], x='start', y='count', height=500,
+                 labels={'start': 'Duration (ms)'})
+    st.plotly_chart(fig)
 
     st.header("Top data usage per applications")
-    image = Image.open('./assets/top_data_usage.png')
-    st.image(image, caption="Applications Data usage", use_column_width=True)
+    fig = px.bar(tables['app_usage'], x='application', y='total_bytes', height=500)
+    st.plotly_chart(fig)
+
+    st.header("Most engaged users per application")
+    top = tables['top_10_per_app']
+    app = st.selectbox("Application", top['application'].unique())
+    fig = px.bar(top[top['application'] == app].astype({'msisdn/number': str}), x='msisdn/number',
+                 y='total_bytes', height=500)
+    st.plotly_chart(fig)
 
     st.header("Application Duration distribution using deciles")
-    image = Image.open('./assets/DurationDeciles.png')
-    st.image(image, caption="Applications Duration Distribution",
-             use_column_width=True)
-
-    st.header("Clustering users based on their Engagement score")
-    image = Image.open('./assets/userEngagCluster.png')
-    st.image(image, caption="Users clustering into 3 groups based on Engagement score",
-             use_column_width=True)
-
-    st.header("TCP retransmissions")
-    image = Image.open('./assets/tcpretransmission.png')
-    st.image(image, caption="Top TCP retransmissions",
-             use_column_width=True)
-
-    st.header("Top throughputs")
-    image = Image.open('./assets/TopTP.png')
-    st.image(image, caption="Top 10 througputs",
-             use_column_width=True)
-
-    st.header("Experience Distribution")
-    image = Image.open('./assets/ClusterDist.png')
-    st.image(image, caption="Experience distribution of user",
-             use_column_width=True)
+    fig = px.bar(tables['duration_deciles'], x='decile', y='total_data', height=500)
+    st.plotly_chart(fig)
+
+    if 'engagement_clusters' in tables:
+        st.header("Clustering users based on their Engagement score")
+        fig = px.bar(tables['engagement_clusters'], x='cluster', y='users', height=500,
+                     hover_data=['sessions', 'dur._(ms)', 'total_data'])
+        st.plotly_chart(fig)
+
+    st.header("Leaderboards")
+    board = load_leaderboard()
+    metric_column, rank_column = st.columns(2)
+    metric = metric_column.selectbox("Metric", board.metrics)
+    direction = rank_column.radio("Rank", board.directions(metric), horizontal=True)
+    top = board.top(metric, direction)
+    key, value = (metric, 'sessions') if direction == 'most_frequent' else ('msisdn/number', metric)
+    fig = px.bar(pd.DataFrame({key: top.index.astype(str), value: top.to_numpy()}), x=key, y=value,
+                 height=500)
+    st.plotly_chart(fig)
+
+    if 'experience_clusters' in tables:
+        st.header("Experience Distribution")
+        fig = px.pie(tables['experience_clusters'], names='cluster', values='users', height=500)
+        st.plotly_chart(fig)
@@ -1,26 +1,80 @@
-import pickle
+import os
+import sys
 
 import pandas as pd
 import streamlit as st
 from PIL import Image
 
+sys.path.append(os.path.abspath(os.path.join('./src')))
+from feature_store import stores
+from registry import registry
+
+MODEL_PATH = './models/satisfaction_model.pkl'
+SCORE_COLUMNS = ['engagement_score', 'experience_score']
+
 
 def load_model():
-    pickle_in = open('./models/satisfaction_model.pkl', 'rb')
-    satisfaction_model = pickle.load(pickle_in)
-    return satisfaction_model
+    return registry.get(MODEL_PATH)
+
+
+def load_store():
+    return stores.get('./data', 'cleaned_data2', './models')
 
 
 def prdict_app():
     st.title("Prdict customer satisfaction")
 
-    eng_score = st.slider("Engagement score", min_value=0.0,
-                          max_value=2.0, step=0.1)
-    exp_score = st.slider("Experience score", min_value=0.0,
-                          max_value=2.0, step=0.1)
+    st.header("Subscriber lookup")
+    msisdn = st.text_input("MSISDN", placeholder="33664962239")
+    if msisdn:
+        with st.spinner("Loading the subscriber features"):
+            store = load_store()
+        if stores.stale('./data', 'cleaned_data2'):
+            st.info("The dataset changed since these features were computed, "
+                    "the new ones are used once they are rebuilt.")
+        try:
+            features = store.lookup(msisdn)
+        except ValueError:
+            st.error(f"{msisdn} is not a valid MSISDN")
+            features = None
+        if features is not None and features['satisfaction'] is None:
+            st.warning(f"No subscriber with MSISDN {msisdn}")
+        elif features is not None:
+            scores = features['satisfaction']
+            st.success(f"The customer satisfaction is {scores['satisfaction_score']}")
+            engagement, experience, satisfaction = st.columns(3)
+            engagement.subheader("Engagement")
+            engagement.write(features['engagement'])
+            experience.subheader("Experience")
+            experience.write(features['experience'].astype(str))
+            satisfaction.subheader("Scores")
+            satisfaction.write(scores)
 
-    if st.button("Predict"):
-        model = load_model()
-        result = model.predict([[eng_score, exp_score]])
+    with st.expander("Predict from scores"):
+        eng_score = st.slider("Engagement score", min_value=0.0,
+                              max_value=2.0, step=0.1)
+        exp_score = st.slider("Experience score", min_value=0.0,
+                              max_value=2.0, step=0.1)
 
-        st.success(f"The customer satisfaction is {result[0][0]}")
+        if st.button("Predict"):
+            model = load_model()
+            result = model.predict(pd.DataFrame([[eng_score, exp_score]], columns=SCORE_COLUMNS))
+
+            st.success(f"The customer satisfaction is {result[0][0]}")
+
+    st.header("Bulk prediction")
+    uploaded = st.file_uploader(
+        "Upload a CSV with engagement_score and experience_score columns", type="csv")
+    if uploaded is not None:
+        df = pd.read_csv(uploaded)
+        missing = [column for column in SCORE_COLUMNS if column not in df.columns]
+        if missing:
+            st.error(f"The file is missing the columns: {', '.join(missing)}")
+            return
+
+        model = load_model()
+        df['satisfaction_score'] = model.predict(df[SCORE_COLUMNS]).ravel()
+        st.success(f"Predicted the satisfaction of {len(df)} customers")
+        st.write(df.head(100))
+        st.download_button("Download predictions", df.to_csv(index=False).encode('utf-8'),
+                           file_name='satisfaction_predictions.csv', mime='text/csv')
@@ -0,0 +1,263 @@
+"""Dataframe backends of PreProcess, Outlier and Overview.
+
+pandas is the default backend. A method of the analysis classes called
+with a Polars DataFrame or LazyFrame runs on the Polars backend instead:
+the transforms (renaming, parsing, imputation, capping, log scaling,
+duplicate removal) only add expressions to a LazyFrame, which Polars
+optimizes and runs on every core when it is collected, and the statistics
+(missing values, skewness, outlier counts) are computed in a single query
+and returned as the same pandas objects as the pandas backend.
+
+The two backends give the same results for every method with a Polars
+version; the other public methods raise NotImplementedError when given a
+Polars frame instead of failing inside pandas code. Polars makes no difference
+between NaN and null once the frame comes from pandas (``to_backend``
+turns NaN into nulls), standard deviations are population ones like NumPy
+and quantiles interpolate linearly like pandas.
+
+    lf = to_backend(pd.read_csv('../data/Week1_challenge_data_source(CSV).csv'), 'polars')
+    lf = PreProcess().clean_feature_name(lf)
+"""
+import functools
+import sys
+
+import pandas as pd
+from schema import DATETIME_FORMAT
+from sketch import sketch_quantiles
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+BACKENDS = ('pandas', 'polars')
+
+
+def is_polars(df) -> bool:
+    """Return True for a Polars DataFrame or LazyFrame."""
+    return type(df).__module__.split('.')[0] == 'polars'
+
+
+def to_backend(df, backend: str = 'pandas'):
+    """Convert a frame to a backend.
+
+    Args:
+        df (pd.DataFrame | pl.DataFrame | pl.LazyFrame): the frame
+        backend (str, optional): 'pandas' or 'polars'. Defaults to 'pandas'.
+
+    Returns:
+        pd.DataFrame | pl.LazyFrame: the frame on the backend
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend {backend}, expected one of {BACKENDS}')
+    if backend == 'pandas':
+        if not is_polars(df):
+            return df
+        return (df.collect() if isinstance(df, pl.LazyFrame) else df).to_pandas()
+    if pl is None:
+        raise ImportError('The polars backend needs polars, pip install polars')
+    if is_polars(df):
+        return df.lazy()
+    return pl.from_pandas(df, nan_to_null=True).lazy()
+
+
+def _lazy(df) -> 'pl.LazyFrame':
+    return df.lazy()
+
+
+def _names(lf) -> list:
+    return lf.collect_schema().names()
+
+
+def _numeric(lf, cols=None) -> list:
+    schema = lf.collect_schema()
+    cols = schema.names() if cols is None else list(cols)
+    return [c for c in cols if schema[c].is_numeric()]
+
+
+def _row(lf, exprs: list) -> dict:
+    """Run one aggregation query and return its single row as a dict."""
+    return lf.select(exprs).collect().row(0, named=True)
+
+
+def _bounds(lf, cols: list, factor: float = 1.5, thres: float = 3,
+            percentiles: tuple = (10, 90)) -> pd.DataFrame:
+    """Return the bounds of every method for every column in one query."""
+    exprs = []
+    for c in cols:
+        x = pl.col(c).cast(pl.Float64)
+        exprs += [x.mean().alias(f'{c}\0mean'), x.std(ddof=0).alias(f'{c}\0std'),
+                  x.quantile(0.25, 'linear').alias(f'{c}\0q1'), x.quantile(0.75, 'linear').alias(f'{c}\0q3'),
+                  x.quantile(percentiles[0] / 100, 'linear').alias(f'{c}\0low'),
+                  x.quantile(percentiles[1] / 100, 'linear').alias(f'{c}\0high')]
+    row = _row(lf, exprs)
+    stats = pd.DataFrame({c: {k: row[f'{c}\0{k}'] for k in ('mean', 'std', 'q1', 'q3', 'low', 'high')}
+                          for c in cols}).T.astype(float)
+    iqr = stats['q3'] - stats['q1']
+    return pd.DataFrame({
+        'zscore_lower': stats['mean'] - thres * stats['std'], 'zscore_upper': stats['mean'] + thres * stats['std'],
+        'iqr_lower': stats['q1'] - factor * iqr, 'iqr_upper': stats['q3'] + factor * iqr,
+        'percentile_lower': stats['low'], 'percentile_upper': stats['high'],
+    })
+
+
+def _counts(lf, cols: list, bounds: pd.DataFrame, methods: tuple) -> pd.DataFrame:
+    exprs = [((pl.col(c) < bounds.at[c, f'{m}_lower']) | (pl.col(c) > bounds.at[c, f'{m}_upper']))
+             .sum().alias(f'{c}\0{m}') for c in cols for m in methods]
+    row = _row(lf, exprs)
+    return pd.DataFrame({m: pd.Series([int(row[f'{c}\0{m}']) for c in cols], index=pd.Index(cols))
+                         for m in methods})
+
+
+class PolarsPreProcess:
+    """Polars implementation of the PreProcess methods, self is the PreProcess instance."""
+
+    def convert_to_datetime(self, df, column: str):
+        lf = _lazy(df)
+        if lf.collect_schema()[column] == pl.String:
+            return lf.with_columns(pl.col(column).str.to_datetime(DATETIME_FORMAT, strict=False))
+        return lf.with_columns(pl.col(column).cast(pl.Datetime, strict=False))
+
+    def convert_to_float(self, df, column):
+        columns = [column] if isinstance(column, str) else list(column)
+        return _lazy(df).with_columns(pl.col(columns).cast(pl.Float64, strict=False))
+
+    def convert_to_str(self, df, column):
+        columns = [column] if isinstance(column, str) else list(column)
+        return _lazy(df).with_columns(pl.col(columns).cast(pl.String))
+
+    def clean_feature_name(self, df):
+        return _lazy(df).rename(lambda column: column.replace(' ', '_').lower())
+
+    def missing_values_percentage(self, df):
+        lf = _lazy(df)
+        counts = _row(lf, [pl.all().null_count()])
+        rows = _row(lf, [pl.len()])['len']
+        total = pd.Series(counts).sort_values(ascending=False)
+        return pd.DataFrame({'Total Missing Values': total,
+                             'Percentage Missing': total / rows * 100})
+
+    def fill_nulls_with_method(self, df, method, values: pd.Series = None, approximate: bool = False):
+        lf = _lazy(df)
+        numeric = _numeric(lf)
+        if method in ('mean', 'median'):
+            if values is not None:
+                fills = [pl.col(c).fill_null(values[c]) for c in numeric if c in values.index]
+            elif method == 'mean':
+                fills = [pl.col(c).fill_null(pl.col(c).mean()) for c in numeric]
+            else:
+                fills = [pl.col(c).fill_null(pl.col(c).median()) for c in numeric]
+        elif method == 'mode':
+            others = [c for c in _names(lf) if c not in numeric]
+            if values is not None:
+                fills = [pl.col(c).fill_null(values[c]) for c in others if c in values.index]
+            else:
+                # pandas keeps the smallest of the most frequent values
+                fills = [pl.col(c).fill_null(pl.col(c).drop_nulls().mode().sort().first()) for c in others]
+        else:
+            strategy = {'ffill': 'forward', 'pad': 'forward', 'bfill': 'backward', 'backfill': 'backward'}
+            return lf.with_columns(pl.all().fill_null(strategy=strategy[method]))
+        return lf.with_columns(fills)
+
+    def drop_duplicates(self, df, columns: list = None):
+        return _lazy(df).unique(subset=columns, keep='first', maintain_order=True)
+
+    def num_outliers(self, col):
+        values = pl.Series(col).cast(pl.Float64)
+        return int(((values - values.mean()).abs() > 3 * values.std(ddof=0)).sum())
+
+    def logscale(self, df, cols, n_jobs: int = None):
+        return _lazy(df).with_columns(pl.col(list(cols)).cast(pl.Float64).log())
+
+
+class PolarsOutlier:
+    """Polars implementation of the Outlier methods, self is the Outlier instance."""
+
+    def handle_outliers(self, df, cols, n_jobs: int = None):
+        return _lazy(df).with_columns(pl.col(list(cols)).cast(pl.Float64).log())
+
+    def calculate_num_outliers_iqr(self, df, cols):
+        lf = _lazy(df)
+        cols = list(cols)
+        return _counts(lf, cols, _bounds(lf, cols), ('iqr',))['iqr'].to_dict()
+
+    def iqr_capping(self, df, cols, factor=1.5, approximate: bool = False, sketches: dict = None):
+        lf = _lazy(df)
+        cols = _numeric(lf) if cols is None else list(cols)
+        if sketches is not None:
+            # global fences of the full dataset, as on the pandas backend
+            q1 = sketch_quantiles({c: sketches[c] for c in cols}, 0.25)
+            q3 = sketch_quantiles({c: sketches[c] for c in cols}, 0.75)
+            lower, upper = q1 - factor * (q3 - q1), q3 + factor * (q3 - q1)
+        else:
+            if approximate:
+                self.logger.info('The polars backend computes exact quartiles, approximate is ignored')
+            bounds = _bounds(lf, cols, factor)
+            lower, upper = bounds['iqr_lower'], bounds['iqr_upper']
+        return lf.select([pl.col(c).cast(pl.Float64).clip(lower[c], upper[c]) for c in cols])
+
+    def outlier_summary(self, df, cols=None):
+        lf = _lazy(df)
+        cols = _numeric(lf) if cols is None else list(cols)
+        return _counts(lf, cols, _bounds(lf, cols), ('zscore', 'iqr', 'percentile'))
+
+
+class PolarsOverview:
+    """Polars implementation of the Overview methods, self is the Overview instance."""
+
+    def percent_missing(self, df):
+        lf = _lazy(df)
+        nulls = sum(_row(lf, [pl.all().null_count()]).values())
+        size = _row(lf, [pl.len()])['len'] * len(_names(lf))
+        if size == 0:
+            self.logger.exception('You provided empty dataframe')
+            sys.exit(1)
+        return round(nulls / size * 100, 2)
+
+    def number_of_duplicates(self, df, columns: list = None):
+        lf = _lazy(df)
+        row = _row(lf, [pl.len().alias('rows'),
+                        pl.struct(columns or _names(lf)).n_unique().alias('unique')])
+        duplicates = row['rows'] - row['unique']
+        self.logger.info(f'{duplicates} duplicated rows over {len(_names(lf))} columns')
+        return duplicates
+
+    def get_skewness(self, df):
+        lf = _lazy(df)
+        cols = _numeric(lf)
+        row = _row(lf, [pl.col(c).cast(pl.Float64).skew(bias=False) for c in cols])
+        return pd.Series(row, dtype=float).reindex(cols)
+
+
+def dispatch(implementation):
+    """Class decorator running a method on Polars when its first argument is a Polars frame.
+
+    A public method without a Polars version raises NotImplementedError when its
+    first argument is a Polars frame.
+
+    Args:
+        implementation (type): class holding the Polars version of some methods, called
+            with the instance of the decorated class as self
+
+    Returns:
+        callable: the class decorator
+    """
+    def decorate(cls):
+        for name, func in list(vars(cls).items()):
+            if name.startswith('_') or not callable(func) or isinstance(func, type):
+                continue
+
+            def wrap(name, func, polars_func):
+                @functools.wraps(func)
+                def wrapper(self, *args, **kwargs):
+                    if args and is_polars(args[0]):
+                        if polars_func is None:
+                            raise NotImplementedError(f'{name} has no polars backend, '
+                                                      f'convert the frame with to_backend(df, "pandas")')
+                        return polars_func(self, *args, **kwargs)
+                    return func(self, *args, **kwargs)
+                return wrapper
+
+            setattr(cls, name, wrap(name, func, getattr(implementation, name, None)))
+        return cls
+    return decorate
@@ -0,0 +1,199 @@
+"""Paged, memory-mapped access to the rows of the cleaned dataset.
+
+The dataset is converted once to an uncompressed Arrow IPC file next to it,
+``<name>.arrow``. ``PagedTable`` memory-maps that file, so opening it reads
+no rows: a page (offset, limit) over any subset of columns is a zero-copy
+slice whose cost does not depend on the offset, and only the touched pages
+of the file are read from disk. Equality filters, e.g. on the MSISDN or the
+handset type, go through a per-column hash index built on the first lookup.
+
+``tables`` is a process-wide cache, so every Streamlit session shares one
+mapping and one set of indexes, and the operating system shares the mapped
+pages between processes. The Arrow file is rebuilt when the source dataset
+is newer.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from logger import Logger
+from storage import csv_convert_options
+
+logger = Logger("browser.log").get_app_logger()
+
+
+def build_arrow(source: str, path: str, batch_size: int = 100_000) -> str:
+    """Convert a csv or parquet dataset to an uncompressed Arrow IPC file, batch by batch.
+
+    Args:
+        source (str): csv or parquet file
+        path (str): Arrow file to be written
+        batch_size (int, optional): rows per record batch. Defaults to 100_000.
+
+    Returns:
+        str: the path
+    """
+    if source.endswith('.parquet'):
+        reader = pq.ParquetFile(source)
+        schema, batches = reader.schema_arrow, reader.iter_batches(batch_size)
+    else:
+        read_options = pacsv.ReadOptions(block_size=64 << 20)
+        reader = pacsv.open_csv(source, read_options=read_options,
+                                convert_options=csv_convert_options(source, read_options))
+        schema, batches = reader.schema, reader
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+    finally:
+        # release the source file handle, also when the conversion fails
+        reader.close()
+    os.replace(tmp, path)
+    logger.info(f'Converted {source} to {path}')
+    return path
+
+
+class PagedTable:
+    def __init__(self, path: str):
+        """Memory-map an Arrow IPC file.
+
+        Args:
+            path (str): Arrow file written by build_arrow
+        """
+        self.path = path
+        self.source = pa.memory_map(path, 'r')
+        self.table = pa.ipc.open_file(self.source).read_all()
+        self.columns = self.table.column_names
+        self.num_rows = self.table.num_rows
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _coerce(self, column: str, value):
+        """Convert a value typed in the page to the type of the column."""
+        kind = self.table.schema.field(column).type
+        if pa.types.is_floating(kind) or pa.types.is_integer(kind):
+            return float(value)
+        return value
+
+    def index(self, column: str) -> tuple:
+        """Return the hash index of a column, building it on first use.
+
+        Args:
+            column (str): column name
+
+        Returns:
+            tuple: row numbers grouped by value and the (start, end) of every value
+        """
+        entry = self._indexes.get(column)
+        if entry is not None:
+            return entry
+        with self._lock:
+            if column not in self._indexes:
+                values = self.table.column(column).to_pandas()
+                if pd.api.types.is_numeric_dtype(values):
+                    values = values.astype(float)
+                # missing values get the code -1 and sort first, the stable sort keeps
+                # the rows of every value in ascending order
+                codes, uniques = pd.factorize(values)
+                order = np.argsort(codes, kind='stable')
+                bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+                positions = {value: (bounds[i], bounds[i + 1]) for i, value in enumerate(uniques.tolist())}
+                self._indexes[column] = (order, positions)
+                logger.info(f'Indexed {len(uniques)} values of {column} in {self.path}')
+            return self._indexes[column]
+
+    def count(self, where: dict = None) -> int:
+        """Return the number of rows matching the filters.
+
+        Args:
+            where (dict, optional): column to value equality filters. Defaults to None.
+
+        Returns:
+            int: number of matching rows
+        """
+        if not where:
+            return self.num_rows
+        return len(self._rows(where))
+
+    def _rows(self, where: dict) -> np.ndarray:
+        rows = None
+        for column, value in where.items():
+            order, positions = self.index(column)
+            start, end = positions.get(self._coerce(column, value), (0, 0))
+            matches = order[start:end]
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+        return rows
+
+    def page(self, offset: int = 0, limit: int = 10, columns: list = None, where: dict = None) -> pd.DataFrame:
+        """Return one page of rows.
+
+        Args:
+            offset (int, optional): first row of the page. Defaults to 0.
+            limit (int, optional): number of rows of the page. Defaults to 10.
+            columns (list, optional): columns of the page. Defaults to all columns.
+            where (dict, optional): column to value equality filters, e.g.
+                {'handset_type': 'Huawei B528S-23A'}. Defaults to None.
+
+        Returns:
+            pd.DataFrame: the rows, indexed by their row number in the dataset
+        """
+        offset, limit = max(int(offset), 0), max(int(limit), 0)
+        table = self.table.select(columns) if columns else self.table
+        if where:
+            rows = self._rows(where)[offset:offset + limit]
+            df = table.take(pa.array(rows, type=pa.int64())).to_pandas()
+            df.index = rows
+        else:
+            df = table.slice(offset, limit).to_pandas()
+            df.index = pd.RangeIndex(offset, offset + len(df))
+        return df
+
+
+class TableCache:
+    def __init__(self):
+        """Initialize an empty cache."""
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def get(self, root: str = './data', name: str = 'cleaned_data2') -> PagedTable:
+        """Return the shared PagedTable of a dataset, converting it on first use.
+
+        Args:
+            root (str, optional): data directory. Defaults to './data'.
+            name (str, optional): dataset name, read from name.parquet or name.csv.
+                Defaults to 'cleaned_data2'.
+
+        Returns:
+            PagedTable: the memory-mapped dataset
+        """
+        source = os.path.join(root, f'{name}.parquet')
+        if not os.path.exists(source):
+            source = os.path.join(root, f'{name}.csv')
+        path = os.path.abspath(os.path.join(root, f'{name}.arrow'))
+        signature = os.stat(source).st_mtime_ns
+        entry = self._tables.get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        with self._lock:
+            entry = self._tables.get(path)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+            if not os.path.exists(path) or os.stat(path).st_mtime_ns < signature:
+                build_arrow(source, path)
+            table = PagedTable(path)
+            self._tables[path] = (signature, table)
+            return table
+
+    def clear(self) -> None:
+        """Forget every mapped table."""
+        with self._lock:
+            self._tables.clear()
+
+
+tables = TableCache()
@@ -0,0 +1,341 @@
+"""Precomputed aggregates of the Overview page.
+
+DashboardBuilder derives every table and chart of the Overview page from
+the current cleaned dataset: top handsets and manufacturers, the sessions
+per user, the duration distribution and deciles, the data per application
+and its top users, read from the usage cube of traffic.py, and the
+engagement and experience clusters. Each table is written as a small
+parquet file under a version directory, ``<root>/dashboard/<version>/``,
+next to a snapshot of the top-K leaderboards of the user metrics
+(leaderboard.pkl), and ``manifest.json`` is replaced atomically once all
+files are written. The leaderboards are not recomputed: the boards kept in
+``<root>/leaderboard/`` are advanced with the sessions appended since the
+previous version, see leaderboard.advance. The version is a hash of the source file's size and mtime, so it changes
+exactly when the data does.
+
+The page reads the tables and the leaderboards through ``aggregates``, an
+in-process cache shared by every Streamlit session. Only the manifest is
+read on a rerun and the tables are reloaded when the version changes. When
+the source dataset is newer than the manifest, the aggregates are rebuilt
+once on a background thread (or with the command below) while the page
+keeps serving the previous version, flagged by ``aggregates.stale``.
+
+    python src/dashboard.py --root ../data --source cleaned_data2
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+from leaderboard import Leaderboard, advance
+from logger import Logger
+from pipeline.train_pipeline import (ENGAGEMENT_FEATURES, ENGAGEMENT_METRICS,
+                                     EXPERIENCE_FEATURES, EXPERIENCE_METRICS,
+                                     USER_KEY, UserAggregator,
+                                     normalize_features)
+from registry import registry
+from storage import DataStore
+from traffic import APPLICATIONS, TrafficEngine
+
+logger = Logger("dashboard.log").get_app_logger()
+
+# bumped when the aggregates change, so that old versions are rebuilt
+AGGREGATES_VERSION = 3
+MANIFEST = 'manifest.json'
+LEADERBOARD = 'leaderboard.pkl'
+
+APPS = APPLICATIONS
+SOURCE_COLUMNS = (
+    [USER_KEY, 'bearer_id', 'dur._(ms)', 'handset_type', 'handset_manufacturer',
+     'avg_rtt_dl_(ms)', 'avg_rtt_ul_(ms)', 'avg_bearer_tp_dl_(kbps)', 'avg_bearer_tp_ul_(kbps)',
+     'tcp_dl_retrans._vol_(bytes)', 'tcp_ul_retrans._vol_(bytes)',
+     'total_dl_(bytes)', 'total_ul_(bytes)']
+    + [f'{app}_{way}_(bytes)' for app in APPS for way in ('dl', 'ul')]
+)
+
+
+def source_path(store: DataStore, source: str) -> str:
+    """Return the file the store reads a dataset from, parquet first, then csv."""
+    if store.exists(source):
+        return store.path(source)
+    return os.path.join(store.root, f'{source}.csv')
+
+
+def source_version(path: str, version: int = AGGREGATES_VERSION) -> str:
+    """Return the version of the tables derived from a source file, e.g. the aggregates."""
+    stat = os.stat(path)
+    signature = f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}:{version}'
+    return hashlib.sha1(signature.encode()).hexdigest()[:12]
+
+
+def read_source(store: DataStore, source: str, columns: list = SOURCE_COLUMNS + ['total_data']) -> pd.DataFrame:
+    """Read the columns of a dataset that it has, from parquet or csv."""
+    path = source_path(store, source)
+    if path.endswith('.parquet'):
+        names = set(store.schema(source).names)
+    else:
+        names = set(pd.read_csv(path, nrows=0).columns)
+    return store.read(source, columns=[c for c in columns if c in names])
+
+
+def _top(series: pd.Series, n: int, name: str) -> pd.DataFrame:
+    counts = series.value_counts().head(n)
+    return pd.DataFrame({name: counts.index.astype(str), 'count': counts.to_numpy()})
+
+
+def _clusters(features: pd.DataFrame, columns: list, model_path: str) -> pd.DataFrame:
+    """Return the size and mean features of every cluster of a saved k-means model."""
+    if not os.path.exists(model_path):
+        return None
+    X = features[columns].replace([np.inf, -np.inf], np.nan)
+    labels = registry.get(model_path).predict(normalize_features(X, X.mean()))
+    table = X.groupby(labels).mean()
+    table.insert(0, 'users', np.bincount(labels, minlength=len(table))[table.index])
+    return table.rename_axis('cluster').reset_index()
+
+
+def compute_aggregates(df: pd.DataFrame, model_dir: str = None, leaderboard_dir: str = None) -> tuple:
+    """Compute every table of the Overview page from the cleaned dataset.
+
+    Args:
+        df (pd.DataFrame): cleaned xDR sessions
+        model_dir (str, optional): directory of user_eng.pkl and user_exp.pkl, the
+            cluster tables are skipped without it. Defaults to None.
+        leaderboard_dir (str, optional): state directory of the leaderboards, advanced
+            with the sessions they have not merged yet, see leaderboard.advance. The
+            leaderboards are skipped without it. Defaults to None.
+
+    Returns:
+        tuple: dict of table name to dataframe and the Leaderboard, or None
+    """
+    # the application totals, total_data and the usage cube in one pass
+    df, cube = TrafficEngine().run(df)
+    tables = {
+        'top_10_handset': _top(df['handset_type'], 10, 'handset_type'),
+        'top_3_manuf': _top(df['handset_manufacturer'], 3, 'handset_manufacturer'),
+    }
+    top_3 = tables['top_3_manuf']['handset_manufacturer']
+    tables['top_5_handset_per_manuf'] = pd.concat(
+        [_top(df.loc[df['handset_manufacturer'] == m, 'handset_type'], 5, 'handset_type')
+         .assign(handset_manufacturer=m) for m in top_3], ignore_index=True)
+    tables['top_5_apple'] = _top(df.loc[df['handset_manufacturer'] == 'Apple', 'handset_type'],
+                                 5, 'Handset')
+
+    engagement, experience = UserAggregator().user_features(df, ENGAGEMENT_METRICS, EXPERIENCE_METRICS)
+    tables['top_5_session'] = engagement.nlargest(5, 'sessions').reset_index()
+
+    counts, edges = np.histogram(df['dur._(ms)'].dropna(), bins=50)
+    tables['duration_hist'] = pd.DataFrame({'start': edges[:-1], 'end': edges[1:], 'count': counts})
+
+    usage = cube.totals()
+    tables['app_usage'] = pd.DataFrame({'application': usage.index, 'total_bytes': usage.to_numpy()})
+    tables['top_10_per_app'] = pd.concat(
+        [cube.top_users(app, 10).rename('total_bytes').reset_index().assign(application=app)
+         for app in cube.applications], ignore_index=True)
+
+    deciles = pd.qcut(engagement['dur._(ms)'].rank(method='first'), 10, labels=range(1, 11))
+    tables['duration_deciles'] = (engagement.groupby(deciles, observed=True)
+                                  .agg(users=('sessions', 'size'), total_data=('total_data', 'sum'),
+                                       duration=('dur._(ms)', 'sum'))
+                                  .rename_axis('decile').reset_index())
+
+    leaderboard = advance(df, leaderboard_dir) if leaderboard_dir is not None else None
+
+    if model_dir is not None:
+        for name, features, columns, model in [
+                ('engagement_clusters', engagement, ENGAGEMENT_FEATURES, 'user_eng.pkl'),
+                ('experience_clusters', experience, EXPERIENCE_FEATURES, 'user_exp.pkl')]:
+            table = _clusters(features, columns, os.path.join(model_dir, model))
+            if table is not None:
+                tables[name] = table
+    return tables, leaderboard
+
+
+class DashboardBuilder:
+    def __init__(self, store: DataStore = None, source: str = 'cleaned_data2',
+                 model_dir: str = '../models', keep: int = 2):
+        """Initialize the DashboardBuilder class.
+
+        Args:
+            store (DataStore, optional): store of the cleaned dataset, the aggregates are
+                written under its root. Defaults to DataStore().
+            source (str, optional): name of the cleaned dataset. Defaults to 'cleaned_data2'.
+            model_dir (str, optional): directory of the clustering models. Defaults to '../models'.
+            keep (int, optional): number of versions kept on disk. Defaults to 2.
+        """
+        try:
+            self.logger = Logger("dashboard.log").get_app_logger()
+            self.store = store or DataStore()
+            self.source = source
+            self.model_dir = model_dir
+            self.keep = keep
+            self.directory = os.path.join(self.store.root, 'dashboard')
+            self.logger.info('Successfully Instantiated DashboardBuilder Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate DashboardBuilder Class Object')
+            sys.exit(1)
+
+    def build(self) -> dict:
+        """Compute the aggregates of the current dataset and publish them.
+
+        Returns:
+            dict: the manifest with the version, the source and the table names
+        """
+        path = source_path(self.store, self.source)
+        version = source_version(path)
+        df = read_source(self.store, self.source)
+        leaderboard_dir = os.path.join(self.store.root, 'leaderboard')
+        tables, leaderboard = compute_aggregates(df, self.model_dir, leaderboard_dir)
+
+        version_dir = os.path.join(self.directory, version)
+        os.makedirs(version_dir, exist_ok=True)
+        for name, table in tables.items():
+            table.to_parquet(os.path.join(version_dir, f'{name}.parquet'), index=False)
+        leaderboard.save(os.path.join(version_dir, LEADERBOARD))
+        manifest = {'version': version, 'source': os.path.abspath(path), 'rows': len(df),
+                    'created': pd.Timestamp.now().isoformat(timespec='seconds'),
+                    'tables': sorted(tables), 'leaderboard': LEADERBOARD}
+        tmp = os.path.join(self.directory, f'.{MANIFEST}.{os.getpid()}')
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, os.path.join(self.directory, MANIFEST))
+        self._prune(version)
+        self.logger.info(f'Published dashboard aggregates {version} of {len(df)} rows of {path}')
+        return manifest
+
+    def _prune(self, current: str) -> None:
+        """Remove the oldest versions, a reader may still be loading the previous one."""
+        versions = [d for d in os.listdir(self.directory)
+                    if os.path.isdir(os.path.join(self.directory, d)) and d != current]
+        versions.sort(key=lambda d: os.path.getmtime(os.path.join(self.directory, d)), reverse=True)
+        for old in versions[max(self.keep - 1, 0):]:
+            shutil.rmtree(os.path.join(self.directory, old), ignore_errors=True)
+
+
+class AggregateCache:
+    def __init__(self):
+        """Initialize an empty cache."""
+        self._entries = {}
+        self._boards = {}
+        self._builds = {}
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def _manifest(self, directory: str) -> dict:
+        try:
+            with open(os.path.join(directory, MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def get(self, root: str = './data', source: str = 'cleaned_data2', model_dir: str = './models') -> tuple:
+        """Return the last published aggregates, rebuilding them in the background if the dataset changed.
+
+        The aggregates are only built in the request when none were ever published.
+        Otherwise the previous version is served until the rebuild publishes the new one,
+        see stale.
+
+        Args:
+            root (str, optional): data directory. Defaults to './data'.
+            source (str, optional): name of the cleaned dataset. Defaults to 'cleaned_data2'.
+            model_dir (str, optional): directory of the clustering models. Defaults to './models'.
+
+        Returns:
+            tuple: the manifest and a dict of table name to dataframe
+        """
+        directory = os.path.abspath(os.path.join(root, 'dashboard'))
+        manifest = self._manifest(directory)
+        entry = self._entries.get(directory)
+        if entry is not None and manifest is not None and entry[0]['version'] == manifest['version']:
+            if self._stale(root, source, manifest):
+                self._refresh(directory, root, source, model_dir)
+            return entry
+
+        with self._lock:
+            manifest = self._manifest(directory)
+            if manifest is None:
+                manifest = DashboardBuilder(DataStore(root), source, model_dir).build()
+            elif self._stale(root, source, manifest):
+                self._refresh(directory, root, source, model_dir)
+            entry = self._entries.get(directory)
+            if entry is not None and entry[0]['version'] == manifest['version']:
+                return entry
+            version_dir = os.path.join(directory, manifest['version'])
+            tables = {name: pd.read_parquet(os.path.join(version_dir, f'{name}.parquet'))
+                      for name in manifest['tables']}
+            self._boards[directory] = Leaderboard.load(os.path.join(version_dir, manifest['leaderboard']))
+            self._entries[directory] = (manifest, tables)
+            logger.info(f'Loaded dashboard aggregates {manifest["version"]}')
+            return manifest, tables
+
+    def _refresh(self, directory: str, root: str, source: str, model_dir: str) -> None:
+        """Start rebuilding the aggregates on a background thread, once per source version."""
+        version = source_version(self._path(root, source))
+        with self._build_lock:
+            if self._builds.get(directory, (None,))[0] == version:
+                return
+            thread = threading.Thread(target=self._rebuild, args=(root, source, model_dir),
+                                      name=f'dashboard-{version}', daemon=True)
+            # a failed build is not retried until the dataset changes again
+            self._builds[directory] = (version, thread)
+            thread.start()
+        logger.info(f'Rebuilding dashboard aggregates {version} in the background')
+
+    def _rebuild(self, root: str, source: str, model_dir: str) -> None:
+        try:
+            DashboardBuilder(DataStore(root), source, model_dir).build()
+        except BaseException:
+            logger.exception('Failed to rebuild the dashboard aggregates')
+
+    def stale(self, root: str = './data', source: str = 'cleaned_data2') -> bool:
+        """Return True while the served aggregates are older than the dataset."""
+        directory = os.path.abspath(os.path.join(root, 'dashboard'))
+        entry = self._entries.get(directory)
+        return entry is not None and self._stale(root, source, entry[0])
+
+    def wait(self, root: str = './data', timeout: float = None) -> None:
+        """Wait for the background rebuild of a data directory, e.g. in a script."""
+        build = self._builds.get(os.path.abspath(os.path.join(root, 'dashboard')))
+        if build is not None:
+            build[1].join(timeout)
+
+    def leaderboard(self, root: str = './data', source: str = 'cleaned_data2',
+                    model_dir: str = './models') -> Leaderboard:
+        """Return the leaderboards of the current aggregates, see get."""
+        self.get(root, source, model_dir)
+        return self._boards[os.path.abspath(os.path.join(root, 'dashboard'))]
+
+    def _path(self, root: str, source: str) -> str:
+        path = os.path.join(root, f'{source}.parquet')
+        return path if os.path.exists(path) else os.path.join(root, f'{source}.csv')
+
+    def _stale(self, root: str, source: str, manifest: dict) -> bool:
+        """Return True when the source dataset no longer has the version of the manifest."""
+        path = self._path(root, source)
+        if not os.path.exists(path):
+            return False
+        return source_version(path) != manifest['version']
+
+    def clear(self) -> None:
+        """Forget every cached version."""
+        with self._lock:
+            self._entries.clear()
+            self._boards.clear()
+            self._builds.clear()
+
+
+aggregates = AggregateCache()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute the Overview page aggregates.')
+    parser.add_argument('--root', default=os.path.join('..', 'data'))
+    parser.add_argument('--source', default='cleaned_data2')
+    parser.add_argument('--model-dir', default=os.path.join('..', 'models'))
+    args = parser.parse_args()
+    print(json.dumps(DashboardBuilder(DataStore(args.root), args.source, args.model_dir).build(), indent=2))
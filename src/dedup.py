@@ -0,0 +1,214 @@
+"""Hash-based duplicate detection over chunks and files.
+
+Every row is hashed once to a uint64 with ``pd.util.hash_pandas_object``,
+over all columns or over a key subset such as ``['bearer_id', 'start']``.
+The hashes already seen are kept in a HashSet, a few sorted uint64 runs
+(8 bytes per distinct row, whatever the width of the table), so a
+duplicate is found against every earlier chunk or file without keeping
+the rows themselves. A row is a duplicate when an earlier row has the same
+hash, the first occurrence is kept, as in ``df.duplicated()``. Two distinct
+rows share a 64-bit hash with probability about ``n**2 / 2**65``, i.e.
+once in 40 billion rows for 1 million distinct rows.
+"""
+import os
+import sys
+from typing import Iterable, Iterator, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from logger import Logger, stage
+
+
+def row_hashes(df: pd.DataFrame, columns: list = None) -> np.ndarray:
+    """Return one uint64 hash per row.
+
+    Args:
+        df (pd.DataFrame): the rows
+        columns (list, optional): key columns, defaults to every column
+
+    Returns:
+        np.ndarray: the hashes
+    """
+    frame = df[list(columns)] if columns is not None else df
+    # a csv chunk without nulls reads a column as int64 and the next one as float64,
+    # numbers are hashed as float64 so that both give the same hash
+    numeric = [c for c in frame.columns if pd.api.types.is_numeric_dtype(frame[c])
+               and not pd.api.types.is_float_dtype(frame[c])]
+    if numeric:
+        frame = frame.astype({c: np.float64 for c in numeric})
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+class HashSet:
+    """Set of uint64 hashes kept as sorted runs.
+
+    New hashes are appended as a sorted run and two runs are merged while the
+    newer one is at least half the size of the older one, so there are at
+    most ``log2(n)`` runs, a lookup is one binary search per run and every
+    hash is merged ``O(log n)`` times.
+    """
+
+    def __init__(self):
+        """Initialize an empty set."""
+        self.runs = []
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self.runs)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(run.nbytes for run in self.runs)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """Return a boolean mask of the hashes already in the set."""
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            position = np.searchsorted(run, hashes)
+            position[position == len(run)] = 0
+            found |= run[position] == hashes
+        return found
+
+    def add(self, hashes: np.ndarray) -> None:
+        """Add hashes that are distinct and not in the set yet."""
+        if len(hashes) == 0:
+            return
+        self.runs.append(np.sort(hashes))
+        while len(self.runs) > 1 and 2 * len(self.runs[-1]) >= len(self.runs[-2]):
+            newer = self.runs.pop()
+            self.runs[-1] = np.sort(np.concatenate([self.runs[-1], newer]), kind='stable')
+
+    def clear(self) -> None:
+        self.runs = []
+
+
+class Deduplicator:
+    def __init__(self, columns: list = None, chunksize: int = 500_000, sample_size: int = 10):
+        """Initialize the Deduplicator class.
+
+        Args:
+            columns (list, optional): key columns of a duplicate, e.g.
+                ['bearer_id', 'start']. Defaults to every column.
+            chunksize (int, optional): number of rows per chunk read from a file.
+                Defaults to 500_000.
+            sample_size (int, optional): number of duplicate rows kept as examples.
+                Defaults to 10.
+        """
+        try:
+            self.logger = Logger("preprocessing.log").get_app_logger()
+            self.columns = list(columns) if columns is not None else None
+            self.chunksize = chunksize
+            self.sample_size = sample_size
+            self.seen = HashSet()
+            self.reset()
+            self.logger.info('Successfully Instantiated Deduplicator Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate Deduplicator Class Object')
+            sys.exit(1)
+
+    def reset(self) -> None:
+        """Forget every row seen so far."""
+        self.seen.clear()
+        self.rows = 0
+        self.duplicates = 0
+        self._samples = []
+
+    def duplicated(self, chunk: pd.DataFrame) -> np.ndarray:
+        """Mark the rows of a chunk that repeat an earlier row of this or a previous chunk.
+
+        Args:
+            chunk (pd.DataFrame): the next rows
+
+        Returns:
+            np.ndarray: boolean mask, True for the duplicates
+        """
+        hashes = row_hashes(chunk, self.columns)
+        _, first = np.unique(hashes, return_index=True)
+        mask = np.ones(len(hashes), dtype=bool)
+        mask[first] = False
+        unique = hashes[first]
+        seen = self.seen.contains(unique)
+        mask[first[seen]] = True
+        self.seen.add(unique[~seen])
+
+        count = int(mask.sum())
+        self.rows += len(chunk)
+        self.duplicates += count
+        missing = self.sample_size - sum(len(s) for s in self._samples)
+        if count and missing > 0:
+            self._samples.append(chunk.iloc[np.flatnonzero(mask)[:missing]].copy())
+        return mask
+
+    def drop(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Return the rows of a chunk that were not seen before."""
+        return chunk[~self.duplicated(chunk)]
+
+    def iter_chunks(self, source: Union[str, pd.DataFrame, Iterable]) -> Iterator[pd.DataFrame]:
+        """Yield the chunks of a source.
+
+        Args:
+            source (str | pd.DataFrame | Iterable): a csv or parquet file, a dataframe,
+                or a list of files and dataframes read one after the other
+
+        Yields:
+            pd.DataFrame: the next chunk
+        """
+        if isinstance(source, pd.DataFrame):
+            yield source
+        elif isinstance(source, (str, os.PathLike)):
+            path = str(source)
+            if path.endswith('.parquet'):
+                for batch in pq.ParquetFile(path).iter_batches(self.chunksize):
+                    yield batch.to_pandas()
+            else:
+                yield from pd.read_csv(path, chunksize=self.chunksize)
+        else:
+            for part in source:
+                yield from self.iter_chunks(part)
+
+    def count(self, source: Union[str, pd.DataFrame, Iterable]) -> dict:
+        """Count the duplicates of a source without writing anything.
+
+        Args:
+            source (str | pd.DataFrame | Iterable): see iter_chunks
+
+        Returns:
+            dict: see summary
+        """
+        self.reset()
+        with stage('count_duplicates', self.logger) as record:
+            for chunk in self.iter_chunks(source):
+                self.duplicated(chunk)
+            record['rows'] = self.rows
+        return self.summary()
+
+    def run(self, source: Union[str, pd.DataFrame, Iterable], output_path: str) -> dict:
+        """Remove the duplicates of a source and write the distinct rows to a csv file.
+
+        Args:
+            source (str | pd.DataFrame | Iterable): see iter_chunks
+            output_path (str): path of the deduplicated csv file
+
+        Returns:
+            dict: see summary
+        """
+        self.reset()
+        header = True
+        with stage('drop_duplicates', self.logger) as record:
+            for chunk in self.iter_chunks(source):
+                self.drop(chunk).to_csv(output_path, mode='w' if header else 'a', header=header, index=False)
+                header = False
+            record['rows'] = self.rows
+        self.logger.info(f'Removed {self.duplicates} duplicates of {self.rows} rows, wrote {output_path}')
+        return self.summary()
+
+    def summary(self) -> dict:
+        """Return the counts of the rows seen since the last reset.
+
+        Returns:
+            dict: rows, duplicates, distinct rows, memory of the hash set in bytes and
+                a dataframe of sample duplicate rows
+        """
+        samples = pd.concat(self._samples) if self._samples else pd.DataFrame()
+        return {'rows': self.rows, 'duplicates': self.duplicates, 'distinct': self.rows - self.duplicates,
+                'hash_bytes': self.seen.nbytes, 'samples': samples}
@@ -0,0 +1,373 @@
+"""Subscriber feature store indexed by integer MSISDN.
+
+A FeatureTable keeps its rows sorted by MSISDN next to a sorted int64 key
+array. A point lookup is one binary search (``np.searchsorted``), and two
+tables are joined by merging their sorted keys in linear time instead of
+intersecting Python sets and calling ``pd.merge``.
+
+SubscriberStore holds the engagement, experience and satisfaction tables of
+every subscriber. It is built from the cleaned xDR sessions with
+UserAggregator and ScoringPipeline and saved as one parquet file per table
+under ``<root>/features/<version>/``, the version being a hash of the
+source file like the dashboard aggregates. ``stores`` is the process-wide
+cache the Predict page looks subscribers up in, it rebuilds a new version
+in the background while serving the previous one.
+
+    python src/feature_store.py --root ../data --source cleaned_data2
+"""
+import argparse
+import math
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from dashboard import read_source, source_path, source_version
+from logger import Logger
+from pipeline.predict_pipeline import ScoringPipeline
+from pipeline.train_pipeline import (ENGAGEMENT_METRICS, EXPERIENCE_METRICS,
+                                     USER_KEY, UserAggregator)
+from storage import DataStore
+
+logger = Logger("feature_store.log").get_app_logger()
+
+# bumped when the features change, so that old versions are rebuilt
+FEATURES_VERSION = 1
+TABLES = ('engagement', 'experience', 'satisfaction')
+# seconds a build directory of another process is left alone
+BUILD_GRACE = 3600
+
+
+def msisdn_keys(values) -> np.ndarray:
+    """Return MSISDNs, stored as float or int, as int64 keys."""
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        values = np.rint(values)
+    return values.astype(np.int64)
+
+
+def metric_columns(metrics: dict) -> list:
+    """Return the xDR columns the metrics are computed from."""
+    columns = []
+    for source, _ in metrics.values():
+        columns.extend(source if isinstance(source, tuple) else [source])
+    return list(dict.fromkeys(columns))
+
+
+class FeatureTable:
+    """Feature rows sorted by an int64 MSISDN key."""
+
+    def __init__(self, keys: np.ndarray, data: pd.DataFrame):
+        """Wrap rows already sorted by their distinct keys.
+
+        Args:
+            keys (np.ndarray): sorted, distinct int64 MSISDNs
+            data (pd.DataFrame): one row per key, in the same order
+        """
+        if len(keys) != len(data):
+            raise ValueError(f'{len(keys)} keys for {len(data)} rows')
+        if len(keys) > 1 and not (keys[1:] > keys[:-1]).all():
+            raise ValueError('Keys must be sorted and distinct, use FeatureTable.from_frame')
+        self.keys = keys
+        self.data = data.reset_index(drop=True)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, key: str = USER_KEY) -> 'FeatureTable':
+        """Build a table from a frame with the MSISDN as a column or as the index.
+
+        Args:
+            df (pd.DataFrame): one row per subscriber
+            key (str, optional): MSISDN column or index name. Defaults to 'msisdn/number'.
+
+        Returns:
+            FeatureTable: the rows with a key, sorted by key
+        """
+        keys = df[key] if key in df.columns else pd.Series(df.index, index=df.index)
+        present = keys.notna().to_numpy()
+        data = df.drop(columns=[key]) if key in df.columns else df
+        keys, data = msisdn_keys(keys[present]), data[present]
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        if len(keys) > 1 and (keys[1:] == keys[:-1]).any():
+            raise ValueError(f'{key} has repeated values, aggregate the sessions per subscriber first')
+        return cls(keys, data.iloc[order])
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def columns(self) -> list:
+        return list(self.data.columns)
+
+    def positions(self, keys) -> tuple:
+        """Return the row of every key and whether the key exists.
+
+        Args:
+            keys (array-like): MSISDNs
+
+        Returns:
+            tuple: row positions and a boolean mask of the keys found
+        """
+        keys = msisdn_keys(np.atleast_1d(keys))
+        positions = np.searchsorted(self.keys, keys)
+        inside = positions < len(self.keys)
+        found = np.zeros(len(keys), dtype=bool)
+        found[inside] = self.keys[positions[inside]] == keys[inside]
+        return positions, found
+
+    def lookup(self, msisdn) -> pd.Series:
+        """Return the features of one subscriber, None if unknown."""
+        positions, found = self.positions(msisdn)
+        if not found[0]:
+            return None
+        return self.data.iloc[positions[0]]
+
+    def take(self, keys) -> pd.DataFrame:
+        """Return the features of the known subscribers among keys, indexed by MSISDN."""
+        positions, found = self.positions(keys)
+        rows = self.data.iloc[positions[found]]
+        rows.index = pd.Index(self.keys[positions[found]], name=USER_KEY)
+        return rows
+
+    def join(self, other: 'FeatureTable') -> 'FeatureTable':
+        """Inner join two tables on the MSISDN with a merge of their sorted keys.
+
+        Args:
+            other (FeatureTable): table whose columns are added
+
+        Returns:
+            FeatureTable: the subscribers present in both tables with the columns of both
+        """
+        keys = np.concatenate([self.keys, other.keys])
+        # two sorted runs: the stable sort (timsort) merges them in linear time and
+        # puts the key of self before the same key of other
+        order = np.argsort(keys, kind='stable')
+        same = np.flatnonzero(keys[order][1:] == keys[order][:-1])
+        left, right = order[same], order[same + 1] - len(self.keys)
+        data = pd.concat([self.data.iloc[left].reset_index(drop=True),
+                          other.data.iloc[right].reset_index(drop=True)], axis=1)
+        return FeatureTable(self.keys[left], data)
+
+    def to_frame(self, key: str = USER_KEY) -> pd.DataFrame:
+        """Return the rows with the MSISDN as the first column."""
+        df = self.data.copy()
+        df.insert(0, key, self.keys)
+        return df
+
+
+class SubscriberStore:
+    def __init__(self, tables: dict = None):
+        """Initialize the SubscriberStore class.
+
+        Args:
+            tables (dict, optional): table name to FeatureTable. Defaults to no table.
+        """
+        try:
+            self.logger = Logger("feature_store.log").get_app_logger()
+            self.tables = dict(tables or {})
+            self.logger.info('Successfully Instantiated SubscriberStore Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate SubscriberStore Class Object')
+            sys.exit(1)
+
+    def build(self, df: pd.DataFrame, model_dir: str = '../models') -> 'SubscriberStore':
+        """Compute the engagement, experience and satisfaction tables from xDR sessions.
+
+        Args:
+            df (pd.DataFrame): cleaned xDR sessions
+            model_dir (str, optional): directory of the scoring models. Defaults to '../models'.
+
+        Returns:
+            SubscriberStore: self
+        """
+        if 'total_data' not in df.columns:
+            df = df.assign(total_data=df['total_dl_(bytes)'] + df['total_ul_(bytes)'])
+        engagement, experience = UserAggregator().user_features(df, ENGAGEMENT_METRICS, EXPERIENCE_METRICS)
+        self.tables['engagement'] = FeatureTable.from_frame(engagement)
+        self.tables['experience'] = FeatureTable.from_frame(experience)
+        users = self.join(['engagement', 'experience'])
+        scores = ScoringPipeline(model_dir).score_chunk(users.data)
+        self.tables['satisfaction'] = FeatureTable(users.keys, scores)
+        self.logger.info(f'Built the features of {len(users)} subscribers from {len(df)} sessions')
+        return self
+
+    def join(self, names: list = None) -> FeatureTable:
+        """Join tables of the store on the MSISDN.
+
+        Args:
+            names (list, optional): tables to join. Defaults to every table.
+
+        Returns:
+            FeatureTable: the subscribers present in every table
+        """
+        names = list(names or self.tables)
+        table = self.tables[names[0]]
+        for name in names[1:]:
+            table = table.join(self.tables[name])
+        return table
+
+    def lookup(self, msisdn) -> dict:
+        """Return the features of one subscriber in every table.
+
+        Args:
+            msisdn (int | float | str): the MSISDN, a ValueError is raised unless it is a
+                finite number
+
+        Returns:
+            dict: table name to the features of the subscriber, None where unknown
+        """
+        value = float(msisdn)
+        if not math.isfinite(value):
+            raise ValueError(f'{msisdn} is not a finite MSISDN')
+        return {name: table.lookup(int(value)) for name, table in self.tables.items()}
+
+    def save(self, directory: str) -> None:
+        """Write every table to directory/<name>.parquet, sorted by MSISDN."""
+        os.makedirs(directory, exist_ok=True)
+        for name, table in self.tables.items():
+            table.to_frame().to_parquet(os.path.join(directory, f'{name}.parquet'), index=False)
+        self.logger.info(f'Saved {len(self.tables)} feature tables to {directory}')
+
+    @classmethod
+    def load(cls, directory: str) -> 'SubscriberStore':
+        """Read the tables written by save."""
+        tables = {}
+        for name in TABLES:
+            path = os.path.join(directory, f'{name}.parquet')
+            if os.path.exists(path):
+                df = pd.read_parquet(path)
+                tables[name] = FeatureTable(df[USER_KEY].to_numpy(np.int64), df.drop(columns=[USER_KEY]))
+        return cls(tables)
+
+
+class StoreCache:
+    def __init__(self):
+        """Initialize an empty cache."""
+        self._stores = {}
+        self._builds = {}
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def get(self, root: str = './data', source: str = 'cleaned_data2', model_dir: str = './models') -> SubscriberStore:
+        """Return the last loaded feature store, rebuilding it in the background if the dataset changed.
+
+        The store is only built in the request when none was ever loaded for the data
+        directory. Otherwise the previous version is served until the rebuild loads the
+        new one, see stale.
+
+        Args:
+            root (str, optional): data directory. Defaults to './data'.
+            source (str, optional): name of the cleaned dataset. Defaults to 'cleaned_data2'.
+            model_dir (str, optional): directory of the scoring models. Defaults to './models'.
+
+        Returns:
+            SubscriberStore: the store
+        """
+        data = DataStore(root)
+        directory = self._directory(data, source)
+        entry = self._stores.get(os.path.abspath(root))
+        if entry is not None:
+            if entry[0] != directory:
+                self._refresh(data, source, model_dir, directory)
+            return entry[1]
+
+        with self._lock:
+            if os.path.abspath(root) not in self._stores:
+                self._load(data, source, model_dir, directory)
+            return self._stores[os.path.abspath(root)][1]
+
+    def _directory(self, data: DataStore, source: str) -> str:
+        """Return the directory of the features of the current source version."""
+        version = source_version(source_path(data, source), FEATURES_VERSION)
+        return os.path.abspath(os.path.join(data.root, 'features', version))
+
+    def _load(self, data: DataStore, source: str, model_dir: str, directory: str) -> None:
+        """Build the version if needed and serve it for its data directory."""
+        if not os.path.isdir(directory):
+            self._build(data, source, model_dir, directory)
+        self._stores[os.path.abspath(data.root)] = (directory, SubscriberStore.load(directory))
+        logger.info(f'Loaded subscriber features {os.path.basename(directory)}')
+
+    def _refresh(self, data: DataStore, source: str, model_dir: str, directory: str) -> None:
+        """Start loading a new version on a background thread, once per version."""
+        key = os.path.abspath(data.root)
+        with self._build_lock:
+            if self._builds.get(key, (None,))[0] == directory:
+                return
+            thread = threading.Thread(target=self._rebuild, args=(data, source, model_dir, directory),
+                                      name=f'features-{os.path.basename(directory)}', daemon=True)
+            # a failed build is not retried until the dataset changes again
+            self._builds[key] = (directory, thread)
+            thread.start()
+        logger.info(f'Rebuilding subscriber features {os.path.basename(directory)} in the background')
+
+    def _rebuild(self, data: DataStore, source: str, model_dir: str, directory: str) -> None:
+        try:
+            self._load(data, source, model_dir, directory)
+        except BaseException:
+            logger.exception('Failed to rebuild the subscriber features')
+
+    def stale(self, root: str = './data', source: str = 'cleaned_data2') -> bool:
+        """Return True while the served store is older than the dataset."""
+        entry = self._stores.get(os.path.abspath(root))
+        return entry is not None and entry[0] != self._directory(DataStore(root), source)
+
+    def wait(self, root: str = './data', timeout: float = None) -> None:
+        """Wait for the background rebuild of a data directory, e.g. in a script."""
+        build = self._builds.get(os.path.abspath(root))
+        if build is not None:
+            build[1].join(timeout)
+
+    def _build(self, data: DataStore, source: str, model_dir: str, directory: str) -> None:
+        """Build the store into a temporary directory and move it in place."""
+        columns = metric_columns({**ENGAGEMENT_METRICS, **EXPERIENCE_METRICS})
+        df = read_source(data, source, [USER_KEY] + columns + ['total_dl_(bytes)', 'total_ul_(bytes)'])
+        tmp = f'{directory}.{os.getpid()}.tmp'
+        SubscriberStore().build(df, model_dir).save(tmp)
+        try:
+            os.replace(tmp, directory)
+        except OSError:
+            # another process published the same version first
+            if not os.path.isdir(directory):
+                raise
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._prune(directory)
+
+    def _prune(self, directory: str) -> None:
+        """Remove the versions published before this one and the abandoned builds."""
+        parent = os.path.dirname(directory)
+        published = os.path.getmtime(directory)
+        for name in os.listdir(parent):
+            path = os.path.join(parent, name)
+            if path == directory:
+                continue
+            try:
+                modified = os.path.getmtime(path)
+            except OSError:
+                continue
+            if name.endswith('.tmp') and time.time() - modified < BUILD_GRACE:
+                continue
+            if name.endswith('.tmp') or modified < published:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def clear(self) -> None:
+        """Forget every loaded store."""
+        with self._lock:
+            self._stores.clear()
+            self._builds.clear()
+
+
+stores = StoreCache()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the subscriber feature store.')
+    parser.add_argument('--root', default=os.path.join('..', 'data'))
+    parser.add_argument('--source', default='cleaned_data2')
+    parser.add_argument('--model-dir', default=os.path.join('..', 'models'))
+    args = parser.parse_args()
+    store = stores.get(args.root, args.source, args.model_dir)
+    print({name: len(table) for name, table in store.tables.items()})
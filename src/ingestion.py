@@ -0,0 +1,259 @@
+"""Streaming ingestion of the xDR table from PostgreSQL into the DataStore.
+
+The notebook loads ``SELECT * FROM public.xdr_data`` with ``read_sql_query``,
+which materializes the whole table in memory before writing it out again.
+PostgresIngestor streams it instead, either through a server-side (named)
+cursor fetched in bounded batches or through ``COPY ... TO STDOUT`` spooled
+to a temporary csv file, and writes Parquet straight into the DataStore.
+With ``parts > 1`` the table is split into key ranges that are read
+concurrently over a pool of connections, each range into its own part file.
+Both modes take the column types from the database (PG_TYPES), so every
+part gets the same schema whatever its values.
+"""
+import functools
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from logger import Logger, stage
+from psycopg2 import sql
+from storage import DataStore
+
+# PostgreSQL type oid to arrow type, everything else is read as a string
+PG_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1700: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp('us'),
+    1184: pa.timestamp('us', tz='UTC'),
+}
+
+
+
+def arrow_schema(description) -> pa.Schema:
+    """Return the arrow schema of a cursor description."""
+    return pa.schema([(column.name, PG_TYPES.get(column.type_code, pa.string())) for column in description])
+
+
+DECIMAL_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, 'DECIMAL_AS_FLOAT',
+    lambda value, cursor: float(value) if value is not None else None)
+
+
+class PostgresIngestor:
+    MODES = ('cursor', 'copy')
+
+    def __init__(self, dsn: str, store: DataStore = None, batch_size: int = 50_000):
+        """Initialize the PostgresIngestor class.
+
+        Args:
+            dsn (str): libpq connection string or URI of the database
+            store (DataStore, optional): destination store. Defaults to DataStore().
+            batch_size (int, optional): rows fetched and written per batch. Defaults to 50_000.
+        """
+        try:
+            self.logger = Logger("ingestion.log").get_app_logger()
+            self.dsn = dsn
+            self.store = store or DataStore()
+            self.batch_size = batch_size
+            self.stats = {}
+            self.logger.info('Successfully Instantiated PostgresIngestor Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate PostgresIngestor Class Object')
+            sys.exit(1)
+
+    def _select(self, table: str, key: str = None, bounds: tuple = None) -> sql.Composed:
+        """Return the SELECT of the table, restricted to a key range if given."""
+        query = sql.SQL('SELECT * FROM {}').format(sql.Identifier(*table.split('.')))
+        if bounds is None:
+            return query
+        lower, upper, last = bounds
+        condition = sql.SQL('{key} >= {lower} AND {key} < {upper}')
+        if last:
+            condition = sql.SQL('({key} >= {lower} AND {key} <= {upper}) OR {key} IS NULL')
+        return query + sql.SQL(' WHERE ') + condition.format(
+            key=sql.Identifier(key), lower=sql.Literal(lower), upper=sql.Literal(upper))
+
+    def key_ranges(self, conn, table: str, key: str, parts: int) -> list:
+        """Split the numeric key of the table into equal-width ranges.
+
+        Args:
+            conn: open connection
+            table (str): table name, optionally schema qualified
+            key (str): numeric column the ranges are taken on
+            parts (int): number of ranges
+
+        Returns:
+            list: (lower, upper, last) bounds, the last range also holds the NULL keys
+        """
+        query = sql.SQL('SELECT min({key}), max({key}) FROM {table}').format(
+            key=sql.Identifier(key), table=sql.Identifier(*table.split('.')))
+        with conn.cursor() as cur:
+            cur.execute(query)
+            lower, upper = cur.fetchone()
+        if lower is None:
+            return [(0, 0, True)]
+        lower, upper = float(lower), float(upper)
+        step = (upper - lower) / parts
+        edges = [lower + i * step for i in range(parts)] + [upper]
+        return [(edges[i], edges[i + 1], i == parts - 1) for i in range(parts)]
+
+    def iter_batches(self, conn, query) -> Iterator[pa.RecordBatch]:
+        """Stream a query through a server-side cursor in bounded batches.
+
+        Args:
+            conn: open connection, used inside a transaction
+            query: SQL query
+
+        Yields:
+            pa.RecordBatch: the next batch of at most batch_size rows
+        """
+        psycopg2.extensions.register_type(DECIMAL_AS_FLOAT, conn)
+        with conn.cursor(name=f'xdr_stream_{id(query)}') as cur:
+            cur.itersize = self.batch_size
+            cur.execute(query)
+            schema = None
+            while True:
+                rows = cur.fetchmany(self.batch_size)
+                if schema is None:
+                    # the first batch is always yielded so that an empty table keeps its schema
+                    schema = arrow_schema(cur.description)
+                elif not rows:
+                    break
+                columns = list(zip(*rows)) or [()] * len(schema)
+                arrays = []
+                for field, values in zip(schema, columns):
+                    if pa.types.is_string(field.type):
+                        values = [None if v is None else str(v) for v in values]
+                    arrays.append(pa.array(values, type=field.type))
+                yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+                if not rows:
+                    break
+
+    def _ingest_cursor(self, conn, query, path: str) -> int:
+        rows = 0
+        writer = None
+        try:
+            for batch in self.iter_batches(conn, query):
+                if writer is None:
+                    writer = pq.ParquetWriter(path, batch.schema, compression=self.store.compression)
+                writer.write_batch(batch, row_group_size=self.store.row_group_size)
+                rows += batch.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        conn.commit()
+        return rows
+
+    def schema(self, conn, query) -> pa.Schema:
+        """Return the arrow schema of a query without fetching any row.
+
+        Args:
+            conn: open connection
+            query: SQL query
+
+        Returns:
+            pa.Schema: one field per column, typed with PG_TYPES
+        """
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL('SELECT * FROM ({}) AS q LIMIT 0').format(query))
+            schema = arrow_schema(cur.description)
+        conn.commit()
+        return schema
+
+    def _ingest_copy(self, conn, query, path: str, schema: pa.Schema = None) -> int:
+        schema = schema or self.schema(conn, query)
+        # COPY writes booleans as t and f, NULL unquoted and empty strings quoted
+        options = pacsv.ConvertOptions(column_types=schema, true_values=['t'], false_values=['f'],
+                                       strings_can_be_null=True, quoted_strings_can_be_null=False)
+        copy = sql.SQL('COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER true)').format(query)
+        with tempfile.NamedTemporaryFile('w+b', suffix='.csv') as spool:
+            with conn.cursor() as cur:
+                cur.copy_expert(copy, spool)
+            conn.commit()
+            spool.flush()
+            self.store.convert_csv(spool.name, path=path, convert_options=options)
+        return pq.ParquetFile(path).metadata.num_rows
+
+    def ingest(self, table: str = 'public.xdr_data', name: str = 'data_from_postgres',
+               mode: str = 'cursor', key: str = None, parts: int = 1) -> dict:
+        """Stream a table into the DataStore.
+
+        Args:
+            table (str, optional): table to ingest. Defaults to 'public.xdr_data'.
+            name (str, optional): dataset name in the store. Defaults to 'data_from_postgres'.
+            mode (str, optional): 'cursor' for a server-side cursor, 'copy' for COPY TO
+                STDOUT. Defaults to 'cursor'.
+            key (str, optional): numeric column used to split the table, e.g. 'Bearer Id'.
+                Required when parts > 1. Defaults to None.
+            parts (int, optional): key ranges read concurrently over pooled connections.
+                Defaults to 1.
+
+        Returns:
+            dict: rows, seconds and rows per second of the ingestion
+        """
+        if mode not in self.MODES:
+            raise ValueError(f'Unknown mode {mode}, expected one of {self.MODES}')
+        if parts > 1 and key is None:
+            raise ValueError('A key column is required to split the table into parts')
+        ingest_one = self._ingest_cursor if mode == 'cursor' else self._ingest_copy
+        start = time.perf_counter()
+
+        with stage(f'ingest_{mode}', self.logger) as record:
+            path = self.store.path(name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            if parts == 1:
+                conn = psycopg2.connect(self.dsn)
+                try:
+                    rows = ingest_one(conn, self._select(table), path)
+                finally:
+                    conn.close()
+            else:
+                if os.path.exists(path):
+                    os.remove(path)
+                os.makedirs(path)
+                pool = psycopg2.pool.ThreadedConnectionPool(1, parts, self.dsn)
+                try:
+                    conn = pool.getconn()
+                    ranges = self.key_ranges(conn, table, key, parts)
+                    if mode == 'copy':
+                        # one schema for every part, a part could hold only nulls in a column
+                        ingest_one = functools.partial(self._ingest_copy,
+                                                       schema=self.schema(conn, self._select(table)))
+                    pool.putconn(conn)
+
+                    def ingest_part(part):
+                        part_conn = pool.getconn()
+                        try:
+                            return ingest_one(part_conn, self._select(table, key, ranges[part]),
+                                              self.store.part_path(name, part))
+                        finally:
+                            pool.putconn(part_conn)
+
+                    with ThreadPoolExecutor(parts) as executor:
+                        rows = sum(executor.map(ingest_part, range(len(ranges))))
+                finally:
+                    pool.closeall()
+            record['rows'] = rows
+
+        seconds = time.perf_counter() - start
+        self.stats = {'rows': rows, 'seconds': seconds, 'rows_per_second': rows / seconds if seconds else 0.0}
+        self.logger.info(f'Ingested {rows} rows of {table} into {path} with {mode} '
+                         f'over {parts} connection(s) in {seconds:.2f}s')
+        return self.stats
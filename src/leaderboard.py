@@ -0,0 +1,395 @@
+"""Top-K leaderboards of the subscriber metrics maintained incrementally.
+
+A TopK keeps the best ``capacity`` (k plus some slack) subscribers of one
+metric in one direction in a bounded heap whose root is the weakest member.
+An update takes the new values of a batch of subscribers: the subscribers
+already on the board are updated in place, the best candidates of the
+others are picked with ``np.argpartition`` and only those are offered to
+the heap, so an update costs O(batch) vectorized work plus O(capacity log
+capacity) heap operations, whatever the number of subscribers seen.
+
+A board is exact while the k-th value shown is at least as good as every
+value it turned away. This always holds for the largest values of metrics
+that only grow as sessions arrive (counts and sums, as UserState
+accumulates them); the smallest values of such metrics stay exact as long
+as the slack covers the members growing off the board, ``rebuild`` starts
+over from the full table otherwise.
+
+Leaderboard holds a TopK per metric and direction, plus boards of the most
+frequent values of categorical columns (``value_counts().nlargest``). The
+queried Series are cached until the next update, so a query by the Overview
+page costs microseconds.
+
+    state = UserState()
+    board = Leaderboard()
+    for batch in pd.read_csv('../data/cleaned_data2.csv', chunksize=50_000):
+        board.update(state.update(batch).latest())
+        board.count('handset_type', batch['handset_type'])
+    board.top('avg_tp_total', 'smallest')
+
+apply_delta is that loop over new sessions against a UserState and a
+Leaderboard persisted in a state directory, falling back to ``rebuild``
+from the state when a board is no longer exact. ``advance`` feeds it the
+rows of a growing dataset that the state has not merged yet: the dashboard
+calls it with the cleaned dataset every time it publishes a new version,
+so the Overview page shows boards that were only ever updated with the new
+sessions, e.g. nightly with ``python src/dashboard.py``.
+"""
+import heapq
+import json
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from logger import Logger
+from pipeline.user_state import UserState
+
+DIRECTIONS = ('largest', 'smallest')
+STATE = 'user_state.pkl'
+BOARDS = 'leaderboard.pkl'
+PROGRESS = 'progress.json'
+
+# metric: directions ranked, as in the engagement and experience notebooks
+LEADERBOARDS = {
+    'sessions': ('largest',),
+    'dur._(ms)': ('largest',),
+    'total_data': ('largest',),
+    'avg_rtt_total': ('largest', 'smallest'),
+    'avg_tp_total': ('largest', 'smallest'),
+    'total_avg_tcp_total': ('largest', 'smallest'),
+}
+# categorical columns ranked by the number of sessions of every value
+COUNTED = ('handset_type',)
+
+
+class TopK:
+    """Bounded heap of the best values of one metric in one direction."""
+
+    def __init__(self, k: int = 10, largest: bool = True, capacity: int = None):
+        """Initialize an empty board.
+
+        Args:
+            k (int, optional): number of entries shown. Defaults to 10.
+            largest (bool, optional): rank the largest values first, else the smallest.
+                Defaults to True.
+            capacity (int, optional): number of entries kept, at least k. Defaults to 4 * k.
+        """
+        self.k = k
+        self.sign = 1.0 if largest else -1.0
+        self.capacity = max(capacity or 4 * k, k)
+        self.members = {}
+        self.floor = -np.inf
+        self._heap = []
+        self._dirty = False
+        self._top = None
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    @property
+    def exact(self) -> bool:
+        """True when no value turned away could be among the k shown."""
+        if self.floor == -np.inf:
+            return True
+        best = heapq.nlargest(self.k, self.members.values())
+        return len(best) == self.k and best[-1] >= self.floor
+
+    def _offer(self, key, score: float) -> None:
+        if len(self.members) < self.capacity:
+            self.members[key] = score
+            heapq.heappush(self._heap, (score, key))
+        elif score > self._heap[0][0]:
+            weakest, evicted = heapq.heapreplace(self._heap, (score, key))
+            del self.members[evicted]
+            self.members[key] = score
+            self.floor = max(self.floor, weakest)
+        else:
+            self.floor = max(self.floor, score)
+
+    def update(self, keys, values) -> None:
+        """Merge the current values of some keys, e.g. the subscribers of a batch.
+
+        Args:
+            keys (array-like): distinct keys
+            values (array-like): their current values, NaN values are ignored
+        """
+        keys = np.asarray(keys)
+        scores = self.sign * np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(scores)
+        keys, scores = keys[valid], scores[valid]
+        if not len(keys):
+            return
+        self._top = None
+
+        if self.members:
+            known = pd.Index(keys).isin(list(self.members))
+            if known.any():
+                for key, score in zip(keys[known].tolist(), scores[known].tolist()):
+                    self.members[key] = score
+                self._dirty = True
+                keys, scores = keys[~known], scores[~known]
+        if self._dirty:
+            self._heap = [(score, key) for key, score in self.members.items()]
+            heapq.heapify(self._heap)
+            self._dirty = False
+
+        if len(scores) > self.capacity:
+            cut = len(scores) - self.capacity
+            order = np.argpartition(scores, cut)
+            self.floor = max(self.floor, float(scores[order[:cut]].max()))
+            keys, scores = keys[order[cut:]], scores[order[cut:]]
+        order = np.argsort(-scores, kind='stable')
+        for key, score in zip(keys[order].tolist(), scores[order].tolist()):
+            self._offer(key, score)
+
+    def top(self, n: int = None) -> pd.Series:
+        """Return the best n entries, best first, ties in key order.
+
+        Args:
+            n (int, optional): number of entries, at most k. Defaults to k.
+
+        Returns:
+            pd.Series: values indexed by key
+        """
+        if self._top is None:
+            best = sorted(self.members.items(), key=lambda item: (-item[1], item[0]))[:self.k]
+            self._top = pd.Series([self.sign * score for _, score in best],
+                                  index=[key for key, _ in best], dtype=np.float64)
+        return self._top if n is None or n >= len(self._top) else self._top.iloc[:n]
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        self.members.clear()
+        self.floor = -np.inf
+        self._heap = []
+        self._dirty = False
+        self._top = None
+
+
+class Leaderboard:
+    def __init__(self, boards: dict = LEADERBOARDS, counted: tuple = COUNTED, k: int = 10,
+                 capacity: int = None):
+        """Initialize the Leaderboard class.
+
+        Args:
+            boards (dict, optional): metric to the directions ranked. Defaults to LEADERBOARDS.
+            counted (tuple, optional): categorical columns ranked by frequency. Defaults to COUNTED.
+            k (int, optional): number of entries of every board. Defaults to 10.
+            capacity (int, optional): entries kept per board. Defaults to 4 * k.
+        """
+        for directions in boards.values():
+            for direction in directions:
+                if direction not in DIRECTIONS:
+                    raise ValueError(f'Unknown direction {direction}, expected one of {DIRECTIONS}')
+        try:
+            self.logger = Logger("leaderboard.log").get_app_logger()
+            self.k = k
+            self.boards = {(metric, direction): TopK(k, direction == 'largest', capacity)
+                           for metric, directions in boards.items() for direction in directions}
+            self.counters = {name: {} for name in counted}
+            for name in counted:
+                self.boards[(name, 'most_frequent')] = TopK(k, True, capacity)
+            self.logger.info('Successfully Instantiated Leaderboard Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate Leaderboard Class Object')
+            sys.exit(1)
+
+    @property
+    def metrics(self) -> list:
+        return list(dict.fromkeys(metric for metric, _ in self.boards))
+
+    def directions(self, metric: str) -> list:
+        """Return the directions ranked for a metric."""
+        return [direction for name, direction in self.boards if name == metric]
+
+    def update(self, features: pd.DataFrame) -> 'Leaderboard':
+        """Merge the current values of some subscribers.
+
+        Args:
+            features (pd.DataFrame): one row per subscriber indexed by MSISDN, e.g.
+                UserState.latest() after a batch; columns without a board are ignored
+
+        Returns:
+            Leaderboard: the leaderboard itself
+        """
+        keys = features.index.to_numpy()
+        for (metric, direction), board in self.boards.items():
+            if direction != 'most_frequent' and metric in features.columns:
+                board.update(keys, features[metric].to_numpy(dtype=np.float64))
+        self.logger.info(f'Updated the leaderboards with {len(features)} subscribers')
+        return self
+
+    def count(self, name: str, values: pd.Series) -> 'Leaderboard':
+        """Add the sessions of a batch to the frequency board of a categorical column.
+
+        Args:
+            name (str): categorical column, one of counted
+            values (pd.Series): its values in the new sessions
+
+        Returns:
+            Leaderboard: the leaderboard itself
+        """
+        counter = self.counters[name]
+        batch = values.value_counts()
+        for value, count in zip(batch.index.tolist(), batch.tolist()):
+            counter[value] = counter.get(value, 0) + count
+        self.boards[(name, 'most_frequent')].update(batch.index.to_numpy(),
+                                                    [counter[value] for value in batch.index.tolist()])
+        return self
+
+    def rebuild(self, features: pd.DataFrame) -> 'Leaderboard':
+        """Start the metric boards over from the full per-subscriber table.
+
+        Args:
+            features (pd.DataFrame): every subscriber, e.g. the tables of UserState.features()
+
+        Returns:
+            Leaderboard: the leaderboard itself
+        """
+        for (metric, direction), board in self.boards.items():
+            if direction != 'most_frequent' and metric in features.columns:
+                board.clear()
+        return self.update(features)
+
+    def top(self, metric: str, direction: str = 'largest', n: int = None) -> pd.Series:
+        """Return the best entries of a board.
+
+        Args:
+            metric (str): metric or counted column
+            direction (str, optional): 'largest', 'smallest' or 'most_frequent'.
+                Defaults to 'largest'.
+            n (int, optional): number of entries, at most k. Defaults to k.
+
+        Returns:
+            pd.Series: values indexed by MSISDN (by value for a counted column), best first
+        """
+        return self.boards[(metric, direction)].top(n).rename(metric)
+
+    def exact(self) -> dict:
+        """Return whether every board is exact, by (metric, direction)."""
+        return {name: board.exact for name, board in self.boards.items()}
+
+    def save(self, path: str) -> None:
+        """Persist the leaderboards with pickle.
+
+        Args:
+            path (str): path of the leaderboard file
+        """
+        with open(path, 'wb') as f:
+            pickle.dump({'k': self.k, 'boards': self.boards, 'counters': self.counters}, f)
+        self.logger.info(f'Saved {len(self.boards)} leaderboards to {path}')
+
+    @classmethod
+    def load(cls, path: str) -> 'Leaderboard':
+        """Load leaderboards persisted with save.
+
+        Args:
+            path (str): path of the leaderboard file
+
+        Returns:
+            Leaderboard: the loaded leaderboards
+        """
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        self = cls({}, (), state['k'])
+        self.boards, self.counters = state['boards'], state['counters']
+        return self
+
+
+def _read_chunks(source, chunksize: int):
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source.iloc[start:start + chunksize]
+    elif source.endswith('.parquet'):
+        for batch in pq.ParquetFile(source).iter_batches(chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(source, chunksize=chunksize)
+
+
+def _replace(path: str, write) -> None:
+    """Write a file next to its destination and move it in place."""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def apply_delta(sources: list, state_dir: str = '../data/leaderboard', chunksize: int = 50_000) -> Leaderboard:
+    """Merge new xDR sessions into the persisted user state and leaderboards.
+
+    Args:
+        sources (list): dataframes or csv and parquet files of sessions not merged yet
+        state_dir (str, optional): directory of user_state.pkl and leaderboard.pkl,
+            both started empty if missing. Defaults to '../data/leaderboard'.
+        chunksize (int, optional): sessions merged per batch. Defaults to 50_000.
+
+    Returns:
+        Leaderboard: the updated leaderboards
+    """
+    state_path = os.path.join(state_dir, STATE)
+    board_path = os.path.join(state_dir, BOARDS)
+    state = UserState.load(state_path) if os.path.exists(state_path) else UserState()
+    board = Leaderboard.load(board_path) if os.path.exists(board_path) else Leaderboard()
+    for source in sources:
+        for batch in _read_chunks(source, chunksize):
+            board.update(state.update(batch).latest())
+            for name in board.counters:
+                if name in batch.columns:
+                    board.count(name, batch[name])
+    inexact = [name for name, exact in board.exact().items() if not exact]
+    if inexact:
+        board.logger.info(f'Rebuilding the leaderboards from the state, {inexact} are no longer exact')
+        engagement, experience = state.features()
+        board.rebuild(engagement.join(experience))
+    os.makedirs(state_dir, exist_ok=True)
+    _replace(state_path, state.save)
+    _replace(board_path, board.save)
+    return board
+
+
+def _fingerprint(df: pd.DataFrame, rows: int) -> int:
+    """Return a hash of the first rows of a dataset, their values and positions."""
+    head = df.iloc[:rows].reset_index(drop=True)
+    return int(pd.util.hash_pandas_object(head, index=True).sum())
+
+
+def advance(df: pd.DataFrame, state_dir: str = '../data/leaderboard', chunksize: int = 50_000) -> Leaderboard:
+    """Merge the sessions of a growing dataset that the persisted boards have not seen.
+
+    The state directory records how many leading rows of the dataset were merged
+    and a hash of those rows. Only the rows after them are merged, so appending
+    sessions to the dataset costs time proportional to the new sessions. When the
+    dataset no longer starts with the merged rows (it was replaced, not appended
+    to), the state starts over from the whole dataset.
+
+    Args:
+        df (pd.DataFrame): every xDR session of the dataset, in a stable order
+        state_dir (str, optional): directory kept by apply_delta. Defaults to '../data/leaderboard'.
+        chunksize (int, optional): sessions merged per batch. Defaults to 50_000.
+
+    Returns:
+        Leaderboard: the leaderboards of the whole dataset
+    """
+    progress_path = os.path.join(state_dir, PROGRESS)
+    merged = 0
+    if os.path.exists(progress_path):
+        with open(progress_path) as f:
+            progress = json.load(f)
+        if progress['rows'] <= len(df) and _fingerprint(df, progress['rows']) == progress['hash']:
+            merged = progress['rows']
+    if merged == 0:
+        for name in (STATE, BOARDS):
+            if os.path.exists(os.path.join(state_dir, name)):
+                os.remove(os.path.join(state_dir, name))
+    board = apply_delta([df.iloc[merged:]], state_dir, chunksize)
+
+    def write(path):
+        with open(path, 'w') as f:
+            json.dump({'rows': len(df), 'hash': _fingerprint(df, len(df))}, f)
+
+    _replace(progress_path, write)
+    board.logger.info(f'Advanced the leaderboards of {state_dir} with {len(df) - merged} of {len(df)} sessions')
+    return board
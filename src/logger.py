@@ -1,30 +1,122 @@
+import atexit
+import functools
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
+
+FORMAT = '%(asctime)s : %(levelname)s : %(name)s : %(message)s'
+DATE_FORMAT = '%m-%d-%Y %H:%M:%S'
+
+# one file handler per destination, written by a single background listener
+_queue = queue.SimpleQueue()
+_files = {}
+_queue_handlers = {}
+_listener = None
+_lock = threading.Lock()
+
+
+class _DestinationHandler(logging.Handler):
+    """Forward a record taken from the queue to the file handler of its destination."""
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        handler = _files.get(getattr(record, 'destination', None))
+        if handler is not None:
+            handler.handle(record)
+        return True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.handle(record)
+
+
+class _DestinationFilter(logging.Filter):
+    """Tag every record with the log file it goes to."""
+
+    def __init__(self, destination: str):
+        super().__init__()
+        self.destination = destination
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.destination = self.destination
+        return True
+
+
+def _queue_handler(path: str) -> logging.Handler:
+    """Return the queue handler of a log file, creating its file handler once."""
+    global _listener
+    with _lock:
+        handler = _queue_handlers.get(path)
+        if handler is not None:
+            return handler
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_handler = logging.FileHandler(path)
+        file_handler.setFormatter(logging.Formatter(FORMAT, DATE_FORMAT))
+        _files[path] = file_handler
+
+        handler = logging.handlers.QueueHandler(_queue)
+        handler.addFilter(_DestinationFilter(path))
+        _queue_handlers[path] = handler
+
+        if _listener is None:
+            _listener = logging.handlers.QueueListener(_queue, _DestinationHandler())
+            _listener.start()
+            atexit.register(shutdown)
+        return handler
+
+
+def shutdown() -> None:
+    """Flush the queued records, close every log file and detach the queue handlers.
+
+    A Logger created afterwards starts a new listener and attaches a new handler,
+    so no record is written twice.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        for handler in _files.values():
+            handler.close()
+        handlers = set(_queue_handlers.values())
+        for logger in list(logging.Logger.manager.loggerDict.values()):
+            if isinstance(logger, logging.Logger):
+                for handler in [h for h in logger.handlers if h in handlers]:
+                    logger.removeHandler(handler)
+        _files.clear()
+        _queue_handlers.clear()
+
+
 class Logger:
     """Logger class for logging messages to a file."""
 
-    def __init__(self, file_name: str, basic_level=logging.INFO):
+    def __init__(self, file_name: str, basic_level=logging.INFO, log_dir: str = '../logs'):
         """Initilize logger class with file name to be written and default log level.
 
+        Every file gets its own named logger with a single handler, however many
+        objects ask for it. Records are put on a queue and written to disk by a
+        background listener thread, so logging never blocks on file I/O.
+
         Args:
-            file_name (str): _description_
-            basic_level (_type_, optional): _description_. Defaults to logging.INFO.
+            file_name (str): name of the log file, e.g. 'preprocessing.log'
+            basic_level (_type_, optional): log level. Defaults to logging.INFO.
+            log_dir (str, optional): directory of the log files, created if missing.
+                Defaults to '../logs'.
         """
-        # Gets or creates a logger
-        logger = logging.getLogger(__name__)
+        path = os.path.abspath(os.path.join(log_dir, file_name))
+        # Gets or creates the logger of this file
+        logger = logging.getLogger(f'{__name__}.{os.path.splitext(file_name)[0]}')
 
         # set log level
         logger.setLevel(basic_level)
+        logger.propagate = False
 
-        # define file handler and set formatter
-
-        file_handler = logging.FileHandler(f'../logs/{file_name}')
-        formatter = logging.Formatter(
-            '%(asctime)s : %(levelname)s : %(name)s : %(message)s', '%m-%d-%Y %H:%M:%S')
-
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handler = _queue_handler(path)
+        if handler not in logger.handlers:
+            logger.addHandler(handler)
 
         self.logger = logger
 
@@ -35,3 +127,75 @@ class Logger:
             logging.Logger: logger object.
         """
         return self.logger
+
+
+def _count_rows(value) -> int:
+    """Return the number of rows of a frame or array, None for anything else."""
+    shape = getattr(value, 'shape', None)
+    if shape:
+        return int(shape[0])
+    return None
+
+
+@contextmanager
+def stage(name: str, logger: logging.Logger = None, rows: int = None):
+    """Time a pipeline stage and log it as a structured record.
+
+    The yielded dict can be updated inside the block, e.g. with the number of
+    rows the stage produced. The record carries ``stage``, ``seconds``,
+    ``rows`` and ``rows_per_second`` as attributes and in its message.
+
+    Args:
+        name (str): name of the stage, e.g. 'clean'
+        logger (logging.Logger, optional): destination. Defaults to the 'stages.log' logger.
+        rows (int, optional): rows processed by the stage, if known up front. Defaults to None.
+
+    Yields:
+        dict: the stage record, with 'rows' settable by the caller
+    """
+    logger = logger or Logger('stages.log').get_app_logger()
+    record = {'stage': name, 'rows': rows, 'started': datetime.now().isoformat(timespec='seconds')}
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield record
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        record['rows_per_second'] = (record['rows'] / record['seconds']
+                                     if record['rows'] is not None and record['seconds'] else None)
+        record['status'] = 'failed' if failed else 'ok'
+        logger.log(logging.ERROR if failed else logging.INFO,
+                   ' '.join(f'{key}={value:.6g}' if isinstance(value, float) else f'{key}={value}'
+                            for key, value in record.items()),
+                   extra=record)
+
+
+def timed(name: str = None, logger: logging.Logger = None):
+    """Decorate a function or method so that every call is logged as a stage.
+
+    The rows are taken from the result when it is a frame or an array, else
+    from the first frame or array argument.
+
+    Args:
+        name (str, optional): name of the stage. Defaults to the qualified name of the function.
+        logger (logging.Logger, optional): destination. Defaults to the ``logger``
+            attribute of the instance, then to the 'stages.log' logger.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            destination = logger
+            if destination is None and args and isinstance(getattr(args[0], 'logger', None), logging.Logger):
+                destination = args[0].logger
+            with stage(name or func.__qualname__, destination) as record:
+                result = func(*args, **kwargs)
+                record['rows'] = _count_rows(result)
+                if record['rows'] is None:
+                    record['rows'] = next((n for n in map(_count_rows, list(args) + list(kwargs.values()))
+                                           if n is not None), None)
+            return result
+        return wrapper
+    return decorator
@@ -2,10 +2,15 @@ import sys
 
 import numpy as np
 import pandas as pd
+from backend import PolarsOutlier, dispatch
 from logger import Logger
-from scipy import stats
+from parallel import ColumnExecutor, log_transform
+from profiler import instrument
+from sketch import sketch_columns, sketch_quantiles
 
 
+@instrument
+@dispatch(PolarsOutlier)
 class Outlier:
     def __init__(self):
         """Initialize the PreProcess class.
@@ -25,18 +30,23 @@ class Outlier:
 
     # how many missing values exist or better still what is the % of missing values in the dataset?
 
-    def handle_outliers(self, df: pd.DataFrame, cols):
+    def handle_outliers(self, df: pd.DataFrame, cols, n_jobs: int = None):
         """Handle outliers in the dataset.
 
         Args:
             df (pd.DataFrame): a dataframe to be preprocessed
+            n_jobs (int, optional): transform the columns in this many processes over
+                shared memory, see parallel.ColumnExecutor. Defaults to this process.
 
         Returns:
             pd.DataFrame: the dataframe
         """
-        for col in cols:
-            # Computing 10th, 90th percentiles and replacing the outliers
-            df[col] = [np.log(x) for x in df[col]]
+        if n_jobs is not None:
+            with ColumnExecutor(n_jobs) as executor:
+                executor.apply(df, cols, log_transform)
+        else:
+            # log transform all the columns at once instead of element by element
+            df[cols] = np.log(df[cols].to_numpy(dtype=np.float64))
         self.logger.info('Handled outliers from the dataset successfully using np.log')
 
         return df
@@ -47,18 +57,10 @@ class Outlier:
         Args:
             col (pd.DataFrame): a dataframe to be analyzed
         """
-        # calculate skewness
-        outliers = []
-
         thres = 3
-        mean = np.mean(col)
-        std = np.std(col)
-        # print(mean, std)
-        for i in col:
-            z_score = (i-mean)/std
-            if (np.abs(z_score) > thres):
-                outliers.append(i)
-        return outliers  # Driver code
+        values = np.asarray(col, dtype=np.float64)
+        z_score = np.abs(values - np.nanmean(values)) / np.nanstd(values)
+        return values[z_score > thres].tolist()
 
         # sample_outliers = detect_outliers_zscore(
         #     df['nb_of_sec_with_vol_ul_<_1250b'])
@@ -70,24 +72,8 @@ class Outlier:
         Args:
             df (pd.DataFrame): a dataframe to be analyzed
         """
-        # calculate skewness
-
-        outliersTot = {}
-        for col in cols:
-            outliers = []
-            df[col] = sorted(df[col])
-            q1 = np.percentile(df[col], 25)
-            q3 = np.percentile(df[col], 75)
-            # print(q1, q3)
-            IQR = q3-q1
-            lwr_bound = q1-(1.5*IQR)
-            upr_bound = q3+(1.5*IQR)
-            # print(lwr_bound, upr_bound)
-            for i in df[col]:
-                if (i < lwr_bound or i > upr_bound):
-                    outliers.append(i)
-            outliers[col] = len(outliers)
-        return outliersTot  # Driver code
+        outliersTot = OutlierEngine(df, cols).counts('iqr').to_dict()
+        return outliersTot
 
     def outlier_overview(self, df, col):
         """Get outlier overview.
@@ -105,35 +91,216 @@ class Outlier:
 
         # # outliers removed
         # display(df[(df[col] < upper_limit) & (df[col] > lower_limit)])
-    def find_outliers_IQR(self, df:pd.DataFrame)-> pd.DataFrame:
-        q1=df.quantile(0.25)
-        q3=df.quantile(0.75)
+    def _quartiles(self, df: pd.DataFrame, approximate: bool = False, sketches: dict = None) -> tuple:
+        """Return the first and third quartile of every column.
+
+        Args:
+            df (pd.DataFrame): a dataframe to be analyzed
+            approximate (bool, optional): use QuantileSketch instead of sorting. Defaults to False.
+            sketches (dict, optional): column sketches built over the full dataset, e.g.
+                over every chunk. Implies approximate. Defaults to None.
+        """
+        if sketches is None and not approximate:
+            return df.quantile(0.25), df.quantile(0.75)
+        if sketches is None:
+            sketches = sketch_columns(df, df.columns)
+        sketches = {col: sketches[col] for col in df.columns}
+        return sketch_quantiles(sketches, 0.25), sketch_quantiles(sketches, 0.75)
+
+    def find_outliers_IQR(self, df:pd.DataFrame, approximate: bool = False, sketches: dict = None)-> pd.DataFrame:
+        q1, q3 = self._quartiles(df, approximate, sketches)
         IQR=q3-q1
         outliers = df[((df<(q1-1.5*IQR)) | (df>(q3+1.5*IQR)))]
 
         return outliers
         
-    def impute_outliers_IQR(self, df:pd.DataFrame)-> pd.DataFrame:
-        q1=df.quantile(0.25)
-        q3=df.quantile(0.75)
+    def impute_outliers_IQR(self, df:pd.DataFrame, approximate: bool = False, sketches: dict = None)-> pd.DataFrame:
+        q1, q3 = self._quartiles(df, approximate, sketches)
         IQR=q3-q1
         upper = df[~(df>(q3+1.5*IQR))].max()
         lower = df[~(df<(q1-1.5*IQR))].min()
         df = np.where(df > upper,df.mean(),np.where(df < lower, df.mean(),df))
 
         return df
-    def iqr_capping(self, df, cols, factor):
-    
-        Q1 = df.quantile(0.25)
-        Q3 = df.quantile(0.75)
-        IQR = Q3 - Q1
-        
-        # Calculating lower and upper bounds for capping
-        lower_bound = Q1 - 1.5 * IQR
-        upper_bound = Q3 + 1.5 * IQR
-        
-        # Capping values beyond the lower and upper bounds
-        capped_df = df.clip(lower=lower_bound, upper=upper_bound, axis=1)
+    def iqr_capping(self, df, cols, factor=1.5, approximate: bool = False, sketches: dict = None):
+        """Cap the columns to their IQR fences.
+
+        Args:
+            df (pd.DataFrame): a dataframe to be capped
+            cols (list): columns to be capped, all numeric columns if None
+            factor (float, optional): IQR multiplier for the fences. Defaults to 1.5.
+            approximate (bool, optional): compute the quartiles with QuantileSketch. Defaults to False.
+            sketches (dict, optional): column sketches built over the full dataset so that
+                every chunk is capped to the same global fences. Defaults to None.
+
+        Returns:
+            pd.DataFrame: the capped columns
+        """
+        capped_df = OutlierEngine(df, cols, factor=factor, approximate=approximate,
+                                  sketches=sketches).cap('iqr')
 
         return capped_df
-    
\ No newline at end of file
+
+    def outlier_summary(self, df: pd.DataFrame, cols=None) -> pd.DataFrame:
+        """Return the number of outliers per column for every method.
+
+        Args:
+            df (pd.DataFrame): a dataframe to be analyzed
+            cols (list, optional): columns to analyze. Defaults to every numeric column.
+
+        Returns:
+            pd.DataFrame: counts with one row per column and one column per method
+        """
+        summary = OutlierEngine(df, cols).summary()
+        self.logger.info('Calculated outlier counts with the zscore, iqr and percentile methods')
+        return summary
+
+
+class OutlierEngine:
+    """Columnar outlier engine for a block of numeric columns.
+
+    The numeric columns are copied once into a single float64 block and every
+    statistic (mean, std, quartiles, median and the percentile cut points) is
+    computed column-wise over that block in one NumPy pass. Bounds, masks and
+    counts for the z-score, IQR and percentile methods are then derived from
+    those statistics without touching the data again.
+
+    Transforms (``cap``, ``replace_with_median`` and ``log``) write into the
+    working block in place, so the frame is never copied more than once. The
+    statistics always describe the raw data the engine was built from.
+    """
+
+    METHODS = ('zscore', 'iqr', 'percentile')
+
+    def __init__(self, df: pd.DataFrame, cols: list = None, thres: float = 3,
+                 factor: float = 1.5, percentiles: tuple = (10, 90),
+                 approximate: bool = False, sketches: dict = None):
+        """Initialize the engine and compute the column statistics.
+
+        Args:
+            df (pd.DataFrame): dataframe holding the columns to be analyzed
+            cols (list, optional): columns to analyze. Defaults to every numeric column.
+            thres (float, optional): z-score threshold. Defaults to 3.
+            factor (float, optional): IQR multiplier for the fences. Defaults to 1.5.
+            percentiles (tuple, optional): lower and upper percentile cut points. Defaults to (10, 90).
+            approximate (bool, optional): take the quantiles from a QuantileSketch per column
+                instead of sorting the block, see sketch.QuantileSketch for the error bound.
+                Defaults to False.
+            sketches (dict, optional): column sketches built over the full dataset, e.g.
+                merged over every chunk. Implies approximate. Defaults to None.
+        """
+        if cols is None:
+            cols = df.select_dtypes(include=np.number).columns
+        self.columns = pd.Index(cols)
+        self.index = df.index
+        self.thres = thres
+        self.factor = factor
+        self.percentiles = percentiles
+
+        # the only copy of the frame made by the engine
+        self.values = df[self.columns].to_numpy(dtype=np.float64, copy=True)
+
+        self.mean = np.nanmean(self.values, axis=0)
+        self.std = np.nanstd(self.values, axis=0)
+        qs = [25, 50, 75, percentiles[0], percentiles[1]]
+        if approximate or sketches is not None:
+            if sketches is None:
+                sketches = sketch_columns(df, self.columns)
+            stats_ = np.array([sketches[col].quantile(np.array(qs) / 100) for col in self.columns]).T
+        elif np.isnan(self.values).any():
+            stats_ = np.nanpercentile(self.values, qs, axis=0)
+        else:
+            stats_ = np.percentile(self.values, qs, axis=0)
+        self.q1, self.median, self.q3, self.p_low, self.p_high = stats_
+
+    def bounds(self, method: str = 'iqr') -> tuple:
+        """Return the lower and upper bound of every column.
+
+        Args:
+            method (str, optional): one of 'zscore', 'iqr' or 'percentile'. Defaults to 'iqr'.
+
+        Returns:
+            tuple: lower and upper bound arrays, one entry per column
+        """
+        if method == 'zscore':
+            return self.mean - self.thres * self.std, self.mean + self.thres * self.std
+        if method == 'iqr':
+            iqr = self.q3 - self.q1
+            return self.q1 - self.factor * iqr, self.q3 + self.factor * iqr
+        if method == 'percentile':
+            return self.p_low, self.p_high
+        raise ValueError(f'Unknown outlier method {method}, expected one of {self.METHODS}')
+
+    def mask(self, method: str = 'iqr') -> np.ndarray:
+        """Return a boolean array flagging the outliers of every column.
+
+        Args:
+            method (str, optional): one of 'zscore', 'iqr' or 'percentile'. Defaults to 'iqr'.
+
+        Returns:
+            np.ndarray: boolean array with the same shape as the block
+        """
+        lower, upper = self.bounds(method)
+        return (self.values < lower) | (self.values > upper)
+
+    def counts(self, method: str = 'iqr') -> pd.Series:
+        """Return the number of outliers per column.
+
+        Args:
+            method (str, optional): one of 'zscore', 'iqr' or 'percentile'. Defaults to 'iqr'.
+
+        Returns:
+            pd.Series: number of outliers indexed by column name
+        """
+        return pd.Series(self.mask(method).sum(axis=0), index=self.columns)
+
+    def summary(self) -> pd.DataFrame:
+        """Return the outlier count of every column for every method.
+
+        Returns:
+            pd.DataFrame: counts with one row per column and one column per method
+        """
+        return pd.DataFrame({method: self.counts(method) for method in self.METHODS})
+
+    def cap(self, method: str = 'iqr') -> pd.DataFrame:
+        """Clip every column to its bounds.
+
+        Args:
+            method (str, optional): one of 'zscore', 'iqr' or 'percentile'. Defaults to 'iqr'.
+
+        Returns:
+            pd.DataFrame: the capped columns
+        """
+        lower, upper = self.bounds(method)
+        np.clip(self.values, lower, upper, out=self.values)
+        return self.to_frame()
+
+    def replace_with_median(self, method: str = 'iqr') -> pd.DataFrame:
+        """Replace the outliers of every column with the column median.
+
+        Args:
+            method (str, optional): one of 'zscore', 'iqr' or 'percentile'. Defaults to 'iqr'.
+
+        Returns:
+            pd.DataFrame: the columns with outliers replaced
+        """
+        mask = self.mask(method)
+        np.copyto(self.values, np.broadcast_to(self.median, self.values.shape), where=mask)
+        return self.to_frame()
+
+    def log(self) -> pd.DataFrame:
+        """Log transform every column.
+
+        Returns:
+            pd.DataFrame: the log transformed columns
+        """
+        np.log(self.values, out=self.values)
+        return self.to_frame()
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return the working block as a dataframe without copying it.
+
+        Returns:
+            pd.DataFrame: the working block
+        """
+        return pd.DataFrame(self.values, index=self.index, columns=self.columns, copy=False)
@@ -2,9 +2,15 @@ import sys
 
 import numpy as np
 import pandas as pd
+from backend import PolarsOverview, dispatch
+from dedup import Deduplicator
 from logger import Logger
+from profiler import instrument
+from sketch import QuantileSketch
 
 
+@instrument
+@dispatch(PolarsOverview)
 class Overview:
     def __init__(self):
         """Initialize the Overview class.
@@ -51,16 +57,24 @@ class Overview:
             sys.exit(1)
         return round(percentage,2)
 
-    def number_of_duplicates(self, df: pd.DataFrame) -> None:
-        """Prints the number of duplicates in the dataset.
+    def number_of_duplicates(self, df: pd.DataFrame, columns: list = None) -> int:
+        """Count the duplicated rows of the dataset.
+
+        The rows are hashed instead of being compared column by column, so no
+        copy of the duplicates is built.
 
         Args:
             df (pd.DataFrame): Dataset to be analyzed
+            columns (list, optional): key columns of a duplicate, e.g. ['bearer_id', 'start'].
+                Defaults to every column.
+
+        Returns:
+            int: number of rows repeating an earlier row
         """
-        duplicated_entries = df[df.duplicated()]
-        self.logger.info(
-            'Number of duplicated fields calculated')
-        print(duplicated_entries.shape)
+        deduplicator = Deduplicator(columns)
+        deduplicator.duplicated(df)
+        self.logger.info(f'{deduplicator.duplicates} duplicated rows over {df.shape[1]} columns')
+        return deduplicator.duplicates
 
     def get_skewness(self, df):
         """Return the skewness of the dataset.
@@ -73,7 +87,8 @@ class Overview:
         self.logger.info('Skewness calculated')
         return skewness
 
-    def get_decile(self, df: pd.DataFrame, column: str, decile: int, labels: list = []) -> pd.DataFrame:
+    def get_decile(self, df: pd.DataFrame, column: str, decile: int, labels: list = [],
+                   approximate: bool = False, sketch: QuantileSketch = None) -> pd.DataFrame:
         """Get the decile based on the column.
 
         Args:
@@ -81,9 +96,25 @@ class Overview:
             column (str): column to calculate the decile
             decile (int): number of decile
             labels (list, optional): Decile labels. Defaults to [].
+            approximate (bool, optional): take the bucket edges from a QuantileSketch
+                instead of sorting the column. Defaults to False.
+            sketch (QuantileSketch, optional): sketch of the column over the full dataset,
+                so that every chunk is bucketed with the same edges. Implies approximate.
+                Defaults to None.
 
         Returns:
             pd.DataFrame: Calculated decile
         """
-        df['deciles'] = pd.qcut(df[column], decile, labels=labels)
-        return df
\ No newline at end of file
+        if approximate or sketch is not None:
+            if sketch is None:
+                sketch = QuantileSketch().update(df[column].to_numpy())
+            edges = np.unique(sketch.quantile(np.linspace(0, 1, decile + 1)))
+            if labels is not None and labels is not False and len(labels) > len(edges) - 1:
+                # buckets between repeated edges are merged, the others keep the first labels
+                self.logger.info(f'{column} has {len(edges) - 1} distinct buckets out of {decile}, '
+                                 f'keeping the labels {list(labels[:len(edges) - 1])}')
+                labels = labels[:len(edges) - 1]
+            df['deciles'] = pd.cut(df[column], edges, labels=labels, include_lowest=True)
+        else:
+            df['deciles'] = pd.qcut(df[column], decile, labels=labels)
+        return df
@@ -0,0 +1,190 @@
+"""Lazy registry of the Streamlit pages and their startup report.
+
+``app.py`` registers every page of PAGES by module and function name. A page
+module, and with it its heavy dependencies (plotly, PIL, the feature
+store...), is imported the first time its menu entry is selected and stays
+in ``sys.modules`` for every later rerun and session of the process.
+
+The registry records a startup report per process: the time of every
+import made directly by a page module on its first load, the import time of
+the page and the time of its first render. The report is written to
+``logs/startup.json`` after every first render, and a warning is logged when
+a page's first load and render together exceed the cold-start budget, set
+in seconds with the TELECOM_STARTUP_BUDGET environment variable.
+"""
+import builtins
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+
+from logger import Logger
+
+logger = Logger("page_registry.log").get_app_logger()
+
+STARTED = time.perf_counter()
+
+# menu entry, module, render function and icon of every page of app.py
+PAGES = [
+    ('Home', 'pages.home', 'home_app', 'house'),
+    ('Overview', 'pages.overview', 'overview_app', 'globe2'),
+    ('Predict', 'pages.predict', 'prdict_app', 'app'),
+]
+
+
+class ImportTimer:
+    """Time the imports made directly by the module being loaded.
+
+    ``builtins.__import__`` is wrapped while the timer is active. An import
+    statement of the loaded module is timed when the imported module was not
+    in ``sys.modules`` yet, the imports it makes itself are counted in its time.
+    Imports made by other threads in the meantime are counted as well.
+    """
+
+    def __init__(self):
+        """Initialize an empty timer."""
+        self.imports = {}
+        self._depth = 0
+
+    def __enter__(self):
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+        return self
+
+    def __exit__(self, *exc):
+        builtins.__import__ = self._import
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # `from package import module` loads the submodule even if the package is loaded
+        if name in sys.modules:
+            package = sys.modules[name]
+            cold = [f'{name}.{item}' for item in fromlist or ()
+                    if item != '*' and not hasattr(package, item)]
+            key = ', '.join(cold)
+        else:
+            cold, key = True, name
+        if self._depth or level or not cold:
+            return self._import(name, globals, locals, fromlist, level)
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            self._depth -= 1
+            self.imports[key] = self.imports.get(key, 0.0) + time.perf_counter() - start
+
+
+class PageRegistry:
+    def __init__(self, report_path: str = os.path.join('.', 'logs', 'startup.json'), budget: float = None):
+        """Initialize an empty registry.
+
+        Args:
+            report_path (str, optional): JSON file the startup report is written to,
+                None to not write it. Defaults to './logs/startup.json'.
+            budget (float, optional): cold-start budget of a page in seconds. Defaults to
+                the TELECOM_STARTUP_BUDGET environment variable, no budget if unset.
+        """
+        self.report_path = report_path
+        if budget is None and os.environ.get('TELECOM_STARTUP_BUDGET'):
+            budget = float(os.environ['TELECOM_STARTUP_BUDGET'])
+        self.budget = budget
+        self._pages = {}
+        self._loaded = {}
+        self._report = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, module: str, function: str, icon: str = None) -> None:
+        """Register a page without importing it.
+
+        Args:
+            name (str): menu entry of the page
+            module (str): module of the page, e.g. 'pages.overview'
+            function (str): function rendering the page, e.g. 'overview_app'
+            icon (str, optional): bootstrap icon of the menu entry. Defaults to None.
+        """
+        self._pages[name] = (module, function, icon)
+
+    @property
+    def names(self) -> list:
+        return list(self._pages)
+
+    @property
+    def icons(self) -> list:
+        return [icon for _, _, icon in self._pages.values()]
+
+    def load(self, name: str):
+        """Return the render function of a page, importing its module on first use.
+
+        Args:
+            name (str): menu entry of the page
+
+        Returns:
+            callable: the function rendering the page
+        """
+        render = self._loaded.get(name)
+        if render is not None:
+            return render
+        with self._lock:
+            if name not in self._loaded:
+                module, function, _ = self._pages[name]
+                with ImportTimer() as timer:
+                    start = time.perf_counter()
+                    page = importlib.import_module(module)
+                    seconds = time.perf_counter() - start
+                self._loaded[name] = getattr(page, function)
+                self._report[name] = {'module': module, 'import_seconds': seconds,
+                                      'imports': dict(sorted(timer.imports.items(),
+                                                             key=lambda item: -item[1]))}
+                logger.info(f'Imported page {name} from {module} in {seconds:.3f}s')
+            return self._loaded[name]
+
+    def render(self, name: str) -> None:
+        """Render a page, timing its first render in this process.
+
+        Args:
+            name (str): menu entry of the page
+        """
+        render = self.load(name)
+        if 'first_render_seconds' in self._report[name]:
+            render()
+            return
+        start = time.perf_counter()
+        try:
+            render()
+        finally:
+            self._first_render(name, time.perf_counter() - start)
+
+    def _first_render(self, name: str, seconds: float) -> None:
+        entry = self._report[name]
+        entry['first_render_seconds'] = seconds
+        entry['since_start_seconds'] = time.perf_counter() - STARTED
+        cold = entry['import_seconds'] + seconds
+        if self.budget is not None and cold > self.budget:
+            logger.warning(f'Page {name} took {cold:.3f}s to load and render, over the '
+                           f'{self.budget:.3f}s startup budget')
+        if self.report_path is not None:
+            try:
+                os.makedirs(os.path.dirname(self.report_path) or '.', exist_ok=True)
+                with open(self.report_path, 'w') as f:
+                    json.dump(self.report(), f, indent=2)
+            except OSError:
+                logger.exception(f'Could not write the startup report to {self.report_path}')
+
+    def report(self) -> dict:
+        """Return the startup report of this process.
+
+        Returns:
+            dict: the budget, the time since the registry was imported and, for every
+                page loaded so far, its import time, the time of each import it made
+                and the time of its first render
+        """
+        pages = {name: dict(entry) for name, entry in self._report.items()}
+        over = [name for name, entry in pages.items() if self.budget is not None
+                and entry['import_seconds'] + entry.get('first_render_seconds', 0.0) > self.budget]
+        return {'budget_seconds': self.budget, 'uptime_seconds': time.perf_counter() - STARTED,
+                'pages': pages, 'over_budget': over}
+
+
+page_registry = PageRegistry()
@@ -0,0 +1,225 @@
+"""Column-parallel transforms over a shared-memory numeric block.
+
+The numeric columns of a frame are copied once into a float64 block in
+``multiprocessing.shared_memory``, in column-major order so that every
+column is one contiguous slice. ColumnExecutor splits the columns into one
+group per worker process; a task only carries the name of the block, its
+shape and a column range, and the worker attaches to the block and
+transforms its columns in place. Nothing but the per-column results (a
+count, a pair of bounds) is pickled. ``apply`` then copies the transformed
+block back into the frame, once (pandas copies the arrays it is given),
+while ``transform`` returns the block so that it can be read without any
+copy through ``SharedBlock.to_frame``.
+
+The transforms are module functions taking one column and updating it in
+place, e.g. ``executor.apply(df, cols, log_transform)``.
+"""
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from logger import Logger, stage
+
+
+def log_transform(x: np.ndarray) -> None:
+    """Log transform a column."""
+    np.log(x, out=x)
+
+
+def iqr_capping(x: np.ndarray, factor: float = 1.5) -> tuple:
+    """Clip a column to its IQR fences and return the fences."""
+    q1, q3 = np.nanpercentile(x, [25, 75])
+    lower, upper = q1 - factor * (q3 - q1), q3 + factor * (q3 - q1)
+    np.clip(x, lower, upper, out=x)
+    return lower, upper
+
+
+def percentile_capping(x: np.ndarray, low: float = 10, high: float = 90) -> tuple:
+    """Clip a column to two of its percentiles and return them."""
+    lower, upper = np.nanpercentile(x, [low, high])
+    np.clip(x, lower, upper, out=x)
+    return lower, upper
+
+
+def replace_upper_with_median(x: np.ndarray, q: float = 95) -> tuple:
+    """Replace the values above a percentile with the median, as PreProcess.fix_outlier."""
+    upper, median = np.nanpercentile(x, [q, 50])
+    x[x > upper] = median
+    return upper, median
+
+
+def zscore_count(x: np.ndarray, thres: float = 3) -> int:
+    """Return the number of values more than thres standard deviations from the mean."""
+    return int((np.abs(x - np.nanmean(x)) > thres * np.nanstd(x)).sum())
+
+
+class SharedBlock:
+    """Float64 (rows, columns) block in shared memory, column-major."""
+
+    def __init__(self, shape: tuple, name: str = None):
+        """Create a block, or attach to an existing one by name.
+
+        Args:
+            shape (tuple): number of rows and columns
+            name (str, optional): name of an existing block. Defaults to creating one.
+        """
+        size = max(int(np.prod(shape)) * 8, 1)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.shape = tuple(shape)
+        self.array = np.ndarray(self.shape, dtype=np.float64, buffer=self.shm.buf, order='F')
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, cols: list) -> 'SharedBlock':
+        """Copy the columns of a frame into a new block, as float64."""
+        block = cls((len(df), len(cols)))
+        for i, col in enumerate(cols):
+            block.array[:, i] = df[col].to_numpy(dtype=np.float64)
+        return block
+
+    def to_frame(self, columns: list, index: pd.Index = None) -> pd.DataFrame:
+        """Return a dataframe viewing the block without copying it.
+
+        The dataframe is only valid until the block is closed and must be released
+        before, else close raises BufferError.
+        """
+        return pd.DataFrame(self.array, columns=columns, index=index, copy=False)
+
+    def close(self) -> None:
+        """Detach from the block and free it if this process created it."""
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_attached = {}
+
+
+def _run(task: tuple) -> list:
+    """Transform a range of columns of a block in place, in a worker process."""
+    name, shape, start, end, transform, kwargs = task
+    block = _attached.get(name)
+    if block is None or block.shape != shape:
+        # a worker keeps only the block it was last given
+        for old in _attached.values():
+            old.shm.close()
+        _attached.clear()
+        block = _attached[name] = SharedBlock(shape, name)
+    return [transform(block.array[:, i], **kwargs) for i in range(start, end)]
+
+
+class ColumnExecutor:
+    def __init__(self, n_jobs: int = None):
+        """Initialize the ColumnExecutor class.
+
+        Args:
+            n_jobs (int, optional): worker processes, 1 runs the transforms in this
+                process. Defaults to the number of CPUs.
+        """
+        try:
+            self.logger = Logger("preprocessing.log").get_app_logger()
+            self.n_jobs = n_jobs or os.cpu_count() or 1
+            self._pool = None
+            self.logger.info('Successfully Instantiated ColumnExecutor Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate ColumnExecutor Class Object')
+            sys.exit(1)
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        """Return the worker pool, started on first use and reused afterwards."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.n_jobs)
+        return self._pool
+
+    def run(self, block: SharedBlock, transform, **kwargs) -> list:
+        """Apply a transform to every column of a shared block in place.
+
+        Args:
+            block (SharedBlock): the columns
+            transform (callable): module function updating one column in place
+            **kwargs: arguments of the transform
+
+        Returns:
+            list: the value returned by the transform for every column
+        """
+        n_cols = block.shape[1]
+        jobs = min(self.n_jobs, n_cols)
+        if jobs <= 1:
+            return [transform(block.array[:, i], **kwargs) for i in range(n_cols)]
+        edges = np.linspace(0, n_cols, jobs + 1).astype(int)
+        tasks = [(block.name, block.shape, start, end, transform, kwargs)
+                 for start, end in zip(edges[:-1], edges[1:])]
+        return [result for part in self.pool.map(_run, tasks) for result in part]
+
+    def apply(self, df: pd.DataFrame, cols: list, transform, **kwargs) -> pd.Series:
+        """Apply a transform to columns of a frame in parallel and write them back.
+
+        Args:
+            df (pd.DataFrame): the frame, updated in place
+            cols (list): numeric columns to be transformed, converted to float64
+            transform (callable): module function updating one column in place, e.g.
+                log_transform or iqr_capping
+            **kwargs: arguments of the transform
+
+        Returns:
+            pd.Series: the value returned by the transform for every column
+        """
+        cols = list(cols)
+        block, results = self.transform(df, cols, transform, **kwargs)
+        with block:
+            for i, col in enumerate(cols):
+                df[col] = block.array[:, i]
+        return results
+
+    def transform(self, df: pd.DataFrame, cols: list, transform, **kwargs) -> tuple:
+        """Apply a transform to columns of a frame in parallel and return the block.
+
+        The frame is not modified. The caller owns the block and closes it, e.g.
+        ``with block: stats = block.to_frame(cols).describe()``.
+
+        Args:
+            df (pd.DataFrame): the frame
+            cols (list): numeric columns to be transformed, converted to float64
+            transform (callable): module function updating one column in place
+            **kwargs: arguments of the transform
+
+        Returns:
+            tuple: the transformed SharedBlock and the value returned by the transform
+                for every column
+        """
+        cols = list(cols)
+        block = SharedBlock.from_frame(df, cols)
+        try:
+            with stage(transform.__name__, self.logger, rows=len(df)):
+                results = self.run(block, transform, **kwargs)
+        except BaseException:
+            block.close()
+            raise
+        return block, pd.Series(results, index=cols, dtype=object)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
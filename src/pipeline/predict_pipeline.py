@@ -0,0 +1,211 @@
+import json
+import os
+import sys
+import time
+from typing import Callable, Iterable, Iterator, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from logger import Logger, stage
+from registry import registry
+from pipeline.train_pipeline import (CLUSTERS_FILE, ENGAGEMENT_FEATURES, EXPERIENCE_FEATURES,
+                                     USER_KEY, normalize_features)
+
+# clusters scored in the notebooks, used when the models have no clusters.json
+NOTEBOOK_CLUSTERS = {'engagement': 3, 'experience': 0}
+
+
+class ScoringPipeline:
+    """Score subscribers with the saved engagement, experience and satisfaction models.
+
+    The three models are taken once from the model registry when the pipeline
+    is created. The engagement score of a user is the euclidean distance of
+    its normalized engagement features to the stored centroid of the less
+    engaged cluster, the experience score the distance to the centroid of the
+    worst experience cluster, both computed with NumPy from
+    ``cluster_centers_`` without refitting the models. Unless given, these
+    clusters are read from the clusters.json that train_users saves next to
+    the models, or are the notebooks' clusters 3 and 0 when it is missing.
+    The satisfaction model
+    is then applied to the whole (engagement, experience) array of a chunk in
+    one predict call. Input is read and scored in fixed-size chunks, so the
+    number of subscribers is only bounded by the disk.
+    """
+
+    def __init__(self, model_dir: str = '../models', chunksize: int = 100_000,
+                 engagement_cluster: int = None, experience_cluster: int = None,
+                 fill_values: dict = None, key: str = USER_KEY):
+        """Initialize the ScoringPipeline class and load the models.
+
+        Args:
+            model_dir (str, optional): directory of the pickled models. Defaults to '../models'.
+            chunksize (int, optional): users scored per vectorized chunk. Defaults to 100_000.
+            engagement_cluster (int, optional): index of the less engaged cluster.
+                Defaults to the one saved at training time, else 3.
+            experience_cluster (int, optional): index of the worst experience cluster.
+                Defaults to the one saved at training time, else 0.
+            fill_values (dict, optional): replacement of missing feature values, e.g. the
+                training means. Defaults to 0.
+            key (str, optional): column identifying a subscriber. Defaults to 'msisdn/number'.
+        """
+        try:
+            self.logger = Logger("predict_pipeline.log").get_app_logger()
+            self.chunksize = chunksize
+            self.key = key
+            self.fill_values = pd.Series(fill_values if fill_values else {}, dtype='float64')
+            self.engagement_model = self.load_model(os.path.join(model_dir, 'user_eng.pkl'))
+            self.experience_model = self.load_model(os.path.join(model_dir, 'user_exp.pkl'))
+            self.satisfaction_model = self.load_model(os.path.join(model_dir, 'satisfaction_model.pkl'))
+            clusters = self.load_clusters(model_dir)
+            self.engagement_centroid = self._centroid(
+                self.engagement_model, clusters['engagement'] if engagement_cluster is None else engagement_cluster)
+            self.experience_centroid = self._centroid(
+                self.experience_model, clusters['experience'] if experience_cluster is None else experience_cluster)
+            self.stats = {}
+            self.logger.info('Successfully Instantiated ScoringPipeline Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate ScoringPipeline Class Object')
+            sys.exit(1)
+
+    def load_model(self, path: str):
+        """Return a model from the process-wide registry.
+
+        Args:
+            path (str): path of the pickled model
+
+        Returns:
+            the unpickled model
+        """
+        model = registry.get(path)
+        self.logger.info(f'Loaded model {path}')
+        return model
+
+    def load_clusters(self, model_dir: str) -> dict:
+        """Return the scored cluster indices saved with the models.
+
+        Args:
+            model_dir (str): directory of the pickled models
+
+        Returns:
+            dict: engagement and experience cluster indices, the notebooks' ones
+                when the models were not saved with a clusters.json
+        """
+        path = os.path.join(model_dir, CLUSTERS_FILE)
+        if not os.path.exists(path):
+            self.logger.info(f'No {path}, scoring the notebook clusters {NOTEBOOK_CLUSTERS}')
+            return dict(NOTEBOOK_CLUSTERS)
+        with open(path) as f:
+            clusters = {**NOTEBOOK_CLUSTERS, **json.load(f)}
+        self.logger.info(f'Scoring the clusters {clusters} saved in {path}')
+        return clusters
+
+    def _centroid(self, model, cluster: int) -> np.ndarray:
+        centers = model.cluster_centers_
+        if not 0 <= cluster < len(centers):
+            raise ValueError(f'Cluster {cluster} does not exist in a model with {len(centers)} clusters')
+        return centers[cluster]
+
+    def _distance(self, features: pd.DataFrame, centroid: np.ndarray) -> np.ndarray:
+        X = normalize_features(features, self.fill_values.reindex(features.columns).fillna(0.0))
+        X -= centroid
+        return np.sqrt(np.einsum('ij,ij->i', X, X))
+
+    def score_chunk(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Score one chunk of users.
+
+        Args:
+            df (pd.DataFrame): users with the engagement and experience feature columns
+
+        Returns:
+            pd.DataFrame: engagement, experience and satisfaction score of every user,
+                with the user key if df has it
+        """
+        engagement = self._distance(df[ENGAGEMENT_FEATURES], self.engagement_centroid)
+        experience = self._distance(df[EXPERIENCE_FEATURES], self.experience_centroid)
+        scores = pd.DataFrame({'engagement_score': engagement, 'experience_score': experience},
+                              index=df.index)
+        satisfaction = np.asarray(self.satisfaction_model.predict(scores))
+        scores['satisfaction_score'] = satisfaction.reshape(len(df), -1)[:, 0]
+        if self.key in df.columns:
+            scores.insert(0, self.key, df[self.key].to_numpy())
+        return scores
+
+    def iter_chunks(self, source: Union[str, pd.DataFrame, Iterable, Callable]) -> Iterator[pd.DataFrame]:
+        """Yield the input in chunks of at most chunksize users.
+
+        Args:
+            source (str | pd.DataFrame | Iterable | Callable): a csv or parquet file, a
+                dataframe, an iterable of dataframes or a callable returning one
+
+        Yields:
+            pd.DataFrame: the next chunk
+        """
+        if isinstance(source, pd.DataFrame):
+            for start in range(0, len(source), self.chunksize):
+                yield source.iloc[start:start + self.chunksize]
+        elif isinstance(source, (str, os.PathLike)) and str(source).endswith('.parquet'):
+            columns = [c for c in [self.key] + ENGAGEMENT_FEATURES + EXPERIENCE_FEATURES
+                       if c in pq.read_schema(source).names]
+            for batch in pq.ParquetFile(source).iter_batches(self.chunksize, columns=columns):
+                yield batch.to_pandas()
+        elif isinstance(source, (str, os.PathLike)):
+            yield from pd.read_csv(source, chunksize=self.chunksize)
+        else:
+            for chunk in (source() if callable(source) else source):
+                yield from self.iter_chunks(chunk)
+
+    def iter_scores(self, source) -> Iterator[pd.DataFrame]:
+        """Yield the scores of the input chunk by chunk and record the throughput.
+
+        Args:
+            source: see iter_chunks
+
+        Yields:
+            pd.DataFrame: scores of the next chunk
+        """
+        rows = 0
+        start = time.perf_counter()
+        with stage('score', self.logger) as record:
+            for chunk in self.iter_chunks(source):
+                scores = self.score_chunk(chunk)
+                rows += len(scores)
+                yield scores
+            record['rows'] = rows
+        seconds = time.perf_counter() - start
+        self.stats = {'rows': rows, 'seconds': seconds,
+                      'rows_per_second': rows / seconds if seconds else float('inf')}
+        self.logger.info(f'Scored {rows} users in {seconds:.3f}s '
+                         f'({self.stats["rows_per_second"]:.0f} rows/s)')
+
+    def score(self, source, output_path: str = None) -> pd.DataFrame:
+        """Score every user of the input.
+
+        Args:
+            source: see iter_chunks
+            output_path (str, optional): csv or parquet file the scores are appended to
+                chunk by chunk instead of being returned. Defaults to None.
+
+        Returns:
+            pd.DataFrame: the scores, or None when written to output_path. The
+                throughput is kept in ``stats``.
+        """
+        if output_path is None:
+            return pd.concat(list(self.iter_scores(source)))
+
+        writer = None
+        header = True
+        try:
+            for scores in self.iter_scores(source):
+                if output_path.endswith('.parquet'):
+                    table = pa.Table.from_pandas(scores, preserve_index=False)
+                    writer = writer or pq.ParquetWriter(output_path, table.schema, compression='zstd')
+                    writer.write_table(table)
+                else:
+                    scores.to_csv(output_path, mode='w' if header else 'a', header=header, index=False)
+                    header = False
+        finally:
+            if writer is not None:
+                writer.close()
+        return None
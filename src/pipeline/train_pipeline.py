@@ -0,0 +1,393 @@
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from kneed import KneeLocator
+from logger import Logger, timed
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.preprocessing import Normalizer
+from threadpoolctl import threadpool_limits
+
+USER_KEY = 'msisdn/number'
+
+# indices of the scored clusters, saved next to the models by train_users
+CLUSTERS_FILE = 'clusters.json'
+# +1 for the features where a larger value is better, -1 where it is worse
+ENGAGEMENT_SIGNS = [1.0, 1.0, 1.0]
+EXPERIENCE_SIGNS = [-1.0, 1.0, -1.0]
+
+# output column: (input column(s), aggregation). A tuple of input columns is
+# summed row-wise first, as the notebooks do for the DL + UL totals.
+ENGAGEMENT_METRICS = {
+    'sessions': ('bearer_id', 'count'),
+    'dur._(ms)': ('dur._(ms)', 'sum'),
+    'total_data': ('total_data', 'sum'),
+}
+EXPERIENCE_METRICS = {
+    'avg_rtt_total': (('avg_rtt_dl_(ms)', 'avg_rtt_ul_(ms)'), 'sum'),
+    'avg_tp_total': (('avg_bearer_tp_dl_(kbps)', 'avg_bearer_tp_ul_(kbps)'), 'sum'),
+    'total_avg_tcp_total': (('tcp_dl_retrans._vol_(bytes)', 'tcp_ul_retrans._vol_(bytes)'), 'sum'),
+    'handset_type': ('handset_type', 'mode'),
+}
+
+
+class UserAggregator:
+    """Per-subscriber aggregation in a single grouped pass over NumPy arrays.
+
+    The user key is factorized once into dense integer codes. Counts, sums and
+    means of every numeric metric are scatter-added with ``np.bincount`` over
+    those codes, and the most frequent value of a categorical column is found
+    by counting (user, value) code pairs, so no Python function runs per user.
+    NaN values are skipped like ``groupby().agg`` does and rows without a key
+    are dropped. Ties of the mode resolve to the smallest value, as
+    ``x.mode()[0]`` does.
+    """
+
+    AGGREGATIONS = ('count', 'sum', 'mean', 'mode')
+
+    def __init__(self, key: str = USER_KEY):
+        """Initialize the UserAggregator class.
+
+        Args:
+            key (str, optional): column identifying a subscriber. Defaults to 'msisdn/number'.
+        """
+        try:
+            self.logger = Logger("train_pipeline.log").get_app_logger()
+            self.key = key
+            self.logger.info('Successfully Instantiated UserAggregator Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate UserAggregator Class Object')
+            sys.exit(1)
+
+    def _values(self, df: pd.DataFrame, columns) -> np.ndarray:
+        """Return the float64 values of a column, or the row-wise sum of several."""
+        if isinstance(columns, str):
+            return df[columns].to_numpy(dtype=np.float64)
+        values = df[columns[0]].to_numpy(dtype=np.float64, copy=True)
+        for column in columns[1:]:
+            values += df[column].to_numpy(dtype=np.float64)
+        return values
+
+    def _pairs(self, codes: np.ndarray, column: pd.Series) -> tuple:
+        """Count the (user, value) pairs of a categorical column.
+
+        Returns:
+            tuple: user codes, value codes and counts of every pair, and the values
+        """
+        value_codes, values = pd.factorize(column, sort=True)
+        valid = value_codes >= 0
+        pairs = codes[valid].astype(np.int64) * len(values) + value_codes[valid]
+        pairs, counts = np.unique(pairs, return_counts=True)
+        users, value_codes = np.divmod(pairs, max(len(values), 1))
+        return users, value_codes, counts, np.asarray(values, dtype=object)
+
+    def _mode(self, users: np.ndarray, value_codes: np.ndarray, counts: np.ndarray,
+              values: np.ndarray, n_users: int) -> np.ndarray:
+        """Return the most frequent value of every user from its pair counts.
+
+        Value codes must follow the sort order of the values so that ties resolve
+        to the smallest value.
+        """
+        # highest count first, smallest value code on ties
+        order = np.lexsort((value_codes, -counts, users))
+        users, first = np.unique(users[order], return_index=True)
+        result = np.full(n_users, np.nan, dtype=object)
+        result[users] = values[value_codes[order][first]]
+        return result
+
+    def partial(self, df: pd.DataFrame, metrics: dict) -> dict:
+        """Compute the mergeable partial aggregates of a batch of sessions.
+
+        Args:
+            df (pd.DataFrame): xDR sessions, one row per session
+            metrics (dict): output column to (input column(s), aggregation), the
+                aggregation being one of 'count', 'sum', 'mean' or 'mode'
+
+        Returns:
+            dict: 'users' (sorted user keys), 'sums' and 'counts' (non-null values) of
+                every numeric metric, and 'pairs' holding the (user code, value code,
+                count) triples and values of every mode metric
+        """
+        codes, users = pd.factorize(df[self.key], sort=True)
+        valid = codes >= 0
+        codes = codes[valid]
+        n_users = len(users)
+
+        partial = {'users': np.asarray(users), 'sums': {}, 'counts': {}, 'pairs': {}}
+        for name, (columns, how) in metrics.items():
+            if how not in self.AGGREGATIONS:
+                raise ValueError(f'Unknown aggregation {how}, expected one of {self.AGGREGATIONS}')
+            if how == 'mode':
+                partial['pairs'][name] = self._pairs(codes, df[columns][valid])
+                continue
+            values = self._values(df, columns)[valid]
+            present = ~np.isnan(values)
+            partial['counts'][name] = np.bincount(codes, weights=present, minlength=n_users)
+            partial['sums'][name] = np.bincount(codes, weights=np.where(present, values, 0.0),
+                                                minlength=n_users)
+        return partial
+
+    def finalize(self, partial: dict, metrics: dict) -> pd.DataFrame:
+        """Turn partial aggregates into the per-user feature table.
+
+        Args:
+            partial (dict): partial aggregates as returned by partial
+            metrics (dict): the metrics the partial aggregates were computed for
+
+        Returns:
+            pd.DataFrame: one row per user indexed by the user key
+        """
+        n_users = len(partial['users'])
+        result = {}
+        for name, (_, how) in metrics.items():
+            if how == 'mode':
+                result[name] = self._mode(*partial['pairs'][name], n_users)
+            elif how == 'count':
+                result[name] = partial['counts'][name].astype(np.int64)
+            elif how == 'sum':
+                result[name] = partial['sums'][name]
+            else:
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result[name] = partial['sums'][name] / partial['counts'][name]
+        return pd.DataFrame(result, index=pd.Index(partial['users'], name=self.key))
+
+    def aggregate(self, df: pd.DataFrame, metrics: dict) -> pd.DataFrame:
+        """Aggregate the metrics of every user.
+
+        Args:
+            df (pd.DataFrame): xDR sessions, one row per session
+            metrics (dict): output column to (input column(s), aggregation), the
+                aggregation being one of 'count', 'sum', 'mean' or 'mode'
+
+        Returns:
+            pd.DataFrame: one row per user indexed by the sorted user key
+        """
+        features = self.finalize(self.partial(df, metrics), metrics)
+        self.logger.info(f'Aggregated {len(df)} sessions into {len(features)} users')
+        return features
+
+    def user_features(self, df: pd.DataFrame, engagement: dict = ENGAGEMENT_METRICS,
+                      experience: dict = EXPERIENCE_METRICS) -> tuple:
+        """Compute the engagement and experience tables in one grouped pass.
+
+        Args:
+            df (pd.DataFrame): xDR sessions, one row per session
+            engagement (dict, optional): engagement metrics. Defaults to ENGAGEMENT_METRICS.
+            experience (dict, optional): experience metrics. Defaults to EXPERIENCE_METRICS.
+
+        Returns:
+            tuple: engagement and experience feature tables indexed by user
+        """
+        features = self.aggregate(df, {**engagement, **experience})
+        return features[list(engagement)], features[list(experience)]
+
+
+ENGAGEMENT_FEATURES = ['sessions', 'dur._(ms)', 'total_data']
+EXPERIENCE_FEATURES = ['avg_rtt_total', 'avg_tp_total', 'total_avg_tcp_total']
+
+def normalize_features(features: pd.DataFrame, fill_values=0.0) -> np.ndarray:
+    """Scale every row of the feature table to unit norm.
+
+    The scaling is row-wise, so chunks of a table can be normalized
+    independently. Infinite and missing values are replaced by fill_values.
+
+    Args:
+        features (pd.DataFrame): feature columns of the users
+        fill_values (float | pd.Series, optional): replacement of missing values,
+            e.g. the column means of the training table. Defaults to 0.0.
+
+    Returns:
+        np.ndarray: float64 matrix with one unit-norm row per user
+    """
+    X = features.replace([np.inf, -np.inf], np.nan).fillna(fill_values)
+    return Normalizer().fit_transform(X.to_numpy(dtype=np.float64))
+
+
+# feature matrix shared with the worker processes of the elbow search
+_WORKER_X = None
+
+
+def _init_worker(X: np.ndarray) -> None:
+    global _WORKER_X
+    _WORKER_X = X
+
+
+def _fit_k(params: dict) -> tuple:
+    """Fit one candidate k in a worker process and time it."""
+    start = time.perf_counter()
+    # without a pool the caller's own dict is passed, so it is not modified
+    model_params = {name: value for name, value in params.items() if name != 'threads'}
+    with threadpool_limits(limits=params['threads']):
+        model = ClusterTrainer.make_model(**model_params)
+        inertia = ClusterTrainer.fit_model(model, _WORKER_X, params['batch_size'])
+    return model, inertia, time.perf_counter() - start
+
+
+class ClusterTrainer:
+    """Train the engagement and experience k-means models.
+
+    The candidate values of k for the elbow search are fitted concurrently in a
+    process pool, every worker receiving the normalized feature matrix once.
+    Each worker is limited to one BLAS/OpenMP thread so the pool does not
+    oversubscribe the cores. In 'minibatch' mode the models are fitted with
+    MiniBatchKMeans.partial_fit over slices whose size is derived from a fixed
+    memory budget, which keeps tables with millions of subscribers tractable.
+    The inertia and fit time of every k are kept in ``history``.
+    """
+
+    MODES = ('kmeans', 'minibatch')
+
+    def __init__(self, k_range=range(1, 16), mode: str = 'kmeans', n_jobs: int = None,
+                 memory_budget: int = 256 << 20, random_state: int = 42):
+        """Initialize the ClusterTrainer class.
+
+        Args:
+            k_range (iterable, optional): candidate number of clusters. Defaults to range(1, 16).
+            mode (str, optional): 'kmeans' or 'minibatch'. Defaults to 'kmeans'.
+            n_jobs (int, optional): worker processes, all cores if None. Defaults to None.
+            memory_budget (int, optional): bytes a mini-batch may use. Defaults to 256 MiB.
+            random_state (int, optional): seed of the fits. Defaults to 42.
+        """
+        try:
+            self.logger = Logger("train_pipeline.log").get_app_logger()
+            if mode not in self.MODES:
+                raise ValueError(f'Unknown mode {mode}, expected one of {self.MODES}')
+            self.k_range = list(k_range)
+            self.mode = mode
+            self.n_jobs = n_jobs or os.cpu_count()
+            self.memory_budget = memory_budget
+            self.random_state = random_state
+            self.history = {}
+            self.logger.info('Successfully Instantiated ClusterTrainer Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate ClusterTrainer Class Object')
+            sys.exit(1)
+
+    @staticmethod
+    def make_model(k: int, mode: str, random_state: int, batch_size: int):
+        """Return an unfitted k-means model with the notebook settings."""
+        if mode == 'minibatch':
+            return MiniBatchKMeans(n_clusters=k, init='k-means++', n_init=3,
+                                   batch_size=batch_size, random_state=random_state)
+        return KMeans(init='random', n_clusters=k, n_init=10, max_iter=300, random_state=random_state)
+
+    @staticmethod
+    def fit_model(model, X: np.ndarray, batch_size: int) -> float:
+        """Fit a model and return its inertia over the whole matrix."""
+        if isinstance(model, KMeans):
+            model.fit(X)
+            return float(model.inertia_)
+        for start in range(0, len(X), batch_size):
+            model.partial_fit(X[start:start + batch_size])
+        inertia = 0.0
+        for start in range(0, len(X), batch_size):
+            inertia += float((model.transform(X[start:start + batch_size]).min(axis=1) ** 2).sum())
+        return inertia
+
+    def batch_size(self, X: np.ndarray) -> int:
+        """Return the rows per mini-batch that fit in the memory budget."""
+        row_bytes = 8 * (X.shape[1] + max(self.k_range))
+        return int(min(len(X), max(1024, self.memory_budget // row_bytes)))
+
+    def normalize(self, features: pd.DataFrame, columns: list) -> np.ndarray:
+        """Return the normalized feature matrix as in the notebooks.
+
+        Infinite values are replaced by NaN and NaN by the column mean before the
+        rows are scaled to unit norm.
+        """
+        X = features[columns].replace([np.inf, -np.inf], np.nan)
+        return normalize_features(X, X.mean())
+
+    def elbow(self, X: np.ndarray) -> tuple:
+        """Fit every candidate k concurrently and locate the elbow.
+
+        Args:
+            X (np.ndarray): normalized feature matrix
+
+        Returns:
+            tuple: the chosen k, the fitted model per k and the inertia and fit
+                seconds per k
+        """
+        batch_size = self.batch_size(X)
+        params = [{'k': k, 'mode': self.mode, 'random_state': self.random_state,
+                   'batch_size': batch_size, 'threads': 1} for k in self.k_range]
+        n_jobs = min(self.n_jobs, len(params))
+        models = {}
+        history = {}
+        if n_jobs > 1:
+            with ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=(X,)) as pool:
+                results = list(pool.map(_fit_k, params))
+        else:
+            _init_worker(X)
+            results = [_fit_k(p) for p in params]
+        for k, (model, inertia, seconds) in zip(self.k_range, results):
+            models[k] = model
+            history[k] = {'inertia': inertia, 'seconds': seconds}
+            self.logger.info(f'k={k}: inertia {inertia:.4f} fitted in {seconds:.3f}s')
+
+        inertias = [history[k]['inertia'] for k in self.k_range]
+        elbow = KneeLocator(self.k_range, inertias, curve='convex', direction='decreasing').elbow
+        chosen = elbow if elbow is not None else self.k_range[-1]
+        self.logger.info(f'The optimal number of cluster is: {chosen}')
+        return chosen, models, pd.DataFrame(history).T.rename_axis('k')
+
+    @timed('train_kmeans')
+    def train(self, features: pd.DataFrame, columns: list, path: str, n_clusters: int = None):
+        """Search k, keep the chosen model and save it with pickle.
+
+        Args:
+            features (pd.DataFrame): per-user feature table
+            columns (list): feature columns used for clustering
+            path (str): where the model is pickled
+            n_clusters (int, optional): fixed number of clusters to keep instead of the
+                elbow, e.g. 3 as in the notebooks. Defaults to None.
+
+        Returns:
+            the fitted model
+        """
+        X = self.normalize(features, columns)
+        chosen, models, history = self.elbow(X)
+        k = n_clusters or chosen
+        model = models.get(k)
+        if model is None:
+            model = self.make_model(k, self.mode, self.random_state, self.batch_size(X))
+            self.fit_model(model, X, self.batch_size(X))
+        self.history[path] = history
+        with open(path, 'wb') as f:
+            pickle.dump(model, f)
+        self.logger.info(f'Saved k-means model with {k} clusters to {path}')
+        return model
+
+    def train_users(self, user_eng: pd.DataFrame, user_exp: pd.DataFrame, model_dir: str = '../models',
+                    n_clusters: int = None) -> tuple:
+        """Train and save the engagement and experience models.
+
+        Args:
+            user_eng (pd.DataFrame): engagement feature table
+            user_exp (pd.DataFrame): experience feature table
+            model_dir (str, optional): directory of the models. Defaults to '../models'.
+            n_clusters (int, optional): fixed number of clusters. Defaults to the elbow.
+
+        The less engaged cluster (smallest sum of the scaled engagement features)
+        and the worst experience cluster (smallest signed sum, RTT and TCP
+        retransmission count against it) are chosen once here and saved to
+        clusters.json, which the ScoringPipeline reads.
+
+        Returns:
+            tuple: engagement and experience models
+        """
+        eng_model = self.train(user_eng, ENGAGEMENT_FEATURES, os.path.join(model_dir, 'user_eng.pkl'), n_clusters)
+        exp_model = self.train(user_exp, EXPERIENCE_FEATURES, os.path.join(model_dir, 'user_exp.pkl'), n_clusters)
+        clusters = {
+            'engagement': int(np.argmin(eng_model.cluster_centers_ @ np.asarray(ENGAGEMENT_SIGNS))),
+            'experience': int(np.argmin(exp_model.cluster_centers_ @ np.asarray(EXPERIENCE_SIGNS))),
+        }
+        with open(os.path.join(model_dir, CLUSTERS_FILE), 'w') as f:
+            json.dump(clusters, f)
+        self.logger.info(f'Saved the scored clusters {clusters} to {model_dir}')
+        return eng_model, exp_model
@@ -0,0 +1,223 @@
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+from logger import Logger
+from pipeline.train_pipeline import (ENGAGEMENT_METRICS, EXPERIENCE_METRICS,
+                                     USER_KEY, UserAggregator)
+
+
+class UserState:
+    """Persistent per-subscriber aggregate state updated with xDR batches.
+
+    For every subscriber the state holds the running sum and non-null count of
+    every numeric metric and a frequency counter of every categorical metric
+    (e.g. the handset type). A new batch is pre-aggregated with
+    UserAggregator.partial and merged into the state through a hash index from
+    the MSISDN to its row, so an update costs time proportional to the batch,
+    not to the history. ``features`` returns the same engagement and
+    experience tables as a full recompute over the whole history.
+    """
+
+    def __init__(self, engagement: dict = ENGAGEMENT_METRICS, experience: dict = EXPERIENCE_METRICS,
+                 key: str = USER_KEY, capacity: int = 1024):
+        """Initialize an empty state.
+
+        Args:
+            engagement (dict, optional): engagement metrics. Defaults to ENGAGEMENT_METRICS.
+            experience (dict, optional): experience metrics. Defaults to EXPERIENCE_METRICS.
+            key (str, optional): column identifying a subscriber. Defaults to 'msisdn/number'.
+            capacity (int, optional): initial number of user rows, grown by doubling. Defaults to 1024.
+        """
+        try:
+            self.logger = Logger("train_pipeline.log").get_app_logger()
+            self.aggregator = UserAggregator(key)
+            self.key = key
+            self.engagement = dict(engagement)
+            self.experience = dict(experience)
+            self.metrics = {**self.engagement, **self.experience}
+            self.numeric = [name for name, (_, how) in self.metrics.items() if how != 'mode']
+            self.categorical = [name for name, (_, how) in self.metrics.items() if how == 'mode']
+
+            self.n_users = 0
+            self.n_sessions = 0
+            self.keys = None
+            self.rows = {}
+            self.last_rows = np.empty(0, dtype=np.int64)
+            self.sums = np.zeros((capacity, len(self.numeric)))
+            self.counts = np.zeros((capacity, len(self.numeric)))
+            self.values = {name: [] for name in self.categorical}
+            self.value_codes = {name: {} for name in self.categorical}
+            self.pair_slots = {name: {} for name in self.categorical}
+            self.pairs = {name: np.zeros((capacity, 3), dtype=np.int64) for name in self.categorical}
+            self.logger.info('Successfully Instantiated UserState Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate UserState Class Object')
+            sys.exit(1)
+
+    def _grow(self, array: np.ndarray, size: int) -> np.ndarray:
+        """Return the array with at least size rows, doubling its capacity."""
+        if size <= len(array):
+            return array
+        grown = np.zeros((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def update(self, batch: pd.DataFrame) -> 'UserState':
+        """Merge a batch of xDR sessions into the state.
+
+        Args:
+            batch (pd.DataFrame): new xDR sessions, e.g. one day of records
+
+        Returns:
+            UserState: the state itself
+        """
+        partial = self.aggregator.partial(batch, self.metrics)
+        users = partial['users']
+        if self.keys is None:
+            self.keys = np.empty(len(self.sums), dtype=users.dtype)
+
+        rows = np.fromiter((self.rows.setdefault(k, len(self.rows)) for k in users.tolist()),
+                           dtype=np.int64, count=len(users))
+        self.n_users = len(self.rows)
+        self.sums = self._grow(self.sums, self.n_users)
+        self.counts = self._grow(self.counts, self.n_users)
+        self.keys = self._grow(self.keys, self.n_users)
+        self.keys[rows] = users
+
+        # user keys are unique within a batch, so plain fancy-index adds are safe
+        for j, name in enumerate(self.numeric):
+            self.sums[rows, j] += partial['sums'][name]
+            self.counts[rows, j] += partial['counts'][name]
+
+        for name in self.categorical:
+            pair_users, value_codes, counts, values = partial['pairs'][name]
+            value_index = self.value_codes[name]
+            known = len(value_index)
+            state_codes = np.fromiter((value_index.setdefault(v, len(value_index)) for v in values),
+                                      dtype=np.int64, count=len(values))
+            self.values[name].extend(values[state_codes >= known])
+
+            pair_rows, pair_codes = rows[pair_users], state_codes[value_codes]
+            slot_index = self.pair_slots[name]
+            slots = np.fromiter((slot_index.setdefault(p, len(slot_index))
+                                 for p in zip(pair_rows.tolist(), pair_codes.tolist())),
+                                dtype=np.int64, count=len(pair_rows))
+            table = self._grow(self.pairs[name], len(slot_index))
+            table[slots, 0] = pair_rows
+            table[slots, 1] = pair_codes
+            table[slots, 2] += counts
+            self.pairs[name] = table
+
+        self.last_rows = rows
+        self.n_sessions += len(batch)
+        self.logger.info(f'Merged {len(batch)} sessions of {len(users)} users, state holds {self.n_users} users')
+        return self
+
+    def partial(self) -> dict:
+        """Return the state as partial aggregates sorted by user key.
+
+        Returns:
+            dict: partial aggregates in the format of UserAggregator.partial
+        """
+        order = np.argsort(self.keys[:self.n_users], kind='stable')
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))
+
+        partial = {'users': self.keys[:self.n_users][order], 'sums': {}, 'counts': {}, 'pairs': {}}
+        for j, name in enumerate(self.numeric):
+            partial['sums'][name] = self.sums[:self.n_users, j][order]
+            partial['counts'][name] = self.counts[:self.n_users, j][order]
+        for name in self.categorical:
+            table = self.pairs[name][:len(self.pair_slots[name])]
+            values = np.asarray(self.values[name], dtype=object)
+            # recode the values in sorted order so that mode ties resolve like x.mode()[0]
+            value_order = np.argsort(values, kind='stable')
+            rank = np.empty_like(value_order)
+            rank[value_order] = np.arange(len(values))
+            partial['pairs'][name] = (position[table[:, 0]], rank[table[:, 1]], table[:, 2],
+                                      values[value_order])
+        return partial
+
+    def features(self) -> tuple:
+        """Return the engagement and experience tables of every user seen so far.
+
+        Returns:
+            tuple: engagement and experience feature tables indexed by user
+        """
+        features = self.aggregator.finalize(self.partial(), self.metrics)
+        return features[list(self.engagement)], features[list(self.experience)]
+
+    def latest(self) -> pd.DataFrame:
+        """Return the numeric features of the users of the last batch, e.g. to update a Leaderboard.
+
+        Returns:
+            pd.DataFrame: the current numeric features of those users indexed by user
+        """
+        rows = self.last_rows
+        result = {}
+        for j, name in enumerate(self.numeric):
+            sums, counts = self.sums[rows, j], self.counts[rows, j]
+            how = self.metrics[name][1]
+            if how == 'count':
+                result[name] = counts.astype(np.int64)
+            elif how == 'sum':
+                result[name] = sums
+            else:
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result[name] = sums / counts
+        return pd.DataFrame(result, index=pd.Index(self.keys[rows], name=self.key))
+
+    def verify(self, history: pd.DataFrame, rtol: float = 1e-9) -> bool:
+        """Check the state against a full recompute over the whole history.
+
+        Args:
+            history (pd.DataFrame): every xDR session merged into the state
+            rtol (float, optional): relative tolerance of the numeric metrics. Defaults to 1e-9.
+
+        Returns:
+            bool: True if both tables match the full recompute
+        """
+        expected = self.aggregator.user_features(history, self.engagement, self.experience)
+        matches = True
+        for table, reference in zip(self.features(), expected):
+            if not table.index.equals(reference.index):
+                matches = False
+                continue
+            for column in table.columns:
+                if column in self.categorical:
+                    same = (table[column] == reference[column]) | (table[column].isna() & reference[column].isna())
+                    matches &= bool(same.all())
+                else:
+                    matches &= bool(np.allclose(table[column].astype(float), reference[column].astype(float),
+                                                rtol=rtol, equal_nan=True))
+        self.logger.info(f'State verified against a full recompute: {matches}')
+        return matches
+
+    def save(self, path: str) -> None:
+        """Persist the state with pickle.
+
+        Args:
+            path (str): path of the state file, e.g. '../models/user_state.pkl'
+        """
+        state = {k: v for k, v in self.__dict__.items() if k not in ('logger', 'aggregator')}
+        with open(path, 'wb') as f:
+            pickle.dump(state, f)
+        self.logger.info(f'Saved the state of {self.n_users} users to {path}')
+
+    @classmethod
+    def load(cls, path: str) -> 'UserState':
+        """Load a state persisted with save.
+
+        Args:
+            path (str): path of the state file
+
+        Returns:
+            UserState: the loaded state
+        """
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        self = cls(state['engagement'], state['experience'], state['key'])
+        self.__dict__.update(state)
+        return self
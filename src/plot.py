@@ -1,4 +1,7 @@
+import argparse
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
@@ -6,6 +9,115 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from logger import Logger
 
+
+def box_stats(values, label: str = '', whis: float = 1.5, max_fliers: int = 500, seed: int = 0) -> dict:
+    """Compute the box and whisker statistics of a column for Axes.bxp.
+
+    Args:
+        values (array-like): values of the column, NaN are ignored
+        label (str, optional): label of the box. Defaults to ''.
+        whis (float, optional): whisker reach in IQRs. Defaults to 1.5.
+        max_fliers (int, optional): outliers kept for drawing, the extremes are always
+            kept. Defaults to 500.
+        seed (int, optional): seed of the outlier sample. Defaults to 0.
+
+    Returns:
+        dict: med, q1, q3, whislo, whishi, fliers and label
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {'med': np.nan, 'q1': np.nan, 'q3': np.nan, 'whislo': np.nan, 'whishi': np.nan,
+                'fliers': np.array([]), 'label': label}
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    low, high = q1 - whis * (q3 - q1), q3 + whis * (q3 - q1)
+    inside = values[(values >= low) & (values <= high)]
+    fliers = values[(values < low) | (values > high)]
+    if len(fliers) > max_fliers:
+        sample = np.random.default_rng(seed).choice(fliers, max_fliers - 2, replace=False)
+        fliers = np.concatenate([sample, [fliers.min(), fliers.max()]])
+    return {'med': med, 'q1': q1, 'q3': q3,
+            'whislo': inside.min() if len(inside) else q1, 'whishi': inside.max() if len(inside) else q3,
+            'fliers': fliers, 'label': label}
+
+
+def hist_summary(values, bins: int = 50, kde: bool = True, grid: int = 512) -> dict:
+    """Compute the histogram of a column and a binned gaussian KDE scaled to its counts.
+
+    Args:
+        values (array-like): values of the column, NaN are ignored
+        bins (int, optional): number of histogram bins. Defaults to 50.
+        kde (bool, optional): also compute the KDE curve. Defaults to True.
+        grid (int, optional): number of points of the KDE curve. Defaults to 512.
+
+    Returns:
+        dict: counts and edges of the histogram, x and y of the KDE curve
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=bins)
+    summary = {'counts': counts, 'edges': edges, 'x': None, 'y': None}
+    if kde and len(values) > 1 and values.std() > 0:
+        fine, fine_edges = np.histogram(values, bins=grid)
+        step = fine_edges[1] - fine_edges[0]
+        # Scott's rule, the same bandwidth seaborn uses
+        bandwidth = values.std() * len(values) ** (-1 / 5) / step
+        half = int(4 * bandwidth) + 1
+        offsets = np.arange(-half, half + 1)
+        kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+        # np.convolve(mode='same') returns the longer input, which is the kernel for small or
+        # narrow columns: take the part of the full convolution centered on the grid instead
+        density = np.convolve(fine, kernel / kernel.sum())[half:half + grid] / (len(values) * step)
+        summary['x'] = (fine_edges[:-1] + fine_edges[1:]) / 2
+        summary['y'] = density * len(values) * (edges[1] - edges[0])
+    return summary
+
+
+def sample_rows(df: pd.DataFrame, max_points: int = 20_000, seed: int = 0) -> pd.DataFrame:
+    """Return at most max_points rows of the dataframe, drawn uniformly at random."""
+    if len(df) <= max_points:
+        return df
+    return df.sample(max_points, random_state=seed)
+
+
+def figure_name(column: str) -> str:
+    """Return the file name a column is saved under."""
+    return column.replace('/', '_').replace('.', '')
+
+
+def draw_box(ax, stats: dict, title: str) -> None:
+    ax.bxp([stats], showfliers=True, flierprops={'marker': 'd', 'markersize': 4})
+    ax.set_title(title, size=20)
+    ax.tick_params(axis='x', labelrotation=75, labelsize=14)
+
+
+def draw_hist(ax, summary: dict, title: str, color: str = 'orchid') -> None:
+    edges = summary['edges']
+    ax.bar(edges[:-1], summary['counts'], width=np.diff(edges), align='edge', color=color,
+           alpha=0.6, edgecolor='white')
+    if summary['x'] is not None:
+        ax.plot(summary['x'], summary['y'], color=color)
+    ax.set_ylabel('Count')
+    ax.set_title(title, size=14, fontweight='bold')
+
+
+def _init_worker() -> None:
+    plt.switch_backend('Agg')
+
+
+def _render(task: tuple) -> str:
+    """Draw one figure from its precomputed summary and save it, in a worker process."""
+    kind, summary, title, path = task
+    fig, ax = plt.subplots(figsize=(10, 4) if kind == 'box' else (8, 4))
+    if kind == 'box':
+        draw_box(ax, summary, title)
+    else:
+        draw_hist(ax, summary, title)
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
 class Plot:
     def __init__(self) -> None:
         """Initilize class."""
@@ -16,24 +128,69 @@ class Plot:
             self.logger.exception('Failed to Instantiate the Plot Class Object')
             sys.exit(1)
             
-    def plot_box(self, df:pd.DataFrame, x_col, title: str)-> None:
+    def plot_box(self, df:pd.DataFrame, x_col, title: str, output_dir: str = '../assets/outlier_plots',
+                 show: bool = True)-> None:
         """Plot boxplot of the column.
 
+        The box and whisker statistics are computed with NumPy and only a sample of
+        the outliers is drawn.
+
         Args:
             df (pd.DataFrame): Dataframe to be plotted.
             x_col (str): column to be plotted.
             title (str): title of chart.
+            output_dir (str, optional): directory the PNG is saved to, None to not save it.
+                Defaults to '../assets/outlier_plots'.
+            show (bool, optional): show the figure. Defaults to True.
         """
-        plt.figure(figsize=(10, 4))
-        sns.boxplot(data=df, y=x_col)
-        plt.title(title, size=20)
-        plt.xticks(rotation=75, fontsize=14)
-        figname = x_col.replace('/','_').replace('.','')
-        plt.savefig(f'../assets/outlier_plots/{figname}.png')
+        fig, ax = plt.subplots(figsize=(10, 4))
+        draw_box(ax, box_stats(df[x_col], x_col), title)
+        if output_dir is not None:
+            fig.savefig(os.path.join(output_dir, f'{figure_name(x_col)}.png'))
         self.logger.info( f'Plotting a box plot for Column: {x_col}')
-        plt.show()
-        
-        
+        if show:
+            plt.show()
+        else:
+            plt.close(fig)
+
+    def render_batch(self, df: pd.DataFrame, columns: list, output_dir: str = '../assets/outlier_plots',
+                     kind: str = 'box', titles: dict = None, n_jobs: int = None) -> list:
+        """Render one figure per column to PNG files in parallel, without showing them.
+
+        The summaries of every column are computed in this process, so the workers
+        only receive a few kilobytes per figure and draw them with the Agg backend.
+
+        Args:
+            df (pd.DataFrame): Dataframe to be plotted.
+            columns (list): columns to be rendered.
+            output_dir (str, optional): directory of the PNG files. Defaults to
+                '../assets/outlier_plots'.
+            kind (str, optional): 'box' or 'hist'. Defaults to 'box'.
+            titles (dict, optional): title per column. Defaults to the column name.
+            n_jobs (int, optional): worker processes. Defaults to the number of CPUs.
+
+        Returns:
+            list: paths of the written files
+        """
+        if kind not in ('box', 'hist'):
+            raise ValueError(f'Unknown kind {kind}, expected box or hist')
+        os.makedirs(output_dir, exist_ok=True)
+        titles = titles or {}
+        tasks = []
+        for column in columns:
+            summary = box_stats(df[column], column) if kind == 'box' else hist_summary(df[column])
+            title = titles.get(column, column if kind == 'box' else f'Distribution of {column}')
+            tasks.append((kind, summary, title, os.path.join(output_dir, f'{figure_name(column)}.png')))
+
+        n_jobs = min(n_jobs or os.cpu_count() or 1, len(tasks))
+        if n_jobs > 1:
+            with ProcessPoolExecutor(n_jobs, initializer=_init_worker) as pool:
+                paths = list(pool.map(_render, tasks))
+        else:
+            paths = [_render(task) for task in tasks]
+        self.logger.info(f'Rendered {len(paths)} {kind} plots to {output_dir} with {n_jobs} worker(s)')
+        return paths
+
     def barplot(self, df: pd.DataFrame, x_col: str, y_col: str, title: str, xlabel: str, ylabel: str) -> None:
         """Plot bar of the column.
 
@@ -73,19 +230,17 @@ class Plot:
                     vmax=1, fmt='.2f', linewidths=.7, cbar=cbar)
         plt.title(title, size=18, fontweight='bold')
         plt.show()
-    def plot_hist(self, df: pd.DataFrame, column: str) -> None:
+    def plot_hist(self, df: pd.DataFrame, column: str, bins: int = 50) -> None:
         """Plot the hist of the column.
 
         Args:
             df (pd.DataFrame): Dataframe to be plotted.
             column (str): column to be plotted.
-            color (str): color of the histogram.
+            bins (int, optional): number of bins. Defaults to 50.
         """
-
-        # fig, ax = plt.subplots(1, figsize=(12, 7))
-        sns.displot(data=df, x=column, color='orchid',
-                    kde=True, height=4, aspect=2)
-        plt.title(f'Distribution of {column}', size=14, fontweight='bold')
+        fig, ax = plt.subplots(figsize=(8, 4))
+        draw_hist(ax, hist_summary(df[column], bins), f'Distribution of {column}')
+        ax.set_xlabel(column)
         self.logger.info(
             'Plotting a histogram')
         plt.show()
@@ -97,8 +252,9 @@ class Plot:
             df (pd.DataFrame): Dataframe to be plotted.
             column (str): column to be plotted.
         """
+        counts = df[column].value_counts(sort=False).sort_index()
         plt.figure(figsize=(12, 7))
-        sns.countplot(data=df, x=column)
+        sns.barplot(x=counts.index.astype(str), y=counts.to_numpy())
         plt.title(f'Distribution of {column}', size=20, fontweight='bold')
         self.logger.info(
             'Plotting a plot_count')
@@ -112,8 +268,11 @@ class Plot:
             df (pd.DataFrame): Dataframe to be plotted.
             column (str): column to be plotted.
         """
-        plt.figure(figsize=(12, 7))
-        sns.boxplot(data=df, x=x_col, y=y_col)
+        stats = [box_stats(group, str(key)) for key, group in df.groupby(x_col, observed=True)[y_col]]
+        fig, ax = plt.subplots(figsize=(12, 7))
+        ax.bxp(stats, showfliers=True, flierprops={'marker': 'd', 'markersize': 4})
+        ax.set_xlabel(x_col)
+        ax.set_ylabel(y_col)
         plt.title(title, size=20)
         plt.xticks(rotation=75, fontsize=14)
         plt.yticks(fontsize=14)
@@ -121,15 +280,20 @@ class Plot:
             'Plotting a multiple box plot: ')
         plt.show()
 
-    def plot_scatter(self, df: pd.DataFrame, x_col: str, y_col: str, title: str, hue: str, style: str) -> None:
+    def plot_scatter(self, df: pd.DataFrame, x_col: str, y_col: str, title: str, hue: str, style: str,
+                     max_points: int = 20_000) -> None:
         """Plot Scatter chart of the data.
 
         Args:
             df (pd.DataFrame): Dataframe to be plotted.
             column (str): column to be plotted.
+            max_points (int, optional): rows drawn, sampled uniformly from larger
+                dataframes. Defaults to 20_000.
         """
+        columns = [c for c in dict.fromkeys([x_col, y_col, hue, style]) if c is not None]
+        points = sample_rows(df[columns], max_points)
         plt.figure(figsize=(12, 7))
-        sns.scatterplot(data=df, x=x_col, y=y_col, hue=hue, style=style)
+        sns.scatterplot(data=points, x=x_col, y=y_col, hue=hue, style=style)
         plt.title(title, size=20)
         plt.xticks(fontsize=14)
         plt.yticks(fontsize=14)
@@ -154,6 +318,21 @@ class Plot:
         plt.show()
         
     def distplot(self, df:pd.DataFrame, x, title):
-        sns.displot(data=df, x=x, kde=True, height=7, aspect=2)
-        plt.title(f'Distribution of {title}', size=20, fontweight='bold')
+        fig, ax = plt.subplots(figsize=(14, 7))
+        draw_hist(ax, hist_summary(df[x]), f'Distribution of {title}', color='C0')
+        ax.set_xlabel(x)
+        ax.title.set_size(20)
         plt.show()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the box or histogram plot of every numeric column.')
+    parser.add_argument('data', help='csv or parquet dataset, e.g. ../data/cleaned_data2.csv')
+    parser.add_argument('--output', default=os.path.join('..', 'assets', 'outlier_plots'))
+    parser.add_argument('--kind', default='box', choices=['box', 'hist'])
+    parser.add_argument('--jobs', type=int, default=None)
+    args = parser.parse_args()
+    data = pd.read_parquet(args.data) if args.data.endswith('.parquet') else pd.read_csv(args.data)
+    numeric = data.select_dtypes(include=np.number).columns.tolist()
+    for path in Plot().render_batch(data, numeric, args.output, args.kind, n_jobs=args.jobs):
+        print(path)
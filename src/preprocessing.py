@@ -5,9 +5,17 @@ import pandas as pd
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join('./')))
+from backend import PolarsPreProcess, dispatch
+from dedup import Deduplicator
 from logger import Logger
+from parallel import ColumnExecutor, log_transform
+from profiler import instrument
+from schema import XDR_SCHEMA, DtypeOptimizer
+from sketch import QuantileSketch, sketch_columns, sketch_quantiles
 
 
+@instrument
+@dispatch(PolarsPreProcess)
 class PreProcess:
     def __init__(self):
         """Initialize the PreProcess class.
@@ -17,6 +25,7 @@ class PreProcess:
         """
         try:
             self.logger = Logger("preprocessing.log").get_app_logger()
+            self.memory_report = None
             self.logger.info('Successfully Instantiated PreProcess Class Object')
         except Exception:
             self.logger.exception('Failed to Instantiate Preprocessing Class Object')
@@ -42,7 +51,7 @@ class PreProcess:
 
         Args:
             df (pd.DataFrame): dataframe to be preprocessed
-            column (str): Column to be converted to float datatype
+            column (str | list): Column or list of columns to be converted to float datatype
         """
         try:
             df[column] = df[column].astype(float)
@@ -134,30 +143,43 @@ class PreProcess:
         
         return missing_value_df
 
-    def fill_nulls_with_method(self, df, method):
+    def fill_nulls_with_method(self, df, method, values: pd.Series = None, approximate: bool = False):
         """Fill numerical variables.
 
         Args:
             df (pd.DataFrame): dataframe to be preprocessed
+            values (pd.Series, optional): precomputed fill value per column, e.g. the
+                global medians or modes of a chunked dataset. Defaults to computing
+                them from df.
+            approximate (bool, optional): compute the medians with a QuantileSketch
+                instead of sorting every column. Defaults to False.
         """
         try:
             if method == 'mean' or method == 'median':
-                if method == "mean":
-                    num_cols = df.select_dtypes(include=np.number).columns
-                    df.loc[:, num_cols] = df.loc[:, num_cols].fillna(
-                        df.loc[:, num_cols].mean())
-                else:
-                    num_cols = df.select_dtypes(include=np.number).columns
-                    df.loc[:, num_cols] = df.loc[:, num_cols].fillna(
-                        df.loc[:, num_cols].median())
+                num_cols = df.select_dtypes(include=np.number).columns
+                if values is None:
+                    if method == "mean":
+                        values = df.loc[:, num_cols].mean()
+                    elif approximate:
+                        values = sketch_quantiles(sketch_columns(df, num_cols), 0.5)
+                    else:
+                        values = df.loc[:, num_cols].median()
+                df.loc[:, num_cols] = df.loc[:, num_cols].fillna(values)
                     
             elif method == 'mode':
                 cat_cols = df.select_dtypes(exclude=np.number).columns
-                df.loc[:, cat_cols] = df.loc[:, cat_cols].fillna(
-                        df.loc[:, cat_cols].mode().iloc[0])
+                if values is None:
+                    values = df.loc[:, cat_cols].mode().iloc[0]
+                df.loc[:, cat_cols] = df.loc[:, cat_cols].fillna(values)
                     
             else:
-                df.fillna(method=method, inplace=True)
+                # fillna(method=...) no longer exists in pandas 3
+                if method in ('ffill', 'pad'):
+                    df.ffill(inplace=True)
+                elif method in ('bfill', 'backfill'):
+                    df.bfill(inplace=True)
+                else:
+                    df.fillna(method=method, inplace=True)
                 
             self.logger.info(f'The DataFrame was imputated successfully with method {method}.')
         except Exception:
@@ -166,24 +188,68 @@ class PreProcess:
             
         return df
     
+    def drop_duplicates(self, df: pd.DataFrame, columns: list = None) -> pd.DataFrame:
+        """Drop the rows repeating an earlier row, comparing row hashes.
+
+        Args:
+            df (pd.DataFrame): dataframe to be preprocessed
+            columns (list, optional): key columns of a duplicate, e.g. ['bearer_id', 'start'].
+                Defaults to every column.
+
+        Returns:
+            pd.DataFrame: the dataframe without its duplicates
+        """
+        deduplicator = Deduplicator(columns)
+        df = deduplicator.drop(df)
+        self.logger.info(f'Dropped {deduplicator.duplicates} duplicated rows')
+        return df
+
     def num_outliers(self,col):
         thres = 3
-        mean = np.mean(col)
-        std = np.std(col)
-        # print(mean, std)
-        n = 0
-        for i in col:
-            z_score = (i-mean)/std
-            if (np.abs(z_score) > thres):
-                n +=1
-        return n
+        values = np.asarray(col, dtype=np.float64)
+        z_score = np.abs(values - np.nanmean(values)) / np.nanstd(values)
+        return int((z_score > thres).sum())
     
-    def fix_outlier(self, df:pd.DataFrame, column:float):
-        df[column] = np.where(df[column] > df[column].quantile(0.95), df[column].median(),df[column])
+    def fix_outlier(self, df:pd.DataFrame, column:float, approximate: bool = False):
+        if approximate:
+            upper, median = QuantileSketch().update(df[column].to_numpy()).quantile([0.95, 0.5])
+        else:
+            upper, median = df[column].quantile(0.95), df[column].median()
+        df[column] = np.where(df[column] > upper, median, df[column])
 
         return df[column]
     
-    def logscale(self, df: pd.DataFrame, cols):
+    def optimize_dtypes(self, df: pd.DataFrame, schema: dict = XDR_SCHEMA, lossy: bool = False) -> pd.DataFrame:
+        """Convert every column to the smallest dtype of its declared kind in one pass.
+
+        Args:
+            df (pd.DataFrame): raw or cleaned xDR dataframe
+            schema (dict, optional): column name to kind. Defaults to XDR_SCHEMA.
+            lossy (bool, optional): round the wide counters to float32, see
+                DtypeOptimizer. Defaults to False.
+
+        Returns:
+            pd.DataFrame: the dataframe with identifiers as integers, downcast counters,
+                categorical strings and parsed timestamps
+        """
+        optimizer = DtypeOptimizer(schema, lossy=lossy)
+        df = optimizer.optimize(df)
+        self.memory_report = optimizer.report
+        return df
+
+    def logscale(self, df: pd.DataFrame, cols, n_jobs: int = None):
+        """Log transform the columns.
+
+        Args:
+            df (pd.DataFrame): dataframe to be preprocessed
+            cols (list): columns to be transformed
+            n_jobs (int, optional): transform the columns in this many processes over
+                shared memory, see parallel.ColumnExecutor. Defaults to one column at a time.
+        """
+        if n_jobs is not None:
+            with ColumnExecutor(n_jobs) as executor:
+                executor.apply(df, cols, log_transform)
+            return df
         for col in cols:
             df[col] = np.log(df[col])
         return df
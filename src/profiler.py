@@ -0,0 +1,198 @@
+"""Opt-in profiling of the analysis classes.
+
+Classes decorated with ``instrument`` have every public method wrapped. While
+the profiler is disabled, which is the default, the wrapper only checks one
+flag and calls the method. It is enabled by setting the environment variable
+``TELECOM_PROFILE=1`` before the first import, or with ``profiler.enable()``.
+Each call is then recorded with its wall and CPU time, the shape of the
+input and output frames and the peak memory allocated during the call
+(tracemalloc). At exit, or on ``profiler.write_report()``, the records are
+written as a JSON file and a text table sorted by total wall time.
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+PROFILE_ENV = 'TELECOM_PROFILE'
+PROFILE_DIR_ENV = 'TELECOM_PROFILE_DIR'
+
+
+def _shape(value) -> tuple:
+    """Return the (rows, columns) of a frame, series or array, (None, None) otherwise."""
+    shape = getattr(value, 'shape', None)
+    if not isinstance(shape, tuple) or not shape:
+        return None, None
+    return int(shape[0]), int(shape[1]) if len(shape) > 1 else 1
+
+
+class Profiler:
+    def __init__(self):
+        """Initialize a disabled profiler."""
+        self.enabled = False
+        self.trace_memory = False
+        self.records = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_tracing = False
+
+    def enable(self, trace_memory: bool = True) -> None:
+        """Start recording the calls of the instrumented methods.
+
+        Args:
+            trace_memory (bool, optional): measure the peak allocated memory of every
+                call with tracemalloc, which slows allocations down. Defaults to True.
+        """
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stop recording, the records collected so far are kept."""
+        self.enabled = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def reset(self) -> None:
+        """Forget the records collected so far."""
+        with self._lock:
+            self.records = []
+
+    def call(self, func, name: str, args: tuple, kwargs: dict):
+        """Run one call of an instrumented method and record it.
+
+        Args:
+            func: the method
+            name (str): qualified name of the method
+            args (tuple): positional arguments, self included
+            kwargs (dict): keyword arguments
+
+        Returns:
+            the result of the call
+        """
+        stack = self._local.__dict__.setdefault('stack', [])
+        rows_in, cols_in = next((s for s in map(_shape, list(args[1:]) + list(kwargs.values()))
+                                 if s[0] is not None), (None, None))
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        frame = {'peak': 0, 'start': 0}
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # keep the peak reached so far by the caller before resetting it for this call
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['start'] = current
+        stack.append(frame)
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            stack.pop()
+            peak = None
+            if tracing:
+                frame['peak'] = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                peak = frame['peak'] - frame['start']
+                if stack:
+                    stack[-1]['peak'] = max(stack[-1]['peak'], frame['peak'])
+                tracemalloc.reset_peak()
+        rows_out, cols_out = _shape(result)
+        with self._lock:
+            self.records.append({
+                'method': name, 'wall_seconds': wall, 'cpu_seconds': cpu,
+                'rows_in': rows_in, 'cols_in': cols_in, 'rows_out': rows_out, 'cols_out': cols_out,
+                'peak_bytes': peak, 'depth': len(stack)})
+        return result
+
+    def summary(self) -> pd.DataFrame:
+        """Return the records aggregated per method, sorted by total wall time.
+
+        Returns:
+            pd.DataFrame: calls, total and max wall time, total CPU time, max peak
+                memory and the largest input and output shapes per method
+        """
+        columns = ['calls', 'wall_seconds', 'max_wall_seconds', 'cpu_seconds', 'peak_mib',
+                   'rows_in', 'cols_in', 'rows_out', 'cols_out']
+        if not self.records:
+            return pd.DataFrame(columns=columns).rename_axis('method')
+        df = pd.DataFrame(self.records)
+        summary = df.groupby('method').agg(
+            calls=('wall_seconds', 'size'),
+            wall_seconds=('wall_seconds', 'sum'),
+            max_wall_seconds=('wall_seconds', 'max'),
+            cpu_seconds=('cpu_seconds', 'sum'),
+            peak_mib=('peak_bytes', 'max'),
+            rows_in=('rows_in', 'max'),
+            cols_in=('cols_in', 'max'),
+            rows_out=('rows_out', 'max'),
+            cols_out=('cols_out', 'max'))
+        summary['peak_mib'] = summary['peak_mib'] / (1 << 20)
+        summary[['rows_in', 'cols_in', 'rows_out', 'cols_out']] = \
+            summary[['rows_in', 'cols_in', 'rows_out', 'cols_out']].astype('Int64')
+        return summary[columns].sort_values('wall_seconds', ascending=False)
+
+    def write_report(self, directory: str = None) -> tuple:
+        """Write the records as JSON and the summary as a text table.
+
+        Args:
+            directory (str, optional): report directory. Defaults to $TELECOM_PROFILE_DIR
+                or '../reports'.
+
+        Returns:
+            tuple: paths of the JSON and text reports
+        """
+        directory = directory or os.environ.get(PROFILE_DIR_ENV, '../reports')
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, f'profile_{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}')
+        summary = self.summary()
+        with open(f'{stem}.json', 'w') as f:
+            json.dump({'summary': json.loads(summary.reset_index().to_json(orient='records')),
+                       'calls': self.records}, f, indent=2)
+        with open(f'{stem}.txt', 'w') as f:
+            f.write(summary.to_string(float_format=lambda x: f'{x:.4f}') + '\n')
+        return f'{stem}.json', f'{stem}.txt'
+
+    def _write_at_exit(self) -> None:
+        if self.records:
+            self.write_report()
+
+
+profiler = Profiler()
+if os.environ.get(PROFILE_ENV, '').lower() in ('1', 'true', 'yes'):
+    profiler.enable()
+atexit.register(profiler._write_at_exit)
+
+
+def instrument(cls):
+    """Class decorator wrapping every public method of the class with the profiler.
+
+    Args:
+        cls: the class to instrument
+
+    Returns:
+        the same class
+    """
+    for attr, func in list(vars(cls).items()):
+        if attr.startswith('_') or not callable(func) or isinstance(func, (staticmethod, classmethod, type)):
+            continue
+
+        def wrap(func, name):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not profiler.enabled:
+                    return func(*args, **kwargs)
+                return profiler.call(func, name, args, kwargs)
+            return wrapper
+
+        setattr(cls, attr, wrap(func, f'{cls.__name__}.{attr}'))
+    return cls
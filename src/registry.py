@@ -0,0 +1,68 @@
+"""Process-wide cache of the pickled models.
+
+Every Streamlit session runs in the same process and imports this module
+once, so the models held by ``registry`` are unpickled once and shared by
+all sessions. A model is reloaded only when its file changes: the mtime and
+size are checked on every access and, when they moved, the sha256 of the
+file decides whether the content really changed.
+"""
+import hashlib
+import os
+import pickle
+import threading
+
+from logger import Logger
+
+logger = Logger("registry.log").get_app_logger()
+
+
+class ModelRegistry:
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _digest(self, path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def get(self, path: str):
+        """Return the model stored at path, loading it on first use or after a change.
+
+        Args:
+            path (str): path of the pickled model
+
+        Returns:
+            the unpickled model
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entries.get(path)
+        if entry is not None and entry['signature'] == signature:
+            return entry['model']
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry['signature'] == signature:
+                return entry['model']
+            digest = self._digest(path)
+            if entry is not None and entry['digest'] == digest:
+                entry['signature'] = signature
+                return entry['model']
+            with open(path, 'rb') as f:
+                model = pickle.load(f)
+            self._entries[path] = {'signature': signature, 'digest': digest, 'model': model}
+            logger.info(f'Loaded model {path} ({digest[:12]})')
+            return model
+
+    def clear(self) -> None:
+        """Forget every cached model."""
+        with self._lock:
+            self._entries.clear()
+
+
+registry = ModelRegistry()
@@ -0,0 +1,232 @@
+"""Declared schema of the xDR extract and the dtype optimization stage.
+
+Every column of the extract is loaded as float64 or object. DtypeOptimizer
+converts a frame once, column by column, from the declared kind of each
+column:
+
+- ``id``: MSISDN, IMSI, IMEI and bearer id become integers, so a subscriber
+  can be looked up with an exact integer key. Ids with nulls stay float64,
+  a nullable 64-bit integer (value plus mask) being larger
+- ``counter``: byte, millisecond, second and kbps counters are downcast to the
+  smallest signed integer type holding their range, nullable when they have
+  nulls, or to float32 when that is lossless. Signed types keep differences
+  such as UL - DL from wrapping around. With ``lossy=True`` every counter
+  that would still take more than 4 bytes a value, e.g. the non-integral
+  averages, is rounded to float32 (about 7 significant digits)
+- ``percent``: the throughput buckets become (nullable) int16
+- ``category``: handset, manufacturer and location strings become categories
+- ``datetime``: Start and End are parsed once with the extract's format
+
+Raw ('MSISDN/Number') and cleaned ('msisdn/number') column names are both
+recognized, columns outside the schema are left untouched.
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+from logger import Logger
+
+DATETIME_FORMAT = '%m/%d/%Y %H:%M'
+
+APPS = ['Social Media', 'Google', 'Email', 'Youtube', 'Netflix', 'Gaming', 'Other']
+
+XDR_SCHEMA = {
+    'Bearer Id': 'id',
+    'Start': 'datetime',
+    'Start ms': 'counter',
+    'End': 'datetime',
+    'End ms': 'counter',
+    'Dur. (ms)': 'counter',
+    'IMSI': 'id',
+    'MSISDN/Number': 'id',
+    'IMEI': 'id',
+    'Last Location Name': 'category',
+    'Avg RTT DL (ms)': 'counter',
+    'Avg RTT UL (ms)': 'counter',
+    'Avg Bearer TP DL (kbps)': 'counter',
+    'Avg Bearer TP UL (kbps)': 'counter',
+    'TCP DL Retrans. Vol (Bytes)': 'counter',
+    'TCP UL Retrans. Vol (Bytes)': 'counter',
+    'DL TP < 50 Kbps (%)': 'percent',
+    '50 Kbps < DL TP < 250 Kbps (%)': 'percent',
+    '250 Kbps < DL TP < 1 Mbps (%)': 'percent',
+    'DL TP > 1 Mbps (%)': 'percent',
+    'UL TP < 10 Kbps (%)': 'percent',
+    '10 Kbps < UL TP < 50 Kbps (%)': 'percent',
+    '50 Kbps < UL TP < 300 Kbps (%)': 'percent',
+    'UL TP > 300 Kbps (%)': 'percent',
+    'HTTP DL (Bytes)': 'counter',
+    'HTTP UL (Bytes)': 'counter',
+    'Activity Duration DL (ms)': 'counter',
+    'Activity Duration UL (ms)': 'counter',
+    'Dur. (ms).1': 'counter',
+    'Handset Manufacturer': 'category',
+    'Handset Type': 'category',
+    'Nb of sec with 125000B < Vol DL': 'counter',
+    'Nb of sec with 1250B < Vol UL < 6250B': 'counter',
+    'Nb of sec with 31250B < Vol DL < 125000B': 'counter',
+    'Nb of sec with 37500B < Vol UL': 'counter',
+    'Nb of sec with 6250B < Vol DL < 31250B': 'counter',
+    'Nb of sec with 6250B < Vol UL < 37500B': 'counter',
+    'Nb of sec with Vol DL < 6250B': 'counter',
+    'Nb of sec with Vol UL < 1250B': 'counter',
+    **{f'{app} {way} (Bytes)': 'counter' for app in APPS for way in ('DL', 'UL')},
+    'Total UL (Bytes)': 'counter',
+    'Total DL (Bytes)': 'counter',
+    # columns derived in the notebooks
+    'total_data': 'counter',
+    **{app.lower().replace(' ', '_'): 'counter' for app in APPS},
+}
+
+KINDS = ('id', 'counter', 'percent', 'category', 'datetime')
+
+UNSIGNED = [(np.uint8, 'UInt8'), (np.uint16, 'UInt16'), (np.uint32, 'UInt32'), (np.uint64, 'UInt64')]
+SIGNED = [(np.int8, 'Int8'), (np.int16, 'Int16'), (np.int32, 'Int32'), (np.int64, 'Int64')]
+
+
+def clean_name(column: str) -> str:
+    """Return the column name as PreProcess.clean_feature_name writes it."""
+    return column.replace(' ', '_').lower()
+
+
+def _bytes_per_value(s: pd.Series) -> int:
+    """Return the bytes a value of a numeric column takes, mask included."""
+    return s.dtype.itemsize + (1 if pd.api.types.is_extension_array_dtype(s) else 0)
+
+
+def column_kind(column: str, schema: dict = XDR_SCHEMA) -> str:
+    """Return the declared kind of a raw or cleaned column name, None if undeclared."""
+    kinds = {clean_name(name): kind for name, kind in schema.items()}
+    return kinds.get(clean_name(column))
+
+
+class DtypeOptimizer:
+    def __init__(self, schema: dict = XDR_SCHEMA, datetime_format: str = DATETIME_FORMAT,
+                 headroom: float = 2.0, lossy: bool = False):
+        """Initialize the DtypeOptimizer class.
+
+        Args:
+            schema (dict, optional): column name to kind, one of KINDS. Defaults to XDR_SCHEMA.
+            datetime_format (str, optional): format of the datetime columns, other strings
+                are parsed by inference. Defaults to '%m/%d/%Y %H:%M'.
+            headroom (float, optional): factor the range of an integer column must still fit
+                in, so that adding two columns (DL + UL) cannot overflow. Defaults to 2.0.
+            lossy (bool, optional): round the counters that no exact type stores in 4 bytes
+                or less to float32. Defaults to False.
+        """
+        try:
+            self.logger = Logger("preprocessing.log").get_app_logger()
+            unknown = set(schema.values()) - set(KINDS)
+            if unknown:
+                raise ValueError(f'Unknown column kinds {unknown}, expected one of {KINDS}')
+            self.kinds = {clean_name(name): kind for name, kind in schema.items()}
+            self.datetime_format = datetime_format
+            self.headroom = headroom
+            self.lossy = lossy
+            self.report = None
+            self.logger.info('Successfully Instantiated DtypeOptimizer Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate DtypeOptimizer Class Object')
+            sys.exit(1)
+
+    def _integer(self, s: pd.Series, values: np.ndarray, finite: np.ndarray, headroom: float,
+                 unsigned: bool) -> pd.Series:
+        """Cast integral values to the smallest integer type holding their range."""
+        types = UNSIGNED if unsigned and finite.min() >= 0 else SIGNED
+        low, high = finite.min() * headroom, finite.max() * headroom
+        for numpy_type, nullable_type in types:
+            info = np.iinfo(numpy_type)
+            if info.min <= low and high <= info.max:
+                if len(finite) < len(values):
+                    # a nullable 64-bit integer takes more memory than float64
+                    if info.bits == 64:
+                        return s
+                    return s.astype(nullable_type)
+                return pd.Series(values.astype(numpy_type), index=s.index, name=s.name)
+        return s
+
+    def _number(self, s: pd.Series, headroom: float, unsigned: bool = False) -> pd.Series:
+        if not pd.api.types.is_numeric_dtype(s) or pd.api.types.is_extension_array_dtype(s):
+            return s
+        values = s.to_numpy(dtype=np.float64)
+        finite = values[~np.isnan(values)]
+        if len(finite) == 0:
+            return s.astype(np.float32)
+        if np.isinf(finite).any():
+            return s
+        if np.array_equal(finite, np.trunc(finite)):
+            return self._integer(s, values, finite, headroom, unsigned)
+        if np.array_equal(finite.astype(np.float32), finite):
+            return s.astype(np.float32)
+        return s
+
+    def _datetime(self, s: pd.Series) -> pd.Series:
+        if pd.api.types.is_datetime64_any_dtype(s):
+            return s
+        parsed = pd.to_datetime(s, format=self.datetime_format, errors='coerce')
+        if parsed.isna().sum() > s.isna().sum():
+            parsed = pd.to_datetime(s, errors='coerce')
+        return parsed
+
+    def _category(self, s: pd.Series) -> pd.Series:
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            return s
+        return s.astype('category')
+
+    def convert(self, s: pd.Series, kind: str) -> pd.Series:
+        """Convert one column according to its kind.
+
+        Args:
+            s (pd.Series): the column
+            kind (str): one of KINDS
+
+        Returns:
+            pd.Series: the converted column
+        """
+        if kind == 'datetime':
+            return self._datetime(s)
+        if kind == 'category':
+            return self._category(s)
+        # identifiers are never added up or subtracted, so they need no headroom and
+        # may be unsigned (the bearer ids only fit in uint64)
+        if kind == 'id':
+            return self._number(s, 1.0, unsigned=True)
+        converted = self._number(s, self.headroom)
+        if self.lossy and kind == 'counter' and pd.api.types.is_numeric_dtype(converted) \
+                and _bytes_per_value(converted) > 4:
+            return s.astype(np.float32)
+        return converted
+
+    def optimize(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Convert every declared column of the dataframe and record the memory saved.
+
+        Args:
+            df (pd.DataFrame): raw or cleaned xDR dataframe
+
+        Returns:
+            pd.DataFrame: a new dataframe with optimized dtypes. The per-column memory
+                before and after is kept in ``report``.
+        """
+        before = df.memory_usage(deep=True, index=False)
+        columns = {}
+        for column in df.columns:
+            kind = self.kinds.get(clean_name(column))
+            columns[column] = self.convert(df[column], kind) if kind else df[column]
+        optimized = pd.DataFrame(columns, index=df.index)
+
+        after = optimized.memory_usage(deep=True, index=False)
+        self.report = pd.DataFrame({'dtype_before': df.dtypes.astype(str),
+                                    'dtype_after': optimized.dtypes.astype(str),
+                                    'bytes_before': before, 'bytes_after': after})
+        self.logger.info(f'Optimized dtypes: {before.sum() / 2**20:.1f} MiB -> {after.sum() / 2**20:.1f} MiB '
+                         f'({before.sum() / max(after.sum(), 1):.1f}x smaller)')
+        return optimized
+
+    def memory_summary(self) -> dict:
+        """Return the total memory before and after the last optimize call.
+
+        Returns:
+            dict: bytes before, bytes after and the reduction ratio
+        """
+        before, after = int(self.report['bytes_before'].sum()), int(self.report['bytes_after'].sum())
+        return {'bytes_before': before, 'bytes_after': after, 'ratio': before / max(after, 1)}
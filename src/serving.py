@@ -0,0 +1,253 @@
+"""Micro-batching HTTP service scoring subscribers.
+
+A small asyncio HTTP/1.1 server (standard library only, keep-alive
+connections) in front of the satisfaction model and the ScoringPipeline:
+
+    POST /predict  {"engagement_score": 2.1, "experience_score": 0.4}
+                   -> {"satisfaction_score": ...}
+    POST /score    {"sessions": 3, "dur._(ms)": ..., "total_data": ..., "avg_rtt_total": ...,
+                    "avg_tp_total": ..., "total_avg_tcp_total": ...}
+                   -> {"engagement_score": ..., "experience_score": ..., "satisfaction_score": ...}
+    GET  /health   -> request and batch counters
+
+Every endpoint puts its requests on the queue of a MicroBatcher. The batcher
+takes the first request waiting, gives the others up to ``max_wait_ms`` to
+arrive (less when ``max_batch`` requests are already queued) and scores the
+whole batch with one vectorized call on a scoring thread, so concurrent
+requests share a single ``predict`` while the event loop keeps reading the
+next ones. ``--max-batch 1`` scores every request on its own. A request
+with a missing or non-finite number is answered 400 before it is queued,
+and a batch that fails is scored again row by row, so only the rows that
+fail get a 500.
+
+    python src/serving.py --port 8000 --max-batch 256 --max-wait-ms 2
+    curl -d '{"engagement_score": 2.1, "experience_score": 0.4}' localhost:8000/predict
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from logger import Logger
+from pipeline.predict_pipeline import ScoringPipeline
+from pipeline.train_pipeline import ENGAGEMENT_FEATURES, EXPERIENCE_FEATURES
+
+SCORE_COLUMNS = ['engagement_score', 'experience_score']
+FEATURE_COLUMNS = ENGAGEMENT_FEATURES + EXPERIENCE_FEATURES
+MAX_BODY = 64 * 1024
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class MicroBatcher:
+    """Coalesce concurrent requests into batches scored by one call."""
+
+    def __init__(self, score, max_batch: int = 256, max_wait_ms: float = 2.0,
+                 executor: ThreadPoolExecutor = None):
+        """Initialize an idle batcher, start it with run.
+
+        Args:
+            score (callable): takes a list of rows and returns the list of their results
+            max_batch (int, optional): most requests scored together. Defaults to 256.
+            max_wait_ms (float, optional): longest time the first request of a batch waits
+                for others, in milliseconds. Defaults to 2.0.
+            executor (ThreadPoolExecutor, optional): thread the batches are scored on.
+                Defaults to scoring on the event loop.
+        """
+        self.score = score
+        self.max_batch = max(int(max_batch), 1)
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self.queue = asyncio.Queue()
+        self._full = asyncio.Event()
+        self.stats = {'requests': 0, 'batches': 0, 'largest_batch': 0, 'errors': 0}
+
+    async def submit(self, row):
+        """Queue one row and return its result once its batch is scored."""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((row, future))
+        if self.queue.qsize() >= self.max_batch:
+            self._full.set()
+        return await future
+
+    async def _next_batch(self) -> list:
+        batch = [await self.queue.get()]
+        if self.max_wait > 0 and self.queue.qsize() < self.max_batch - 1:
+            self._full.clear()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+        while len(batch) < self.max_batch and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _score(self, rows: list) -> list:
+        if self.executor is None:
+            return self.score(rows)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.score, rows)
+
+    async def run(self) -> None:
+        """Score batches until cancelled."""
+        while True:
+            batch = await self._next_batch()
+            try:
+                results = await self._score([row for row, _ in batch])
+            except Exception:
+                # score the rows one by one so that only the failing ones get the error
+                results = []
+                for row, _ in batch:
+                    try:
+                        results.extend(await self._score([row]))
+                    except Exception as error:
+                        self.stats['errors'] += 1
+                        results.append(error)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+
+
+class ScoringService:
+    def __init__(self, model_dir: str = '../models', max_batch: int = 256, max_wait_ms: float = 2.0):
+        """Initialize the ScoringService class and load the models.
+
+        Args:
+            model_dir (str, optional): directory of the pickled models. Defaults to '../models'.
+            max_batch (int, optional): most requests scored together. Defaults to 256.
+            max_wait_ms (float, optional): longest wait of a request for its batch to fill,
+                in milliseconds. Defaults to 2.0.
+        """
+        try:
+            self.logger = Logger("serving.log").get_app_logger()
+            self.pipeline = ScoringPipeline(model_dir)
+            self.executor = ThreadPoolExecutor(1, thread_name_prefix='scoring')
+            self.batchers = {
+                '/predict': (SCORE_COLUMNS, MicroBatcher(self.predict, max_batch, max_wait_ms, self.executor)),
+                '/score': (FEATURE_COLUMNS, MicroBatcher(self.score, max_batch, max_wait_ms, self.executor)),
+            }
+            self.started = time.time()
+            self.logger.info('Successfully Instantiated ScoringService Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate ScoringService Class Object')
+            sys.exit(1)
+
+    def predict(self, rows: list) -> list:
+        """Return the satisfaction score of every (engagement, experience) row."""
+        X = pd.DataFrame(rows, columns=SCORE_COLUMNS, dtype=np.float64)
+        satisfaction = np.asarray(self.pipeline.satisfaction_model.predict(X))
+        return [{'satisfaction_score': score} for score in satisfaction.reshape(len(rows), -1)[:, 0].tolist()]
+
+    def score(self, rows: list) -> list:
+        """Return the engagement, experience and satisfaction score of every feature row."""
+        scores = self.pipeline.score_chunk(pd.DataFrame(rows, columns=FEATURE_COLUMNS, dtype=np.float64))
+        return scores.to_dict('records')
+
+    def health(self) -> dict:
+        """Return the uptime and the counters of every endpoint."""
+        endpoints = {}
+        for path, (_, batcher) in self.batchers.items():
+            stats = dict(batcher.stats)
+            stats['mean_batch'] = stats['requests'] / stats['batches'] if stats['batches'] else 0.0
+            stats['queued'] = batcher.queue.qsize()
+            endpoints[path] = stats
+        return {'status': 'ok', 'uptime_seconds': time.time() - self.started, 'endpoints': endpoints}
+
+    async def route(self, method: str, path: str, body: bytes) -> tuple:
+        """Return the status and the JSON payload of a request."""
+        if path == '/health':
+            return (200, self.health()) if method == 'GET' else (405, {'error': 'use GET'})
+        if path not in self.batchers:
+            return 404, {'error': f'unknown path {path}'}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+        columns, batcher = self.batchers[path]
+        try:
+            request = json.loads(body)
+            row = [float(request[column]) for column in columns]
+            if not all(math.isfinite(value) for value in row):
+                raise ValueError('non-finite value')
+        except (ValueError, TypeError, KeyError):
+            return 400, {'error': f'expected a JSON object with the finite numbers {columns}'}
+        try:
+            return 200, await batcher.submit(row)
+        except Exception:
+            self.logger.exception(f'Failed to score a batch of {path}')
+            return 500, {'error': 'scoring failed'}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve the requests of one keep-alive connection in order."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                keep_alive = True
+                try:
+                    lines = head.decode('latin-1').split('\r\n')
+                    method, path, version = lines[0].split(' ', 2)
+                    headers = {name.strip().lower(): value.strip()
+                               for name, _, value in (line.partition(':') for line in lines[1:] if line)}
+                    length = int(headers.get('content-length', 0))
+                    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                except ValueError:
+                    status, payload, keep_alive = 400, {'error': 'malformed request'}, False
+                else:
+                    if length > MAX_BODY:
+                        status, payload, keep_alive = 413, {'error': f'body over {MAX_BODY} bytes'}, False
+                    else:
+                        body = await reader.readexactly(length) if length else b''
+                        status, payload = await self.route(method, path.split('?', 1)[0], body)
+                data = json.dumps(payload).encode()
+                writer.write(f'HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n'
+                             f'Content-Length: {len(data)}\r\n'
+                             f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8000) -> None:
+        """Serve until cancelled."""
+        tasks = [asyncio.create_task(batcher.run()) for _, batcher in self.batchers.values()]
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        address = server.sockets[0].getsockname()
+        self.logger.info(f'Serving on http://{address[0]}:{address[1]}')
+        print(f'Serving on http://{address[0]}:{address[1]}', flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.executor.shutdown(wait=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the satisfaction scores over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000, help='0 picks a free port')
+    parser.add_argument('--model-dir', default=os.path.join('..', 'models'))
+    parser.add_argument('--max-batch', type=int, default=256)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(ScoringService(args.model_dir, args.max_batch, args.max_wait_ms).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,194 @@
+"""Columnar storage for the intermediate datasets of the pipeline.
+
+The stages hand their data to each other through files in ``data/``
+(``cleaned_data``, ``outlier_data``, ``user_eng``, ``user_exp``,
+``cleaned_data2``). DataStore writes them as zstd-compressed Parquet files,
+keeps the column types, and reads back only the requested columns and the
+row groups that can match a filter.
+
+Convert the existing csv files with:
+
+    python src/storage.py ../data/cleaned_data.csv ../data/outlier_data.csv
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from logger import Logger
+
+ENGAGEMENT_COLUMNS = ['msisdn/number', 'bearer_id', 'dur._(ms)', 'total_data']
+EXPERIENCE_COLUMNS = ['msisdn/number', 'avg_rtt_dl_(ms)', 'avg_rtt_ul_(ms)',
+                      'avg_bearer_tp_dl_(kbps)', 'avg_bearer_tp_ul_(kbps)',
+                      'tcp_dl_retrans._vol_(bytes)', 'tcp_ul_retrans._vol_(bytes)',
+                      'handset_type']
+
+
+def csv_convert_options(csv_path: str, read_options: pacsv.ReadOptions) -> pacsv.ConvertOptions:
+    """Return csv conversion options safe for every block of the file.
+
+    Column types are inferred from the first block. Columns that are empty in
+    that block are read as strings and integer columns as float64, so that a
+    later block with nulls or decimals does not break the conversion.
+    """
+    with pacsv.open_csv(csv_path, read_options=read_options) as reader:
+        inferred = reader.schema
+    column_types = {}
+    for field in inferred:
+        if pa.types.is_null(field.type):
+            column_types[field.name] = pa.string()
+        elif pa.types.is_integer(field.type):
+            column_types[field.name] = pa.float64()
+    return pacsv.ConvertOptions(column_types=column_types)
+
+
+class DataStore:
+    def __init__(self, root: str = '../data', compression: str = 'zstd', row_group_size: int = 100_000):
+        """Initialize the DataStore class.
+
+        Args:
+            root (str, optional): directory holding the datasets. Defaults to '../data'.
+            compression (str, optional): parquet compression codec. Defaults to 'zstd'.
+            row_group_size (int, optional): rows per row group, the unit skipped by filters.
+                Defaults to 100_000.
+        """
+        try:
+            self.logger = Logger("storage.log").get_app_logger()
+            self.root = root
+            self.compression = compression
+            self.row_group_size = row_group_size
+            self.logger.info('Successfully Instantiated DataStore Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate DataStore Class Object')
+            sys.exit(1)
+
+    def path(self, name: str) -> str:
+        """Return the parquet path of a dataset.
+
+        Args:
+            name (str): dataset name, e.g. 'cleaned_data'
+
+        Returns:
+            str: path of the parquet file
+        """
+        return os.path.join(self.root, f'{name}.parquet')
+
+    def part_path(self, name: str, part: int) -> str:
+        """Return the path of one part of a dataset written as a directory of files.
+
+        Args:
+            name (str): dataset name
+            part (int): part number
+
+        Returns:
+            str: path of the part file inside the dataset directory
+        """
+        return os.path.join(self.path(name), f'part-{part:05d}.parquet')
+
+    def exists(self, name: str) -> bool:
+        """Return True if the dataset has been written to the store."""
+        return os.path.exists(self.path(name))
+
+    def write(self, df: pd.DataFrame, name: str, index: bool = False) -> str:
+        """Write a dataframe as a parquet dataset.
+
+        Args:
+            df (pd.DataFrame): dataframe to be written
+            name (str): dataset name
+            index (bool, optional): store the dataframe index, e.g. the msisdn index of
+                the per-user tables. Defaults to False.
+
+        Returns:
+            str: path of the written file
+        """
+        path = self.path(name)
+        table = pa.Table.from_pandas(df, preserve_index=index)
+        pq.write_table(table, path, compression=self.compression, row_group_size=self.row_group_size)
+        self.logger.info(f'Wrote {len(df)} rows to {path}')
+        return path
+
+    def read(self, name: str, columns: list = None, filters=None) -> pd.DataFrame:
+        """Read a dataset, falling back to the csv file if it was not converted yet.
+
+        Args:
+            name (str): dataset name
+            columns (list, optional): columns to be read. Defaults to all columns.
+            filters (list | pyarrow.compute.Expression, optional): row predicate, e.g.
+                [('handset_type', '==', 'Apple iPhone 6S (A1688)')] or
+                pc.field('total_data') > 1e9. Row groups that cannot match are skipped.
+                Defaults to None.
+
+        Returns:
+            pd.DataFrame: the requested columns and rows
+        """
+        if self.exists(name):
+            df = pd.read_parquet(self.path(name), columns=columns, filters=filters)
+        else:
+            csv_path = os.path.join(self.root, f'{name}.csv')
+            if filters is None:
+                df = pd.read_csv(csv_path, usecols=columns)
+            else:
+                table = pa.Table.from_pandas(pd.read_csv(csv_path), preserve_index=False)
+                table = table.filter(self._expression(filters))
+                df = table.select(columns).to_pandas() if columns else table.to_pandas()
+        self.logger.info(f'Read {len(df)} rows of {name}')
+        return df
+
+    def _expression(self, filters):
+        """Turn a list of (column, op, value) tuples into a pyarrow expression."""
+        if not isinstance(filters, list):
+            return filters
+        return pq.filters_to_expression(filters)
+
+    def schema(self, name: str) -> pa.Schema:
+        """Return the stored schema of a dataset without reading it."""
+        return ds.dataset(self.path(name), format='parquet').schema
+
+    def convert_csv(self, csv_path: str, name: str = None, block_size: int = 64 << 20,
+                    path: str = None, convert_options: pacsv.ConvertOptions = None) -> str:
+        """Convert a csv file to a parquet dataset block by block.
+
+        Unless convert_options are given, column types are inferred from the first
+        block. Columns that are empty in that block are read as strings and integer
+        columns as float64, so that a later block with nulls or decimals does not
+        break the conversion.
+
+        Args:
+            csv_path (str): path of the csv file
+            name (str, optional): dataset name. Defaults to the csv file name.
+            block_size (int, optional): bytes parsed per block. Defaults to 64 MiB.
+            path (str, optional): output file, e.g. a part_path. Defaults to the dataset path.
+            convert_options (pacsv.ConvertOptions, optional): column types shared by several
+                files, e.g. the parts of one table. Defaults to inferring them.
+
+        Returns:
+            str: path of the written file
+        """
+        name = name or os.path.splitext(os.path.basename(csv_path))[0]
+        read_options = pacsv.ReadOptions(block_size=block_size)
+        if convert_options is None:
+            convert_options = csv_convert_options(csv_path, read_options)
+
+        path = path or self.path(name)
+        rows = 0
+        with pacsv.open_csv(csv_path, read_options=read_options, convert_options=convert_options) as reader:
+            with pq.ParquetWriter(path, reader.schema, compression=self.compression) as writer:
+                for batch in reader:
+                    writer.write_batch(batch, row_group_size=self.row_group_size)
+                    rows += batch.num_rows
+        self.logger.info(f'Converted {rows} rows from {csv_path} to {path}')
+        return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert csv intermediates to parquet.')
+    parser.add_argument('csv', nargs='+', help='csv files to be converted')
+    parser.add_argument('--root', default=None, help='output directory, defaults to the csv directory')
+    args = parser.parse_args()
+    for csv_path in args.csv:
+        store = DataStore(root=args.root or os.path.dirname(os.path.abspath(csv_path)))
+        print(store.convert_csv(csv_path))
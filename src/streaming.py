@@ -0,0 +1,234 @@
+import os
+import sys
+import tempfile
+from typing import Callable, Iterable, Iterator, Union
+
+import numpy as np
+import pandas as pd
+from logger import Logger, stage
+from preprocessing import PreProcess
+from sketch import sketch_columns, sketch_quantiles
+
+
+class StreamPreProcess:
+    """Run the PreProcess cleaning steps over a dataset in bounded-size chunks.
+
+    The first pass reads the data chunk by chunk and only keeps small global
+    statistics: the null count of every column, a mergeable QuantileSketch per
+    numeric column for the medians and bounded frequency counters for the
+    modes. A column is numeric only if no chunk reads it with another dtype,
+    since a text column that is empty in a chunk is read as float there. The
+    second pass applies ``clean_feature_name``,
+    ``convert_to_datetime``, ``convert_to_float``, the null-percentage column
+    drop and the median/mode imputation to each chunk with those global
+    statistics, and appends the cleaned chunk to the output file. Peak memory
+    is bounded by the chunk size, the sketch size and the counter capacity,
+    not by the size of the input.
+    """
+
+    def __init__(self, chunksize: int = 50_000, null_threshold: float = 30,
+                 sketch_k: int = 1000, mode_capacity: int = 10_000,
+                 datetime_cols: list = ('start', 'end'), float_cols: list = ()):
+        """Initialize the StreamPreProcess class.
+
+        Args:
+            chunksize (int, optional): number of rows per chunk. Defaults to 50_000.
+            null_threshold (float, optional): columns with at least this percentage of
+                nulls are dropped. Defaults to 30.
+            sketch_k (int, optional): size of the QuantileSketch used for the medians,
+                the median rank error is about 0.3% at the default. Defaults to 1000.
+            mode_capacity (int, optional): distinct values tracked per column for the
+                modes. Defaults to 10_000.
+            datetime_cols (list, optional): cleaned column names parsed as datetimes.
+                Defaults to ('start', 'end').
+            float_cols (list, optional): cleaned column names cast to float. Defaults to ().
+        """
+        try:
+            self.logger = Logger("preprocessing.log").get_app_logger()
+            self.preprocess = PreProcess()
+            self.chunksize = chunksize
+            self.null_threshold = null_threshold
+            self.sketch_k = sketch_k
+            self.mode_capacity = mode_capacity
+            self.datetime_cols = list(datetime_cols)
+            self.float_cols = list(float_cols)
+            self.stats = None
+            self.logger.info('Successfully Instantiated StreamPreProcess Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate StreamPreProcess Class Object')
+            sys.exit(1)
+
+    def iter_chunks(self, source: Union[str, Iterable, Callable]) -> Iterator[pd.DataFrame]:
+        """Yield the raw chunks of a source.
+
+        Args:
+            source (str | Iterable | Callable): path of a csv file, an iterable of
+                dataframes or a callable returning a fresh iterator of dataframes.
+
+        Yields:
+            pd.DataFrame: the next chunk
+        """
+        if isinstance(source, (str, os.PathLike)):
+            yield from pd.read_csv(source, chunksize=self.chunksize)
+        elif callable(source):
+            yield from source()
+        else:
+            yield from source
+
+    def prepare_chunk(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Apply the stateless cleaning steps to a chunk.
+
+        Args:
+            chunk (pd.DataFrame): raw chunk
+
+        Returns:
+            pd.DataFrame: chunk with cleaned names and converted types
+        """
+        chunk = self.preprocess.clean_feature_name(chunk)
+        for column in self.datetime_cols:
+            if column in chunk.columns:
+                chunk = self.preprocess.convert_to_datetime(chunk, column)
+        for column in self.float_cols:
+            if column in chunk.columns:
+                chunk = self.preprocess.convert_to_float(chunk, column)
+        return chunk
+
+    def collect_stats(self, source: Union[str, Iterable, Callable]) -> dict:
+        """Collect the global statistics of the source in one pass.
+
+        Args:
+            source (str | Iterable | Callable): see iter_chunks
+
+        Returns:
+            dict: number of rows, null percentage per column, columns to drop,
+                medians and sketches of the numeric columns, the other columns and their modes
+        """
+        rows = 0
+        null_counts = None
+        sketches = {}
+        counters = {}
+        text_columns = set()
+
+        for chunk in self.iter_chunks(source):
+            chunk = self.prepare_chunk(chunk)
+            rows += len(chunk)
+            nulls = chunk.isnull().sum()
+            null_counts = nulls if null_counts is None else null_counts.add(nulls, fill_value=0)
+
+            sketch_columns(chunk, k=self.sketch_k, sketches=sketches)
+
+            text_columns.update(chunk.select_dtypes(exclude=np.number).columns)
+            for column in text_columns.intersection(chunk.columns):
+                counters[column] = self._update_counter(
+                    counters.get(column, pd.Series(dtype='int64')), chunk[column])
+
+        if null_counts is None:
+            raise ValueError('The source did not yield any chunk')
+        # a text column read as float in a chunk where it only holds nulls is not numeric
+        sketches = {column: sketch for column, sketch in sketches.items() if column not in text_columns}
+
+        null_percentage = null_counts / rows * 100
+        columns_to_drop = list(null_percentage[null_percentage >= self.null_threshold].index)
+        stats = {
+            'rows': rows,
+            'null_percentage': null_percentage,
+            'columns_to_drop': columns_to_drop,
+            'medians': sketch_quantiles(sketches, 0.5),
+            'sketches': sketches,
+            'text_columns': sorted(text_columns),
+            'modes': pd.Series({column: counter.idxmax() for column, counter in counters.items()
+                                if len(counter)}, dtype=object),
+        }
+        self.logger.info(f'Collected streaming statistics over {rows} rows')
+        return stats
+
+    def _update_counter(self, counter: pd.Series, column: pd.Series) -> pd.Series:
+        """Merge the value counts of a chunk into a bounded frequency counter.
+
+        When the counter grows past its capacity every count is decremented by the
+        count of the first value that does not fit (Misra-Gries), so the most
+        frequent value of a column survives with bounded memory.
+        """
+        counter = counter.add(column.value_counts(), fill_value=0)
+        if len(counter) > self.mode_capacity:
+            counter = counter.sort_values(ascending=False)
+            counter = counter.iloc[:self.mode_capacity] - counter.iloc[self.mode_capacity]
+            counter = counter[counter > 0]
+        return counter
+
+    def clean_chunk(self, chunk: pd.DataFrame, stats: dict) -> pd.DataFrame:
+        """Clean a raw chunk with the global statistics.
+
+        Args:
+            chunk (pd.DataFrame): raw chunk
+            stats (dict): global statistics returned by collect_stats
+
+        Returns:
+            pd.DataFrame: cleaned chunk
+        """
+        chunk = self.prepare_chunk(chunk)
+        chunk = chunk.drop(columns=[c for c in stats['columns_to_drop'] if c in chunk.columns])
+        for column in stats['text_columns']:
+            if column in chunk.columns and pd.api.types.is_numeric_dtype(chunk[column]):
+                chunk[column] = chunk[column].astype(object)
+        chunk = self.preprocess.fill_nulls_with_method(chunk, 'median', stats['medians'])
+        chunk = self.preprocess.fill_nulls_with_method(chunk, 'mode', stats['modes'])
+        return chunk
+
+    def iter_clean(self, source: Union[str, Iterable, Callable], stats: dict = None) -> Iterator[pd.DataFrame]:
+        """Yield the cleaned chunks of a source.
+
+        Args:
+            source (str | Iterable | Callable): see iter_chunks. A one-shot iterator is
+                spooled to a temporary directory during the first pass so that it can be
+                read twice.
+            stats (dict, optional): global statistics. Defaults to running collect_stats.
+
+        Yields:
+            pd.DataFrame: the next cleaned chunk
+        """
+        if stats is not None or not self._is_one_shot(source):
+            self.stats = stats if stats is not None else self.collect_stats(source)
+            for chunk in self.iter_chunks(source):
+                yield self.clean_chunk(chunk, self.stats)
+            return
+
+        with tempfile.TemporaryDirectory() as spool_dir:
+            paths = []
+
+            def spool():
+                for i, chunk in enumerate(source):
+                    path = os.path.join(spool_dir, f'chunk_{i:06d}.pkl')
+                    chunk.to_pickle(path)
+                    paths.append(path)
+                    yield chunk
+
+            self.stats = self.collect_stats(spool)
+            for path in paths:
+                yield self.clean_chunk(pd.read_pickle(path), self.stats)
+
+    def run(self, source: Union[str, Iterable, Callable], output_path: str) -> dict:
+        """Clean a source chunk by chunk and append the result to a csv file.
+
+        Args:
+            source (str | Iterable | Callable): see iter_chunks
+            output_path (str): path of the cleaned csv file
+
+        Returns:
+            dict: global statistics used for cleaning
+        """
+        rows = 0
+        header = True
+        with stage('stream_clean', self.logger) as record:
+            for chunk in self.iter_clean(source):
+                chunk.to_csv(output_path, mode='w' if header else 'a', header=header, index=False)
+                header = False
+                rows += len(chunk)
+            record['rows'] = rows
+        self.logger.info(f'Streamed {rows} cleaned rows to {output_path}')
+        return self.stats
+
+    def _is_one_shot(self, source) -> bool:
+        """Return True when the source is an iterator that can only be read once."""
+        return not isinstance(source, (str, os.PathLike)) and not callable(source) \
+            and iter(source) is source
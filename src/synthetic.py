@@ -0,0 +1,291 @@
+"""Deterministic synthetic xDR sessions with the schema of the Tellco extract.
+
+The real extract is private, so XDRGenerator produces data with its 55 raw
+columns, dtypes and null rates (``Field Descriptions.xlsx``), the skew of
+sessions per subscriber and of handsets, and a configurable share of
+duplicated rows. Rows are generated in chunks with a random stream per
+chunk, so the same seed gives the same data whatever the chunk is used for,
+and 50M rows can be written to disk without holding them in memory.
+
+    python src/synthetic.py --rows 1000000 --output ../data/synthetic_xdr.parquet
+"""
+import argparse
+import os
+import sys
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from logger import Logger
+
+APPS = ['Social Media', 'Google', 'Email', 'Youtube', 'Netflix', 'Gaming', 'Other']
+
+# upper bound of the per-session DL and UL bytes of every application
+APP_BYTES = {
+    'Social Media': (3_650_000, 65_000),
+    'Google': (11_500_000, 4_300_000),
+    'Email': (3_600_000, 1_150_000),
+    'Youtube': (45_000_000, 45_000_000),
+    'Netflix': (45_000_000, 45_000_000),
+    'Gaming': (900_000_000, 45_000_000),
+    'Other': (900_000_000, 45_000_000),
+}
+
+DL_TP_BUCKETS = ['DL TP < 50 Kbps (%)', '50 Kbps < DL TP < 250 Kbps (%)',
+                 '250 Kbps < DL TP < 1 Mbps (%)', 'DL TP > 1 Mbps (%)']
+UL_TP_BUCKETS = ['UL TP < 10 Kbps (%)', '10 Kbps < UL TP < 50 Kbps (%)',
+                 '50 Kbps < UL TP < 300 Kbps (%)', 'UL TP > 300 Kbps (%)']
+VOLUME_SECONDS = ['Nb of sec with 125000B < Vol DL', 'Nb of sec with 1250B < Vol UL < 6250B',
+                  'Nb of sec with 31250B < Vol DL < 125000B', 'Nb of sec with 37500B < Vol UL',
+                  'Nb of sec with 6250B < Vol DL < 31250B', 'Nb of sec with 6250B < Vol UL < 37500B',
+                  'Nb of sec with Vol DL < 6250B', 'Nb of sec with Vol UL < 1250B']
+
+# column: share of nulls in the real extract
+NULL_RATES = {
+    'Bearer Id': 0.0066, 'IMSI': 0.0038, 'MSISDN/Number': 0.0071, 'IMEI': 0.0038,
+    'Last Location Name': 0.0077, 'Avg RTT DL (ms)': 0.1855, 'Avg RTT UL (ms)': 0.1854,
+    'TCP DL Retrans. Vol (Bytes)': 0.5876, 'TCP UL Retrans. Vol (Bytes)': 0.6443,
+    'DL TP < 50 Kbps (%)': 0.0050, 'UL TP < 10 Kbps (%)': 0.0053,
+    'HTTP DL (Bytes)': 0.5432, 'HTTP UL (Bytes)': 0.5454,
+    'Handset Manufacturer': 0.0038, 'Handset Type': 0.0038,
+    'Nb of sec with 125000B < Vol DL': 0.6502, 'Nb of sec with 1250B < Vol UL < 6250B': 0.6193,
+    'Nb of sec with 31250B < Vol DL < 125000B': 0.6239, 'Nb of sec with 37500B < Vol UL': 0.8684,
+    'Nb of sec with 6250B < Vol DL < 31250B': 0.5888, 'Nb of sec with 6250B < Vol UL < 37500B': 0.7456,
+    'Nb of sec with Vol DL < 6250B': 0.0050, 'Nb of sec with Vol UL < 1250B': 0.0053,
+}
+
+# columns that are missing together with the first one of their group
+NULL_GROUPS = {
+    'IMSI': ['IMEI', 'Handset Manufacturer', 'Handset Type'],
+    'DL TP < 50 Kbps (%)': DL_TP_BUCKETS[1:] + ['Nb of sec with Vol DL < 6250B'],
+    'UL TP < 10 Kbps (%)': UL_TP_BUCKETS[1:] + ['Nb of sec with Vol UL < 1250B'],
+}
+
+MANUFACTURERS = {
+    'Apple': ('Apple iPhone', 0.40),
+    'Samsung': ('Samsung Galaxy', 0.27),
+    'Huawei': ('Huawei', 0.23),
+    'Sony Mobile Communications Ab': ('Sony Xperia', 0.01),
+    'Xiaomi Communications Co': ('Xiaomi Redmi', 0.01),
+    'Oppo': ('Oppo', 0.008),
+    'Asustek': ('Asus Zenfone', 0.005),
+    'Lenovo': ('Lenovo', 0.004),
+    'undefined': ('undefined', 0.063),
+}
+N_HANDSETS = 1_400
+
+XDR_COLUMNS = (
+    ['Bearer Id', 'Start', 'Start ms', 'End', 'End ms', 'Dur. (ms)', 'IMSI', 'MSISDN/Number',
+     'IMEI', 'Last Location Name', 'Avg RTT DL (ms)', 'Avg RTT UL (ms)',
+     'Avg Bearer TP DL (kbps)', 'Avg Bearer TP UL (kbps)', 'TCP DL Retrans. Vol (Bytes)',
+     'TCP UL Retrans. Vol (Bytes)']
+    + DL_TP_BUCKETS + UL_TP_BUCKETS
+    + ['HTTP DL (Bytes)', 'HTTP UL (Bytes)', 'Activity Duration DL (ms)',
+       'Activity Duration UL (ms)', 'Dur. (ms).1', 'Handset Manufacturer', 'Handset Type']
+    + VOLUME_SECONDS
+    + [f'{app} {way} (Bytes)' for app in APPS for way in ('DL', 'UL')]
+    + ['Total UL (Bytes)', 'Total DL (Bytes)']
+)
+
+
+def _handsets() -> tuple:
+    """Return the handset types ordered by popularity and their manufacturers."""
+    rng = np.random.default_rng(0)
+    names = list(MANUFACTURERS)
+    weights = np.array([share for _, share in MANUFACTURERS.values()])
+    makers = rng.choice(len(names), N_HANDSETS - 1, p=weights / weights.sum())
+    types, manufacturers = ['undefined'], ['undefined']
+    for i, m in enumerate(makers):
+        maker = names[m] if names[m] != 'undefined' else 'Apple'
+        types.append(f'{MANUFACTURERS[maker][0]} {chr(65 + i % 26)}{i}')
+        manufacturers.append(maker)
+    return np.array(types, dtype=object), np.array(manufacturers, dtype=object)
+
+
+def _mix(index: np.ndarray, salt: int) -> np.ndarray:
+    """Deterministic pseudo-random number in [0, 1) for every integer."""
+    x = (index.astype(np.uint64) + np.uint64(salt)) * np.uint64(0x9E3779B97F4A7C15)
+    x ^= x >> np.uint64(31)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(29)
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+class XDRGenerator:
+    def __init__(self, rows: int = 150_000, seed: int = 42, users: int = None,
+                 null_scale: float = 1.0, duplicate_rate: float = 0.001,
+                 chunksize: int = 500_000, datetime_as_string: bool = True):
+        """Initialize the XDRGenerator class.
+
+        Args:
+            rows (int, optional): number of sessions. Defaults to 150_000.
+            seed (int, optional): random seed. Defaults to 42.
+            users (int, optional): size of the subscriber pool. Defaults to 2 * rows, which
+                gives about 0.75 distinct subscribers per session, as in the real extract.
+            null_scale (float, optional): multiplier of the real null rates. Defaults to 1.0.
+            duplicate_rate (float, optional): share of rows that repeat an earlier row of
+                the same chunk. Defaults to 0.001.
+            chunksize (int, optional): rows generated at a time. Defaults to 500_000.
+            datetime_as_string (bool, optional): write Start and End as '%m/%d/%Y %H:%M'
+                strings like the raw extract instead of datetimes. Defaults to True.
+        """
+        try:
+            self.logger = Logger("synthetic.log").get_app_logger()
+            self.rows = rows
+            self.seed = seed
+            self.users = users or max(1, 2 * rows)
+            self.null_scale = null_scale
+            self.duplicate_rate = duplicate_rate
+            self.chunksize = chunksize
+            self.datetime_as_string = datetime_as_string
+            self.handset_types, self.handset_makers = _handsets()
+            self.logger.info('Successfully Instantiated XDRGenerator Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate XDRGenerator Class Object')
+            sys.exit(1)
+
+    def _users(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        """Draw the subscriber of every session, a few heavy users and a long tail."""
+        # u ** 1.5 piles sessions on the low indices: ~40 sessions for the top user of 150k rows
+        return np.minimum((self.users * rng.random(n) ** 1.5).astype(np.int64), self.users - 1)
+
+    def make_chunk(self, index: int, rows: int) -> pd.DataFrame:
+        """Generate one chunk of sessions.
+
+        Args:
+            index (int): chunk number, which selects its random stream
+            rows (int): number of rows of the chunk
+
+        Returns:
+            pd.DataFrame: the sessions with the raw xDR columns
+        """
+        rng = np.random.default_rng([self.seed, index])
+        user = self._users(rng, rows)
+        # identifiers are bijections of the user index, so one user keeps its MSISDN, IMSI and IMEI
+        permuted = (user * 7_919 + 104_729) % 1_000_000_000
+        handset = (N_HANDSETS * _mix(user, 1) ** 3).astype(np.int64)
+
+        start = pd.Timestamp('2019-04-04') + pd.to_timedelta(rng.integers(0, 26 * 86_400, rows), unit='s')
+        duration = np.clip(rng.lognormal(np.log(86_400_000), 0.7, rows), 7_142, 1_859_336_000).round()
+        end = start + pd.to_timedelta(duration, unit='ms')
+
+        data = {
+            'Bearer Id': rng.integers(6_917_538_248_801_000_000, 13_186_820_000_000_000_000,
+                                      rows, dtype=np.uint64).astype(np.float64),
+            'Start': start,
+            'Start ms': rng.integers(0, 1_000, rows).astype(np.float64),
+            'End': end,
+            'End ms': rng.integers(0, 1_000, rows).astype(np.float64),
+            'Dur. (ms)': duration,
+            'IMSI': (208_200_000_000_000 + permuted).astype(np.float64),
+            'MSISDN/Number': (33_600_000_000 + permuted).astype(np.float64),
+            'IMEI': (35_000_000_000_000 + (permuted * 31 + (_mix(user, 2) < 0.05)) % 10**13).astype(np.float64),
+            'Last Location Name': np.char.add('L', (50_000 * rng.random(rows) ** 2).astype(np.int64)
+                                              .astype(str)).astype(object),
+            'Avg RTT DL (ms)': np.clip(rng.lognormal(np.log(45), 1.0, rows), 0, 96_923).round(),
+            'Avg RTT UL (ms)': np.clip(rng.lognormal(np.log(5), 1.3, rows), 0, 7_120).round(),
+            'Avg Bearer TP DL (kbps)': np.clip(rng.lognormal(np.log(200), 2.2, rows), 0, 378_160).round(),
+            'Avg Bearer TP UL (kbps)': np.clip(rng.lognormal(np.log(50), 1.8, rows), 0, 58_613).round(),
+            'TCP DL Retrans. Vol (Bytes)': np.clip(rng.lognormal(np.log(500_000), 2.5, rows), 2, 4.3e9).round(),
+            'TCP UL Retrans. Vol (Bytes)': np.clip(rng.lognormal(np.log(20_000), 2.0, rows), 1, 2.9e9).round(),
+        }
+        for buckets in (DL_TP_BUCKETS, UL_TP_BUCKETS):
+            shares = rng.dirichlet([8.0, 1.0, 0.6, 0.4], rows)
+            shares = np.floor(shares * 100)
+            shares[:, 0] += 100 - shares.sum(axis=1)
+            for j, column in enumerate(buckets):
+                data[column] = shares[:, j]
+        data['HTTP DL (Bytes)'] = rng.lognormal(np.log(1_000_000), 2.5, rows).round()
+        data['HTTP UL (Bytes)'] = rng.lognormal(np.log(50_000), 2.5, rows).round()
+        data['Activity Duration DL (ms)'] = rng.lognormal(np.log(40_000), 2.0, rows).round()
+        data['Activity Duration UL (ms)'] = rng.lognormal(np.log(40_000), 2.0, rows).round()
+        data['Dur. (ms).1'] = duration * 1_000 + rng.integers(0, 1_000, rows)
+        data['Handset Manufacturer'] = self.handset_makers[handset]
+        data['Handset Type'] = self.handset_types[handset]
+        for column in VOLUME_SECONDS:
+            data[column] = np.floor(rng.lognormal(np.log(60), 2.0, rows))
+
+        totals = {'DL': np.zeros(rows), 'UL': np.zeros(rows)}
+        for app in APPS:
+            for way, high in zip(('DL', 'UL'), APP_BYTES[app]):
+                values = rng.uniform(high * 0.001, high, rows).round()
+                data[f'{app} {way} (Bytes)'] = values
+                totals[way] += values
+        data['Total UL (Bytes)'] = totals['UL']
+        data['Total DL (Bytes)'] = totals['DL']
+        df = pd.DataFrame(data, columns=XDR_COLUMNS)
+
+        for column, rate in NULL_RATES.items():
+            rate = min(rate * self.null_scale, 1.0)
+            missing = rng.random(rows) < rate
+            df.loc[missing, [column] + NULL_GROUPS.get(column, [])] = np.nan
+        if self.datetime_as_string:
+            df['Start'] = df['Start'].dt.strftime('%-m/%-d/%Y %H:%M')
+            df['End'] = df['End'].dt.strftime('%-m/%-d/%Y %H:%M')
+
+        n_duplicates = int(rows * self.duplicate_rate)
+        if n_duplicates and rows > 1:
+            order = np.arange(rows)
+            targets = rng.choice(rows, n_duplicates, replace=False)
+            sources = rng.choice(np.setdiff1d(order, targets), n_duplicates)
+            order[targets] = sources
+            df = df.take(order).reset_index(drop=True)
+        return df
+
+    def iter_chunks(self) -> Iterator[pd.DataFrame]:
+        """Yield the sessions chunk by chunk, with a continuous RangeIndex.
+
+        Yields:
+            pd.DataFrame: the next chunk of at most chunksize rows
+        """
+        for index, start in enumerate(range(0, self.rows, self.chunksize)):
+            rows = min(self.chunksize, self.rows - start)
+            chunk = self.make_chunk(index, rows)
+            chunk.index = pd.RangeIndex(start, start + rows)
+            yield chunk
+
+    def generate(self) -> pd.DataFrame:
+        """Return all the sessions in one dataframe.
+
+        Returns:
+            pd.DataFrame: the synthetic xDR extract
+        """
+        df = pd.concat(list(self.iter_chunks()))
+        self.logger.info(f'Generated {len(df)} synthetic sessions from a pool of {self.users} users')
+        return df
+
+    def write(self, path: str) -> str:
+        """Write the sessions chunk by chunk to a parquet or csv file.
+
+        Args:
+            path (str): output file, parquet if it ends with '.parquet', csv otherwise
+
+        Returns:
+            str: the path
+        """
+        writer = None
+        try:
+            for i, chunk in enumerate(self.iter_chunks()):
+                if path.endswith('.parquet'):
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    writer = writer or pq.ParquetWriter(path, table.schema, compression='zstd')
+                    writer.write_table(table)
+                else:
+                    chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        finally:
+            if writer is not None:
+                writer.close()
+        self.logger.info(f'Wrote {self.rows} synthetic sessions to {path}')
+        return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic xDR extract.')
+    parser.add_argument('--rows', type=int, default=150_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--duplicate-rate', type=float, default=0.001)
+    parser.add_argument('--output', default=os.path.join('..', 'data', 'synthetic_xdr.parquet'))
+    args = parser.parse_args()
+    XDRGenerator(args.rows, args.seed, duplicate_rate=args.duplicate_rate).write(args.output)
@@ -0,0 +1,206 @@
+"""Derived application traffic and the per-subscriber usage cube.
+
+DERIVED_FEATURES declares every derived column as the sum of its input
+columns: the total bytes of each application (DL + UL) and total_data.
+TrafficEngine writes every feature into one column-major float64 block,
+adding the input columns in place, without copying the inputs or creating
+a Series per feature. A missing input makes the feature missing, as
+``df[a] + df[b]`` does.
+
+In the same pass the block is grouped by MSISDN, the keys being factorized
+once and every application column summed with ``np.bincount``, into a
+UsageCube: a (subscribers x applications) float32 array of the bytes of
+each subscriber on each application, with the sorted int64 MSISDNs as its
+index and the number of sessions per subscriber. The top-applications and
+application-engagement reports read the cube instead of scanning the xDR
+rows again.
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+from logger import Logger
+
+USER_KEY = 'msisdn/number'
+APPLICATIONS = ['social_media', 'google', 'email', 'youtube', 'netflix', 'gaming', 'other']
+
+# derived column: input columns summed row-wise
+DERIVED_FEATURES = {
+    **{app: (f'{app}_dl_(bytes)', f'{app}_ul_(bytes)') for app in APPLICATIONS},
+    'total_data': ('total_dl_(bytes)', 'total_ul_(bytes)'),
+}
+
+
+class UsageCube:
+    """Bytes of every subscriber on every application."""
+
+    def __init__(self, keys: np.ndarray, applications: list, values: np.ndarray, sessions: np.ndarray):
+        """Wrap the cube arrays.
+
+        Args:
+            keys (np.ndarray): sorted int64 MSISDNs, one per row
+            applications (list): application names, one per column
+            values (np.ndarray): float32 (subscribers, applications) bytes
+            sessions (np.ndarray): number of sessions of every subscriber
+        """
+        self.keys = keys
+        self.applications = list(applications)
+        self.values = values
+        self.sessions = sessions
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.values.nbytes + self.sessions.nbytes
+
+    def _column(self, application: str) -> np.ndarray:
+        return self.values[:, self.applications.index(application)]
+
+    def user(self, msisdn) -> pd.Series:
+        """Return the bytes of one subscriber per application, None if unknown."""
+        msisdn = int(float(msisdn))
+        position = np.searchsorted(self.keys, msisdn)
+        if position == len(self.keys) or self.keys[position] != msisdn:
+            return None
+        return pd.Series(self.values[position], index=self.applications, name=self.keys[position])
+
+    def totals(self) -> pd.Series:
+        """Return the total bytes of every application, largest first."""
+        totals = self.values.sum(axis=0, dtype=np.float64)
+        return pd.Series(totals, index=self.applications).sort_values(ascending=False)
+
+    def top_users(self, application: str, n: int = 10) -> pd.Series:
+        """Return the n subscribers using an application the most.
+
+        Args:
+            application (str): application name
+            n (int, optional): number of subscribers. Defaults to 10.
+
+        Returns:
+            pd.Series: bytes of the top subscribers, indexed by MSISDN, largest first
+        """
+        column = self._column(application)
+        n = min(n, len(column))
+        top = np.argpartition(column, len(column) - n)[len(column) - n:]
+        top = top[np.argsort(column[top], kind='stable')[::-1]]
+        return pd.Series(column[top].astype(np.float64), index=pd.Index(self.keys[top], name=USER_KEY),
+                         name=application)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return the cube as a dataframe indexed by MSISDN, with a sessions column."""
+        df = pd.DataFrame(self.values, index=pd.Index(self.keys, name=USER_KEY), columns=self.applications)
+        df.insert(0, 'sessions', self.sessions)
+        return df
+
+    def save(self, path: str) -> None:
+        """Write the cube to a .npz file."""
+        np.savez(path, keys=self.keys, applications=np.array(self.applications),
+                 values=self.values, sessions=self.sessions)
+
+    @classmethod
+    def load(cls, path: str) -> 'UsageCube':
+        """Read a cube written by save."""
+        with np.load(path) as data:
+            return cls(data['keys'], data['applications'].tolist(), data['values'], data['sessions'])
+
+
+class TrafficEngine:
+    def __init__(self, features: dict = DERIVED_FEATURES, applications: list = APPLICATIONS,
+                 key: str = USER_KEY):
+        """Initialize the TrafficEngine class.
+
+        Args:
+            features (dict, optional): derived column to the input columns it sums.
+                Defaults to DERIVED_FEATURES.
+            applications (list, optional): derived columns kept in the usage cube.
+                Defaults to APPLICATIONS.
+            key (str, optional): column identifying a subscriber. Defaults to 'msisdn/number'.
+        """
+        try:
+            self.logger = Logger("preprocessing.log").get_app_logger()
+            self.features = {name: tuple(inputs) for name, inputs in features.items()}
+            self.applications = list(applications)
+            self.key = key
+            self.logger.info('Successfully Instantiated TrafficEngine Class Object')
+        except Exception:
+            self.logger.exception('Failed to Instantiate TrafficEngine Class Object')
+            sys.exit(1)
+
+    def compute(self, df: pd.DataFrame) -> np.ndarray:
+        """Return the (rows, features) block of the derived features."""
+        block = np.empty((len(df), len(self.features)), dtype=np.float64, order='F')
+        for j, inputs in enumerate(self.features.values()):
+            column = block[:, j]
+            column[:] = df[inputs[0]].to_numpy(dtype=np.float64)
+            for name in inputs[1:]:
+                np.add(column, df[name].to_numpy(dtype=np.float64), out=column)
+        return block
+
+    def _assign(self, df: pd.DataFrame, derived: np.ndarray) -> None:
+        for j, name in enumerate(self.features):
+            df[name] = derived[:, j]
+
+    def derive(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Add every derived feature to the dataframe.
+
+        Args:
+            df (pd.DataFrame): xDR sessions with the input columns
+
+        Returns:
+            pd.DataFrame: the dataframe with the derived columns
+        """
+        self._assign(df, self.compute(df))
+        self.logger.info(f'Derived {len(self.features)} traffic features of {len(df)} sessions')
+        return df
+
+    def cube(self, df: pd.DataFrame, derived: np.ndarray = None) -> UsageCube:
+        """Group the application traffic of the sessions by subscriber.
+
+        Args:
+            df (pd.DataFrame): xDR sessions with the key and the input columns
+            derived (np.ndarray, optional): block returned by compute. Defaults to
+                computing it.
+
+        Returns:
+            UsageCube: the usage cube, sessions without a key are left out
+        """
+        if derived is None:
+            derived = self.compute(df)
+        columns = [list(self.features).index(app) for app in self.applications]
+        codes, keys = pd.factorize(df[self.key])
+        # sorting the distinct keys is cheaper than factorize(sort=True)
+        order = np.argsort(keys)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        keys = np.asarray(keys)[order]
+        present = codes >= 0
+        everyone = present.all()
+        codes = rank[codes if everyone else codes[present]]
+        values = np.empty((len(keys), len(columns)), dtype=np.float32, order='F')
+        for i, j in enumerate(columns):
+            weights = derived[:, j] if everyone else derived[present, j]
+            # missing bytes are skipped like in groupby().sum()
+            if np.isnan(weights).any():
+                weights = np.nan_to_num(weights)
+            values[:, i] = np.bincount(codes, weights=weights, minlength=len(keys))
+        sessions = np.bincount(codes, minlength=len(keys))
+        keys = np.rint(np.asarray(keys, dtype=np.float64)).astype(np.int64)
+        return UsageCube(keys, self.applications, values, sessions)
+
+    def run(self, df: pd.DataFrame) -> tuple:
+        """Derive the features and build the usage cube in one pass over the inputs.
+
+        Args:
+            df (pd.DataFrame): xDR sessions
+
+        Returns:
+            tuple: the dataframe with the derived columns and the UsageCube
+        """
+        derived = self.compute(df)
+        cube = self.cube(df, derived)
+        self._assign(df, derived)
+        self.logger.info(f'Built the usage cube of {len(cube)} subscribers from {len(df)} sessions '
+                         f'({cube.nbytes / 2**20:.1f} MiB)')
+        return df, cube
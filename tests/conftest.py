@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+
+@pytest.fixture(autouse=True, scope='session')
+def log_dir(tmp_path_factory):
+    """Run from a scratch directory so that the '../logs' files stay out of the tree."""
+    cwd = os.getcwd()
+    work = tmp_path_factory.mktemp('logs') / 'work'
+    work.mkdir()
+    os.chdir(work)
+    yield work.parent
+    os.chdir(cwd)
+
+
+@pytest.fixture(scope='session')
+def sessions():
+    """Return cleaned synthetic xDR sessions with total_data, as the pipelines read them."""
+    from preprocessing import PreProcess
+    from synthetic import XDRGenerator
+
+    def make(rows: int = 20_000, seed: int = 0, users: int = None):
+        df = PreProcess().clean_feature_name(XDRGenerator(rows, seed=seed, users=users).generate())
+        df['total_data'] = df['total_dl_(bytes)'] + df['total_ul_(bytes)']
+        return df
+    return make
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pl = pytest.importorskip('polars')
+
+from backend import to_backend
+from outlier import Outlier
+from overview import Overview
+from preprocessing import PreProcess
+from sketch import sketch_columns
+from synthetic import XDRGenerator
+
+IDS = ('bearer_id', 'imsi', 'msisdn/number', 'imei')
+
+
+@pytest.fixture(scope='module')
+def raw():
+    return XDRGenerator(3_000, seed=7).generate()
+
+
+@pytest.fixture(scope='module')
+def cleaned(raw):
+    preprocess = PreProcess()
+    df = preprocess.clean_feature_name(raw.copy())
+    df = preprocess.convert_to_datetime(df, 'start')
+    return preprocess.convert_to_datetime(df, 'end')
+
+
+@pytest.fixture(scope='module')
+def numeric(cleaned):
+    return [c for c in cleaned.select_dtypes(include=np.number).columns if c not in IDS]
+
+
+def pandas_frame(result) -> pd.DataFrame:
+    return to_backend(result, 'pandas').reset_index(drop=True)
+
+
+def assert_frames_equal(expected: pd.DataFrame, actual: pd.DataFrame):
+    expected = expected.reset_index(drop=True)
+    assert list(actual.columns) == list(expected.columns)
+    for column in expected.columns:
+        if pd.api.types.is_numeric_dtype(expected[column]):
+            np.testing.assert_allclose(actual[column].to_numpy(float), expected[column].to_numpy(float),
+                                       rtol=1e-9, equal_nan=True)
+        elif pd.api.types.is_datetime64_any_dtype(expected[column]):
+            assert (actual[column].isna() == expected[column].isna()).all()
+            assert (actual[column].dropna().to_numpy('datetime64[us]')
+                    == expected[column].dropna().to_numpy('datetime64[us]')).all()
+        else:
+            assert actual[column].astype(object).where(actual[column].notna(), None).tolist() \
+                == expected[column].astype(object).where(expected[column].notna(), None).tolist()
+
+
+def test_clean_feature_name_and_datetimes(raw, cleaned):
+    preprocess = PreProcess()
+    lf = preprocess.clean_feature_name(to_backend(raw, 'polars'))
+    lf = preprocess.convert_to_datetime(lf, 'start')
+    lf = preprocess.convert_to_datetime(lf, 'end')
+    assert_frames_equal(cleaned, pandas_frame(lf))
+
+
+@pytest.mark.parametrize('method', ['mean', 'median', 'mode', 'ffill', 'bfill'])
+def test_fill_nulls_with_method(cleaned, method):
+    preprocess = PreProcess()
+    expected = preprocess.fill_nulls_with_method(cleaned.copy(), method)
+    actual = preprocess.fill_nulls_with_method(to_backend(cleaned, 'polars'), method)
+    assert_frames_equal(expected, pandas_frame(actual))
+
+
+def test_drop_duplicates(cleaned):
+    preprocess = PreProcess()
+    doubled = pd.concat([cleaned, cleaned.iloc[:100]], ignore_index=True)
+    expected = preprocess.drop_duplicates(doubled.copy())
+    assert_frames_equal(expected, pandas_frame(preprocess.drop_duplicates(to_backend(doubled, 'polars'))))
+
+
+def test_casts_and_log_scale(cleaned, numeric):
+    preprocess, outlier = PreProcess(), Outlier()
+    positive = cleaned[numeric[:4]].abs() + 1
+    lf = to_backend(positive, 'polars')
+    assert_frames_equal(preprocess.logscale(positive.copy(), positive.columns),
+                        pandas_frame(preprocess.logscale(lf, positive.columns)))
+    assert_frames_equal(outlier.handle_outliers(positive.copy(), positive.columns),
+                        pandas_frame(outlier.handle_outliers(lf, positive.columns)))
+    assert_frames_equal(preprocess.convert_to_float(positive.copy(), positive.columns[0]),
+                        pandas_frame(preprocess.convert_to_float(lf, positive.columns[0])))
+
+
+def test_statistics(cleaned, numeric):
+    preprocess, outlier, overview = PreProcess(), Outlier(), Overview()
+    lf = to_backend(cleaned, 'polars')
+
+    expected = preprocess.missing_values_percentage(cleaned)
+    actual = preprocess.missing_values_percentage(lf)
+    np.testing.assert_allclose(actual.loc[expected.index].to_numpy(float), expected.to_numpy(float))
+    assert overview.percent_missing(lf) == overview.percent_missing(cleaned)
+    assert overview.number_of_duplicates(lf) == overview.number_of_duplicates(cleaned)
+    np.testing.assert_allclose(overview.get_skewness(lf).to_numpy(float),
+                               overview.get_skewness(cleaned).to_numpy(float), rtol=1e-6, equal_nan=True)
+    assert preprocess.num_outliers(pl.Series(cleaned[numeric[0]].to_numpy())) \
+        == preprocess.num_outliers(cleaned[numeric[0]])
+
+
+def test_outlier_counts(cleaned, numeric):
+    outlier = Outlier()
+    lf = to_backend(cleaned, 'polars')
+    pd.testing.assert_frame_equal(outlier.outlier_summary(lf, numeric), outlier.outlier_summary(cleaned, numeric),
+                                  check_dtype=False)
+    assert outlier.calculate_num_outliers_iqr(lf, numeric) == outlier.calculate_num_outliers_iqr(cleaned, numeric)
+
+
+@pytest.mark.parametrize('with_sketches', [False, True])
+def test_iqr_capping(cleaned, numeric, with_sketches):
+    outlier = Outlier()
+    sketches = sketch_columns(cleaned, numeric) if with_sketches else None
+    chunk = cleaned.iloc[:1_000]
+    expected = outlier.iqr_capping(chunk.copy(), numeric, sketches=sketches)
+    actual = outlier.iqr_capping(to_backend(chunk, 'polars'), numeric, sketches=sketches)
+    assert_frames_equal(expected, pandas_frame(actual))
+
+
+@pytest.mark.parametrize('cls, name, args', [
+    (PreProcess, 'drop_columns', (30,)),
+    (PreProcess, 'rename_columns', ('start', 'begin')),
+    (PreProcess, 'fix_outlier', ('dur._(ms)',)),
+    (PreProcess, 'optimize_dtypes', ()),
+    (Outlier, 'find_outliers_IQR', ()),
+    (Outlier, 'impute_outliers_IQR', ()),
+    (Outlier, 'outlier_overview', ('dur._(ms)',)),
+    (Overview, 'get_decile', ('dur._(ms)', 10)),
+])
+def test_methods_without_polars_version_raise(cleaned, cls, name, args):
+    with pytest.raises(NotImplementedError, match=f'{name} has no polars backend'):
+        getattr(cls(), name)(to_backend(cleaned, 'polars'), *args)
+
+
+def test_zscore_count_on_a_polars_series_raises(cleaned):
+    with pytest.raises(NotImplementedError, match='calculate_num_outliers_zscore has no polars backend'):
+        Outlier().calculate_num_outliers_zscore(pl.Series(cleaned['dur._(ms)'].to_numpy()))
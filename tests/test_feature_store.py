@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from feature_store import StoreCache
+from storage import DataStore
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+
+
+def test_lookup_rejects_non_finite_msisdns(tmp_path, sessions):
+    DataStore(str(tmp_path)).write(sessions(rows=2_000), 'cleaned_data2')
+    store = StoreCache().get(str(tmp_path), 'cleaned_data2', MODEL_DIR)
+    msisdn = store.tables['satisfaction'].keys[0]
+    assert store.lookup(str(msisdn))['satisfaction'] is not None
+    for value in ('inf', '-inf', 'nan', '1e400'):
+        with pytest.raises(ValueError):
+            store.lookup(value)
+
+
+def test_changed_dataset_is_rebuilt_in_the_background(tmp_path, sessions):
+    data = DataStore(str(tmp_path))
+    data.write(sessions(rows=2_000), 'cleaned_data2')
+    cache = StoreCache()
+    first = cache.get(str(tmp_path), 'cleaned_data2', MODEL_DIR)
+    assert not cache.stale(str(tmp_path), 'cleaned_data2')
+
+    data.write(sessions(rows=3_000, seed=1), 'cleaned_data2')
+    assert cache.get(str(tmp_path), 'cleaned_data2', MODEL_DIR) is first
+    cache.wait(str(tmp_path))
+    second = cache.get(str(tmp_path), 'cleaned_data2', MODEL_DIR)
+    assert second is not first
+    assert not cache.stale(str(tmp_path), 'cleaned_data2')
@@ -0,0 +1,91 @@
+import os
+import warnings
+from decimal import Decimal
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+ROWS = 120
+
+
+@pytest.fixture(scope='module')
+def dsn():
+    """Return the dsn of a database holding a small xdr_data table.
+
+    POSTGRES_TEST_DSN points the tests to an existing server, otherwise a throwaway
+    one is started with testing.postgresql. Without either the tests are skipped.
+    """
+    server = None
+    dsn = os.environ.get('POSTGRES_TEST_DSN')
+    if dsn is None:
+        testing_postgresql = pytest.importorskip('testing.postgresql')
+        try:
+            server = testing_postgresql.Postgresql()
+        except RuntimeError as error:
+            pytest.skip(f'no PostgreSQL server available: {error}')
+        dsn = server.url()
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute('DROP TABLE IF EXISTS public.xdr_data')
+            cur.execute('CREATE TABLE public.xdr_data ('
+                        '"Row" integer, "Bearer Id" double precision, "Start" timestamp, '
+                        '"Dur. (ms)" numeric, "Activity" boolean, "Handset Type" text, '
+                        '"Last Location Name" text)')
+            for row in range(ROWS):
+                # every 10th key is null, the first range holds no location at all
+                key = None if row % 10 == 0 else float(row % 99)
+                location = None if key is None or key < 33 else ('' if row % 7 == 0 else f'L{row}')
+                cur.execute('INSERT INTO public.xdr_data VALUES (%s, %s, %s, %s, %s, %s, %s)',
+                            (row, key, pd.Timestamp('2019-04-04') + pd.Timedelta(minutes=row),
+                             Decimal(row) / 4, None if row % 3 == 0 else row % 2 == 0,
+                             None if row % 5 == 0 else f'Handset {row % 4}', location))
+        conn.commit()
+        yield dsn
+    finally:
+        conn.close()
+        if server is not None:
+            server.stop()
+
+
+def normalize(df: pd.DataFrame) -> list:
+    """Return the rows ordered by "Row", with None for nulls and floats for decimals."""
+    df = df.sort_values('Row').reset_index(drop=True)
+    rows = []
+    for row in df.astype(object).itertuples(index=False):
+        rows.append(tuple(None if pd.isna(value) else float(value) if isinstance(value, Decimal) else value
+                          for value in row))
+    return rows
+
+
+@pytest.mark.parametrize('parts', [1, 3])
+@pytest.mark.parametrize('mode', ['cursor', 'copy'])
+def test_ingest_matches_read_sql_query(dsn, tmp_path, mode, parts):
+    from ingestion import PostgresIngestor
+    from storage import DataStore
+
+    store = DataStore(root=str(tmp_path))
+    ingestor = PostgresIngestor(dsn, store=store, batch_size=16)
+    stats = ingestor.ingest(mode=mode, key='Bearer Id' if parts > 1 else None, parts=parts, name='xdr')
+    assert stats['rows'] == ROWS
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with warnings.catch_warnings():
+            # pandas asks for SQLAlchemy, the notebook reads through a raw connection as well
+            warnings.simplefilter('ignore', UserWarning)
+            expected = pd.read_sql_query('SELECT * FROM public.xdr_data', conn)
+    finally:
+        conn.close()
+    ingested = pd.read_parquet(store.path('xdr'))
+    assert list(ingested.columns) == list(expected.columns)
+    assert normalize(ingested) == normalize(expected)
+    if parts > 1:
+        # the part without any location keeps the string type of the column
+        for part in range(parts):
+            schema = pq.read_schema(store.part_path('xdr', part))
+            assert schema.field('Last Location Name').type == pa.string()
@@ -0,0 +1,30 @@
+import pandas as pd
+
+from leaderboard import PROGRESS, Leaderboard, advance
+from pipeline.user_state import UserState
+
+
+def full_rebuild(df: pd.DataFrame) -> Leaderboard:
+    engagement, experience = UserState().update(df).features()
+    return Leaderboard().rebuild(engagement.join(experience)).count('handset_type', df['handset_type'])
+
+
+def assert_same_boards(actual: Leaderboard, expected: Leaderboard):
+    for metric in expected.metrics:
+        for direction in expected.directions(metric):
+            pd.testing.assert_series_equal(actual.top(metric, direction), expected.top(metric, direction))
+
+
+def test_advance_merges_only_the_appended_sessions(sessions, tmp_path):
+    df = sessions(30_000, seed=1, users=3_000)
+    advance(df.iloc[:20_000], str(tmp_path), chunksize=7_000)
+    board = advance(df, str(tmp_path), chunksize=7_000)
+    assert_same_boards(board, full_rebuild(df))
+    assert pd.read_json(tmp_path / PROGRESS, typ='series')['rows'] == len(df)
+
+
+def test_advance_starts_over_when_the_dataset_is_replaced(sessions, tmp_path):
+    first, second = sessions(10_000, seed=2, users=1_000), sessions(12_000, seed=3, users=1_000)
+    advance(first, str(tmp_path))
+    board = advance(second, str(tmp_path))
+    assert_same_boards(board, full_rebuild(second))
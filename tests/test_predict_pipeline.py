@@ -0,0 +1,40 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from pipeline.predict_pipeline import ScoringPipeline
+from pipeline.train_pipeline import ClusterTrainer, UserAggregator
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+
+
+def copy_models(tmp_path) -> str:
+    for name in ('user_eng.pkl', 'user_exp.pkl', 'satisfaction_model.pkl'):
+        shutil.copy(os.path.join(MODEL_DIR, name), tmp_path / name)
+    return str(tmp_path)
+
+
+def test_models_without_clusters_score_the_notebook_clusters(tmp_path):
+    pipeline = ScoringPipeline(copy_models(tmp_path))
+    np.testing.assert_array_equal(pipeline.engagement_centroid, pipeline.engagement_model.cluster_centers_[3])
+    np.testing.assert_array_equal(pipeline.experience_centroid, pipeline.experience_model.cluster_centers_[0])
+
+
+def test_clusters_saved_at_training_time_are_scored(tmp_path, sessions):
+    eng, exp = UserAggregator().user_features(sessions(rows=5_000))
+    trainer = ClusterTrainer(k_range=range(2, 5), n_jobs=1)
+    shutil.copy(os.path.join(MODEL_DIR, 'satisfaction_model.pkl'), tmp_path / 'satisfaction_model.pkl')
+    eng_model, exp_model = trainer.train_users(eng, exp, model_dir=str(tmp_path), n_clusters=4)
+
+    with open(tmp_path / 'clusters.json') as f:
+        clusters = json.load(f)
+    assert set(clusters) == {'engagement', 'experience'}
+    pipeline = ScoringPipeline(str(tmp_path))
+    np.testing.assert_array_equal(pipeline.engagement_centroid, eng_model.cluster_centers_[clusters['engagement']])
+    np.testing.assert_array_equal(pipeline.experience_centroid, exp_model.cluster_centers_[clusters['experience']])
+    # an explicit index still wins over the saved one
+    other = (clusters['engagement'] + 1) % 4
+    pipeline = ScoringPipeline(str(tmp_path), engagement_cluster=other)
+    np.testing.assert_array_equal(pipeline.engagement_centroid, eng_model.cluster_centers_[other])
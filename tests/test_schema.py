@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from schema import DtypeOptimizer
+
+
+def frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        'MSISDN/Number': [33664962239.0, np.nan, 33681854413.0, 33760627129.0],
+        'IMSI': [208201448079117.0, 208201909211140.0, 208200314458056.0, 208201402342131.0],
+        'Avg RTT DL (ms)': [42.0, np.nan, 65.0, 12.0],
+        'Dur. (ms)': [1823652.0, 1365104.0, 1361762.0, 1321509.0],
+        'Avg Bearer TP DL (kbps)': [23.25, 6.5, 8.125, 1.0 / 3.0],
+        'HTTP DL (Bytes)': [1.5e10, np.nan, 2.0, 3.0],
+    })
+
+
+def test_exact_mode_keeps_every_value():
+    df = frame()
+    optimized = DtypeOptimizer().optimize(df)
+    # an id with nulls stays float64, a nullable UInt64 would be larger
+    assert optimized['MSISDN/Number'].dtype == np.float64
+    assert optimized['IMSI'].dtype == np.uint64
+    assert optimized['Avg RTT DL (ms)'].dtype == 'Int16'
+    assert optimized['Dur. (ms)'].dtype == np.int32
+    assert optimized['Avg Bearer TP DL (kbps)'].dtype == np.float64
+    for column in df.columns:
+        np.testing.assert_array_equal(optimized[column].to_numpy(dtype=np.float64, na_value=np.nan),
+                                      df[column].to_numpy())
+
+
+def test_lossy_mode_rounds_wide_counters_to_float32():
+    df = frame()
+    optimizer = DtypeOptimizer(lossy=True)
+    optimized = optimizer.optimize(df)
+    assert optimized['Avg Bearer TP DL (kbps)'].dtype == np.float32
+    assert optimized['HTTP DL (Bytes)'].dtype == np.float32
+    # narrow exact types and the ids are kept
+    assert optimized['Avg RTT DL (ms)'].dtype == 'Int16'
+    assert optimized['Dur. (ms)'].dtype == np.int32
+    assert optimized['IMSI'].dtype == np.uint64
+    np.testing.assert_allclose(optimized['Avg Bearer TP DL (kbps)'].to_numpy(np.float64),
+                               df['Avg Bearer TP DL (kbps)'].to_numpy(), rtol=1e-7)
+    exact = DtypeOptimizer().optimize(df)
+    assert optimized.memory_usage(deep=True).sum() < exact.memory_usage(deep=True).sum()
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+from streaming import StreamPreProcess
+
+
+def test_mode_fill_of_a_text_column_empty_in_one_chunk(tmp_path):
+    df = pd.DataFrame({'Handset Type': ['A', 'B', 'A', 'C'] * 10, 'Dur. (ms)': np.arange(40.0)})
+    df.loc[:4, 'Handset Type'] = None
+    df.loc[7, 'Dur. (ms)'] = np.nan
+    path = tmp_path / 'xdr.csv'
+    df.to_csv(path, index=False)
+
+    streamer = StreamPreProcess(chunksize=5)
+    cleaned = pd.concat(streamer.iter_clean(str(path)), ignore_index=True)
+    assert streamer.stats['text_columns'] == ['handset_type']
+    assert 'handset_type' not in streamer.stats['medians']
+    assert cleaned.isna().sum().sum() == 0
+    assert (cleaned['handset_type'].iloc[:5] == 'A').all()
+    assert cleaned['dur._(ms)'].iloc[7] == streamer.stats['medians']['dur._(ms)']
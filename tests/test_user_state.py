@@ -0,0 +1,17 @@
+import pandas as pd
+
+from pipeline.user_state import UserState
+
+
+def test_batches_match_a_full_recompute(tmp_path, sessions):
+    # the same subscribers come back in every batch
+    batches = [sessions(rows=20_000, seed=seed, users=5_000) for seed in range(5)]
+    state = UserState(capacity=16)
+    for i, batch in enumerate(batches):
+        state.update(batch)
+        if i == 2:
+            state.save(str(tmp_path / 'user_state.pkl'))
+            state = UserState.load(str(tmp_path / 'user_state.pkl'))
+    history = pd.concat(batches, ignore_index=True)
+    assert state.verify(history)
+    assert not state.verify(history.iloc[20_000:])